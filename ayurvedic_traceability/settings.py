@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -30,6 +31,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its timings cover every other middleware
+    'traceability.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # right after SecurityMiddleware
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -38,6 +41,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'traceability.routers.ReplicaStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'ayurvedic_traceability.urls'
@@ -47,9 +51,105 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open between requests; checked before reuse
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Take the write lock when a transaction starts, so concurrent
+            # writers wait on busy_timeout instead of failing to upgrade a
+            # read lock with "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 5,
+        },
+    }
+}
+
+# Read replica
+# Consumer QR lookups, stats and analytics read from this alias when it is
+# configured (see traceability.routers); writes always go to 'default'.
+# Locally, point REPLICA_DATABASE_NAME at a second SQLite file kept in step
+# with `manage.py sync_replica --loop`, or at a Postgres standby with
+# REPLICA_DATABASE_ENGINE/HOST/PORT/USER/PASSWORD.
+if os.environ.get('REPLICA_DATABASE_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'ENGINE': os.environ.get('REPLICA_DATABASE_ENGINE', DATABASES['default']['ENGINE']),
+        'NAME': os.environ['REPLICA_DATABASE_NAME'],
+        'HOST': os.environ.get('REPLICA_DATABASE_HOST', ''),
+        'PORT': os.environ.get('REPLICA_DATABASE_PORT', ''),
+        'USER': os.environ.get('REPLICA_DATABASE_USER', ''),
+        'PASSWORD': os.environ.get('REPLICA_DATABASE_PASSWORD', ''),
+        'TEST': {'MIRROR': 'default'},
     }
+    # Readers never need IMMEDIATE transactions
+    DATABASES['replica']['OPTIONS'] = (
+        {'timeout': 5} if DATABASES['replica']['ENGINE'] == 'django.db.backends.sqlite3' else {}
+    )
+DATABASE_ROUTERS = ['traceability.routers.ReadReplicaRouter']
+READ_REPLICA_ALIAS = 'replica'
+# Seconds a client's reads stay on the primary after it writes
+READ_REPLICA_STICKY_SECONDS = int(os.environ.get('READ_REPLICA_STICKY_SECONDS', 10))
+
+# Request instrumentation (see traceability.instrumentation)
+SERVER_TIMING = DEBUG
+# /metrics requires "Authorization: Bearer <METRICS_TOKEN>" when set. Without
+# it only direct requests from METRICS_ALLOWED_IPS are answered; behind nginx
+# every request arrives from 127.0.0.1, so set a token in production.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+# Fraction of requests run under cProfile; those slower than the threshold
+# are dumped to PROFILE_REQUESTS_DIR (default: <tmp>/traceability_profiles)
+PROFILE_REQUESTS_SAMPLE_RATE = float(os.environ.get('PROFILE_REQUESTS_SAMPLE_RATE', 0))
+PROFILE_REQUESTS_THRESHOLD_MS = int(os.environ.get('PROFILE_REQUESTS_THRESHOLD_MS', 500))
+PROFILE_REQUESTS_DIR = os.environ.get('PROFILE_REQUESTS_DIR')
+
+# Applied to every new SQLite connection (see traceability.sqlite)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,  # KiB, i.e. 64 MB of page cache per connection
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# Caches
+# The provenance cache holds precomputed consumer batch documents keyed by
+# the batch's version stamp; superseded versions are never read again and
+# expire after TIMEOUT. A shared backend (e.g.
+# django.core.cache.backends.redis.RedisCache) lets workers share documents.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'provenance': {
+        'BACKEND': os.environ.get('PROVENANCE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('PROVENANCE_CACHE_LOCATION', 'provenance'),
+        'TIMEOUT': int(os.environ.get('PROVENANCE_CACHE_TIMEOUT', 60 * 60)),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Rendered QR images keyed by content address (see traceability.qr_render)
+    'qr': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('QR_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'ayurvedic_qr_cache')),
+        'TIMEOUT': 60 * 60 * 24 * 30,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
 }
 
+# QR codes
+# 'on_demand' stores nothing and serves /qr-code/<batch_id>.<format> from a
+# content-addressed cache. 'async' also stores a PNG per batch, queued as a
+# QRCodeJob for the process_qr_jobs worker; 'sync' renders it inside the
+# request. The worker thread drains the queue in-process, which keeps
+# runserver working without a separate worker.
+QR_CODE_RENDERING = 'on_demand'
+QR_CODE_WORKER_THREAD = DEBUG
+
 # Static files
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
@@ -112,7 +212,8 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        # JSONRenderer encoding through orjson when it is installed
+        'traceability.fastjson.FastJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
 }
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Collector, HerbSpecies, CollectionEvent, ProcessingBatch, ProcessingStep, QualityTest
+from .models import (Collector, HerbSpecies, CollectionEvent, ProcessingBatch, ProcessingStep, QualityTest,
+                     LedgerBlock, LedgerEntry)
 
 @admin.register(Collector)
 class CollectorAdmin(admin.ModelAdmin):
@@ -45,4 +46,27 @@ class ProcessingStepAdmin(admin.ModelAdmin):
 class QualityTestAdmin(admin.ModelAdmin):
     list_display = ('batch', 'lab_name', 'test_date', 'test_status', 'certificate_number')
     list_filter = ('test_status', 'lab_name', 'test_date')
-    search_fields = ('batch__batch_id', 'lab_name', 'certificate_number')
\ No newline at end of file
+    search_fields = ('batch__batch_id', 'lab_name', 'certificate_number')
+
+class LedgerEntryInline(admin.TabularInline):
+    model = LedgerEntry
+    extra = 0
+    can_delete = False
+    fields = ('position', 'record_type', 'record_id', 'action', 'payload_hash')
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+@admin.register(LedgerBlock)
+class LedgerBlockAdmin(admin.ModelAdmin):
+    list_display = ('index', 'block_hash', 'merkle_root', 'entry_count', 'created_at')
+    search_fields = ('block_hash', 'merkle_root')
+    readonly_fields = ('index', 'previous_hash', 'merkle_root', 'block_hash', 'entry_count', 'created_at')
+    inlines = [LedgerEntryInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,258 @@
+"""
+Time-series analytics over harvest volumes and processing throughput.
+
+DailyRollup rows keep a per-day count and total for each metric and
+dimension key (harvested kg by species, collector and state; processing
+hours by facility and step type), maintained incrementally by signals.
+
+Reports read a columnar snapshot of one (metric, dimension): per key, a
+sorted array of day ordinals and running (prefix) sums of counts and
+totals. The sum over any date range is two bisects and a subtraction, so a
+weekly or monthly series costs O(buckets * log days) per key regardless of
+how many events it covers. Snapshots are built with one query and reused
+in-process until the analytics version stamp changes.
+"""
+import bisect
+from array import array
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import versioning
+from .models import CollectionEvent, DailyRollup, ProcessingStep, VersionStamp
+
+HARVEST = 'harvest'
+PROCESSING = 'processing'
+DIMENSIONS = {
+    HARVEST: ('all', 'species', 'collector', 'state'),
+    PROCESSING: ('all', 'facility', 'step_type'),
+}
+INTERVALS = ('day', 'week', 'month')
+MAX_BUCKETS = 1000
+
+_snapshots = {}
+
+
+def harvest_row(event):
+    """(day, quantity_kg, keys per dimension) of a collection event"""
+    return event.harvest_date, event.quantity_kg, (
+        '', event.species.name, event.collector.collector_id, event.collector.state,
+    )
+
+
+def step_day(timestamp):
+    return timezone.localtime(timestamp).date() if timezone.is_aware(timestamp) else timestamp.date()
+
+
+def step_row(step):
+    """(day, duration_hours, keys per dimension) of a processing step"""
+    return step_day(step.timestamp), step.duration_hours or 0.0, (
+        '', step.batch.processing_facility, step.step_type,
+    )
+
+
+def rollup_deltas(metric, rows, sign=1, deltas=None):
+    deltas = deltas if deltas is not None else defaultdict(lambda: [0, 0.0])
+    for day, value, keys in rows:
+        for dimension, key in zip(DIMENSIONS[metric], keys):
+            delta = deltas[(metric, dimension, key, day)]
+            delta[0] += sign
+            delta[1] += sign * value
+    return deltas
+
+
+def apply_deltas(deltas):
+    """Add {(metric, dimension, key, day): [count, total]} deltas with one multi-row upsert"""
+    deltas = {rollup: delta for rollup, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    qn = connection.ops.quote_name
+    table = qn(DailyRollup._meta.db_table)
+    columns = f'metric, dimension, {qn("key")}, day'
+    sql = (
+        f'INSERT INTO {table} ({columns}, count, total) VALUES (%s, %s, %s, %s, %s, %s) '
+        f'ON CONFLICT ({columns}) DO UPDATE SET '
+        f'count = {table}.count + excluded.count, total = {table}.total + excluded.total'
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [rollup + tuple(delta) for rollup, delta in deltas.items()])
+    versioning.bump([versioning.ANALYTICS])
+
+
+def record(metric, rows, sign=1):
+    apply_deltas(rollup_deltas(metric, rows, sign))
+
+
+def move(metric, dimension, old_key, new_key, day_totals):
+    """Re-file (day, count, total) rows from one dimension key to another"""
+    deltas = {}
+    for day, count, total in day_totals:
+        deltas[(metric, dimension, old_key, day)] = [-count, -(total or 0.0)]
+        deltas[(metric, dimension, new_key, day)] = [count, total or 0.0]
+    apply_deltas(deltas)
+
+
+def harvest_day_totals(queryset):
+    return queryset.values_list('harvest_date').annotate(Count('id'), Sum('quantity_kg')).order_by()
+
+
+def step_day_totals(queryset):
+    return (queryset.annotate(day=TruncDate('timestamp')).values_list('day')
+            .annotate(Count('id'), Sum('duration_hours')).order_by())
+
+
+def expected_rollups():
+    """{(metric, dimension, key, day): [count, total]} computed from the source tables"""
+    expected = {}
+    harvest_fields = {'all': None, 'species': 'species__name', 'collector': 'collector__collector_id',
+                      'state': 'collector__state'}
+    for dimension, field in harvest_fields.items():
+        fields = [field] if field else []
+        groups = CollectionEvent.objects.values_list(*fields, 'harvest_date').annotate(
+            Count('id'), Sum('quantity_kg')).order_by()
+        for *key, day, count, total in groups:
+            expected[(HARVEST, dimension, key[0] if key else '', day)] = [count, total or 0.0]
+
+    step_fields = {'all': None, 'facility': 'batch__processing_facility', 'step_type': 'step_type'}
+    for dimension, field in step_fields.items():
+        fields = [field] if field else []
+        groups = ProcessingStep.objects.annotate(day=TruncDate('timestamp')).values_list(*fields, 'day').annotate(
+            Count('id'), Sum('duration_hours')).order_by()
+        for *key, day, count, total in groups:
+            expected[(PROCESSING, dimension, key[0] if key else '', day)] = [count, total or 0.0]
+    return expected
+
+
+def drift():
+    """Yield (metric, dimension, key, day, stored_count, expected_count) for every rollup that is off"""
+    expected = expected_rollups()
+    stored = {
+        (metric, dimension, key, day): count
+        for metric, dimension, key, day, count
+        in DailyRollup.objects.values_list('metric', 'dimension', 'key', 'day', 'count')
+    }
+    for rollup in sorted(set(expected) | set(stored)):
+        actual = expected[rollup][0] if rollup in expected else 0
+        if stored.get(rollup, 0) != actual:
+            yield rollup + (stored.get(rollup, 0), actual)
+
+
+def rebuild():
+    """Recompute every daily rollup from collection events and processing steps"""
+    with transaction.atomic():
+        expected = expected_rollups()
+        DailyRollup.objects.all().delete()
+        apply_deltas(expected)
+    return DailyRollup.objects.count()
+
+
+class Series:
+    """Columnar per-day rollups for one key with prefix sums for O(log n) range totals"""
+
+    def __init__(self):
+        self.days = array('l')
+        self.counts = array('q', [0])
+        self.totals = array('d', [0.0])
+
+    def append(self, ordinal, count, total):
+        self.days.append(ordinal)
+        self.counts.append(self.counts[-1] + count)
+        self.totals.append(self.totals[-1] + total)
+
+    def range(self, start, end):
+        """(count, total) for day ordinals start <= day < end"""
+        lo = bisect.bisect_left(self.days, start)
+        hi = bisect.bisect_left(self.days, end)
+        return self.counts[hi] - self.counts[lo], self.totals[hi] - self.totals[lo]
+
+
+def _current_version():
+    stamp = VersionStamp.objects.filter(key=versioning.ANALYTICS).values_list('version', 'updated_at').first()
+    return stamp or (0, None)
+
+
+def snapshot(metric, dimension, version=None):
+    """
+    {key: Series} for a metric and dimension, rebuilt only when the rollups
+    change; version is the analytics (version, updated_at) stamp if known.
+    """
+    version = _current_version() if version is None else version
+    cached = _snapshots.get((metric, dimension))
+    if cached and cached[0] == version:
+        return cached[1]
+    series = {}
+    rows = (DailyRollup.objects.filter(metric=metric, dimension=dimension)
+            .order_by('key', 'day').values_list('key', 'day', 'count', 'total'))
+    for key, day, count, total in rows.iterator(chunk_size=5000):
+        if count:
+            series.setdefault(key, Series()).append(day.toordinal(), count, total)
+    _snapshots[(metric, dimension)] = (version, series)
+    return series
+
+
+def bucket_starts(date_from, date_to, interval):
+    """Start dates of the day/week/month buckets covering date_from..date_to"""
+    if interval == 'week':
+        current = date_from - timedelta(days=date_from.weekday())
+    elif interval == 'month':
+        current = date_from.replace(day=1)
+    else:
+        current = date_from
+    starts = []
+    while current <= date_to:
+        starts.append(current)
+        if interval == 'month':
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            current += timedelta(days=7 if interval == 'week' else 1)
+    return starts
+
+
+def report(metric, dimension='all', date_from=None, date_to=None, interval='week', keys=None, limit=20,
+           version=None):
+    """
+    Bucketed counts and totals between date_from and date_to (inclusive) for
+    the top `limit` keys by total, or for the given keys.
+    """
+    series = snapshot(metric, dimension, version)
+    if date_from is None or date_to is None:
+        first = min((s.days[0] for s in series.values()), default=date.today().toordinal())
+        last = max((s.days[-1] for s in series.values()), default=date.today().toordinal())
+        date_from = date_from or date.fromordinal(first)
+        date_to = date_to or date.fromordinal(last)
+    starts = bucket_starts(date_from, date_to, interval)
+    if len(starts) > MAX_BUCKETS:
+        # Open-ended ranges keep the most recent buckets
+        starts = starts[-MAX_BUCKETS:]
+        date_from = starts[0]
+    bounds = [max(start, date_from).toordinal() for start in starts] + [date_to.toordinal() + 1]
+
+    selected = {key: series[key] for key in keys if key in series} if keys else series
+    totals = {key: s.range(bounds[0], bounds[-1]) for key, s in selected.items()}
+    ranked = sorted(totals, key=lambda key: -totals[key][1])
+    if not keys:
+        ranked = ranked[:limit]
+
+    results = []
+    for key in ranked:
+        points = [selected[key].range(lo, hi) for lo, hi in zip(bounds, bounds[1:])]
+        results.append({
+            'key': key,
+            'count': totals[key][0],
+            'total': round(totals[key][1], 3),
+            'counts': [count for count, _ in points],
+            'totals': [round(total, 3) for _, total in points],
+        })
+    return {
+        'metric': metric,
+        'dimension': dimension,
+        'interval': interval,
+        'date_from': date_from,
+        'date_to': date_to,
+        'buckets': starts,
+        'series': results,
+    }
@@ -0,0 +1,99 @@
+"""
+Typeahead search for the data-entry forms.
+
+Each lookup is a case-insensitive prefix match answered by a range scan on
+an expression index (LOWER(column) >= 'ash' AND LOWER(column) < 'asi'),
+read in index order and cut off at `limit`, so the cost depends on the
+limit and not on the table size. LIKE 'ash%' cannot use those indexes on
+SQLite.
+"""
+import uuid
+
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from .fastjson import display
+from .models import Collector, CollectionEvent, HerbSpecies, ProcessingBatch
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Collectors whose harvests are offered for one event search
+EVENT_COLLECTORS = 50
+
+
+def prefix_range(prefix):
+    """(lower, upper) bounds of the strings starting with prefix"""
+    last = prefix[-1]
+    if last == '\U0010ffff':
+        return prefix, prefix + last
+    return prefix, prefix[:-1] + chr(ord(last) + 1)
+
+
+def prefix_q(alias, prefix):
+    lower, upper = prefix_range(prefix)
+    return Q(**{f'{alias}__gte': lower, f'{alias}__lt': upper})
+
+
+def _normalise(query):
+    return (query or '').strip().lower()
+
+
+def batches(query, limit=DEFAULT_LIMIT):
+    """Batches whose batch_id starts with query"""
+    query = _normalise(query)
+    if not query:
+        return []
+    rows = (ProcessingBatch.objects.alias(key=Lower('batch_id')).filter(prefix_q('key', query))
+            .order_by('key').values_list('batch_id', 'processing_facility', 'status')[:limit])
+    return [{'value': batch_id, 'label': f'{batch_id} - {facility}', 'status': status}
+            for batch_id, facility, status in rows]
+
+
+def _collector_ids(query, limit):
+    by_id = (Collector.objects.alias(key=Lower('collector_id')).filter(prefix_q('key', query))
+             .order_by('key').values_list('pk', flat=True)[:limit])
+    by_name = (Collector.objects.alias(key=Lower('name')).filter(prefix_q('key', query))
+               .order_by('key').values_list('pk', flat=True)[:limit])
+    return list(dict.fromkeys([*by_id, *by_name]))[:limit]
+
+
+def collectors(query, limit=DEFAULT_LIMIT):
+    """Collectors whose collector_id or name starts with query"""
+    query = _normalise(query)
+    if not query:
+        return []
+    rows = Collector.objects.filter(pk__in=_collector_ids(query, limit)).order_by(Lower('name'), 'pk').values_list(
+        'collector_id', 'name', 'village', 'state')
+    return [{'value': collector_id, 'label': f'{name} ({collector_id})', 'village': village, 'state': state}
+            for collector_id, name, village, state in rows]
+
+
+def events(query, limit=DEFAULT_LIMIT, species=None):
+    """
+    Latest harvests by collectors whose collector_id or name starts with
+    query, or the single event when query is a full event_id
+    """
+    query = _normalise(query)
+    if not query:
+        return []
+    try:
+        queryset = CollectionEvent.objects.filter(event_id=uuid.UUID(query))
+    except ValueError:
+        queryset = CollectionEvent.objects.filter(collector_id__in=_collector_ids(query, EVENT_COLLECTORS))
+    if species:
+        queryset = queryset.filter(species__name=species)
+    rows = queryset.order_by('-harvest_date', '-id').values_list(
+        'event_id', 'species__name', 'collector__name', 'harvest_date', 'quantity_kg')[:limit]
+    species_label = display(HerbSpecies, 'name')
+    return [{
+        'value': str(event_id),
+        'label': f'{species_label(name)} - {collector} - {harvest_date}',
+        'quantity_kg': quantity_kg,
+    } for event_id, name, collector, harvest_date, quantity_kg in rows]
+
+
+LOOKUPS = {
+    'batches': batches,
+    'collectors': collectors,
+    'events': events,
+}
@@ -0,0 +1,123 @@
+"""
+Fast serialization path for high-volume read endpoints.
+
+Read-only views query .values_list() tuples and turn each one into a dict
+with an extractor compiled once per field spec, instead of instantiating
+models and walking ModelSerializer fields per row. dumps() encodes with
+orjson when it is installed and falls back to the standard library.
+"""
+import json
+from operator import itemgetter
+
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = JSONEncoder()
+
+
+def dumps(data):
+    """Compact UTF-8 JSON bytes; types JSON has no native form for are encoded as DRF does"""
+    if orjson is not None:
+        # Dates and datetimes go through DRF's encoder so both paths agree on the format
+        return orjson.dumps(data, default=_encoder.default,
+                            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def dumps_rows(rows):
+    """Comma-separated JSON for rows, to be wrapped in [...] or streamed as part of an array"""
+    return dumps(rows)[1:-1]
+
+
+def day(value):
+    """'YYYY-MM-DD' for a date or datetime"""
+    return value.isoformat()[:10] if value is not None else None
+
+
+def minutes(value):
+    """'YYYY-MM-DD HH:MM' for a datetime"""
+    return value.isoformat(' ', 'minutes')[:16] if value is not None else None
+
+
+# DRF's own formatting, so fast rows match the serializers exactly
+iso_datetime = serializers.DateTimeField().to_representation
+
+
+def display(model, field_name):
+    """Converter from a choice field's stored value to its label"""
+    labels = {value: str(label) for value, label in model._meta.get_field(field_name).flatchoices}
+    return lambda value: labels.get(value, value)
+
+
+def compile_extractor(spec, leading=()):
+    """
+    Compile [(output_key, column, converter or None), ...] into the columns
+    to select with .values_list() and a function mapping one such row to a
+    dict. The positions are resolved once, so each row costs an itemgetter
+    call, the converters and a dict(zip()). `leading` columns are selected
+    first but not emitted (e.g. a pagination cursor).
+    """
+    columns = list(dict.fromkeys([*leading, *(column for _, column, _ in spec)]))
+    keys = tuple(key for key, _, _ in spec)
+    indexes = [columns.index(column) for _, column, _ in spec]
+    # itemgetter returns a bare value, not a 1-tuple, for a single index
+    get = itemgetter(*indexes) if len(indexes) > 1 else lambda row: tuple(row[index] for index in indexes)
+    conversions = tuple((position, converter) for position, (_, _, converter) in enumerate(spec)
+                        if converter is not None)
+
+    if not conversions:
+        return columns, lambda row: dict(zip(keys, get(row)))
+
+    def extract(row):
+        values = list(get(row))
+        for position, convert in conversions:
+            values[position] = convert(values[position])
+        return dict(zip(keys, values))
+
+    return columns, extract
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes through dumps() unless indented output was requested"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class FastListMixin:
+    """
+    list() for ViewSets that can describe their representation as
+    fast_list_fields, [(output_key, column, converter or None), ...]: rows
+    are read with .values_list() and converted by a compiled extractor.
+    Pagination still applies; use_fast_list() can fall back to the serializer.
+    """
+    fast_list_fields = None
+
+    def use_fast_list(self):
+        return self.fast_list_fields is not None
+
+    @classmethod
+    def fast_list_extractor(cls):
+        if '_fast_list_extractor' not in cls.__dict__:
+            cls._fast_list_extractor = compile_extractor(cls.fast_list_fields)
+        return cls._fast_list_extractor
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_fast_list():
+            return super().list(request, *args, **kwargs)
+        columns, extract = self.fast_list_extractor()
+        rows = self.filter_queryset(self.get_queryset()).values_list(*columns, named=True)
+        page = self.paginate_queryset(rows)
+        data = [extract(row) for row in (rows if page is None else page)]
+        return Response(data) if page is None else self.get_paginated_response(data)
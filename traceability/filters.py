@@ -0,0 +1,111 @@
+"""
+Query-string filters shared by the collection event endpoints.
+
+Invalid parameters raise rest_framework.exceptions.ValidationError so API
+views answer 400 with a field-level message.
+"""
+import math
+from datetime import date
+
+from rest_framework.exceptions import ValidationError
+
+from .spatial import bbox_q
+
+
+def parse_bbox(value):
+    """Parse 'min_lng,min_lat,max_lng,max_lat' into a tuple of floats"""
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(part) for part in value.split(','))
+    except ValueError:
+        raise ValidationError({'bbox': 'Expected min_lng,min_lat,max_lng,max_lat'})
+    # nan and inf would pass every comparison below and match nothing
+    if not all(map(math.isfinite, (min_lng, min_lat, max_lng, max_lat))):
+        raise ValidationError({'bbox': 'Expected finite numbers'})
+    if not (-180 <= min_lng <= 180 and -180 <= max_lng <= 180 and -90 <= min_lat <= 90 and -90 <= max_lat <= 90):
+        raise ValidationError({'bbox': 'Longitudes must be within -180..180 and latitudes within -90..90'})
+    if min_lat > max_lat:
+        raise ValidationError({'bbox': 'min_lat must not be greater than max_lat'})
+    if min_lng > max_lng:
+        raise ValidationError({'bbox': 'min_lng is greater than max_lng; boxes crossing the antimeridian '
+                                       'are not supported, query each side separately'})
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def parse_date(value, param):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({param: 'Expected a YYYY-MM-DD date'})
+
+
+def parse_float(value, param, minimum=None, maximum=None):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValidationError({param: 'Expected a number'})
+    if math.isnan(number):
+        raise ValidationError({param: 'Expected a number'})
+    if (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+        raise ValidationError({param: f'Expected a number between {minimum} and {maximum}'})
+    return number
+
+
+def parse_polygon(value):
+    """Parse 'lng lat,lng lat,...' (or a list of [lng, lat] pairs) into vertices"""
+    try:
+        if isinstance(value, str):
+            vertices = [tuple(float(part) for part in point.split()) for point in value.split(',')]
+        else:
+            vertices = [(float(lng), float(lat)) for lng, lat in value]
+    except (TypeError, ValueError):
+        raise ValidationError({'polygon': 'Expected a list of "lng lat" vertices'})
+    if len(vertices) < 3 or any(len(vertex) != 2 for vertex in vertices):
+        raise ValidationError({'polygon': 'A polygon needs at least three "lng lat" vertices'})
+    if not all(math.isfinite(coordinate) for vertex in vertices for coordinate in vertex):
+        raise ValidationError({'polygon': 'Expected finite numbers'})
+    return vertices
+
+
+def parse_positive_int(value, param, maximum=None):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({param: 'Expected a positive integer'})
+    if number < 1:
+        raise ValidationError({param: 'Expected a positive integer'})
+    if maximum is not None:
+        number = min(number, maximum)
+    return number
+
+
+def parse_expand(value, allowed):
+    """Parse 'a,b' into the set of relations to expand; an empty value expands nothing"""
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = names - set(allowed)
+    if unknown:
+        raise ValidationError({'expand': f'Expected any of {", ".join(allowed)}'})
+    return names
+
+
+def filter_collection_events(queryset, params):
+    """
+    Apply the common collection event filters:
+
+    bbox=min_lng,min_lat,max_lng,max_lat, species=name[,name...],
+    grade=A[,B...], date_from=YYYY-MM-DD and date_to=YYYY-MM-DD
+    (inclusive, on harvest_date).
+    """
+    if params.get('bbox'):
+        # As a pk subquery, so the geohash ranges are searched even when the
+        # outer query is ordered by id for cursor pagination
+        in_bbox = queryset.model.objects.filter(bbox_q(*parse_bbox(params['bbox']))).values('pk')
+        queryset = queryset.filter(pk__in=in_bbox)
+    if params.get('species'):
+        queryset = queryset.filter(species__name__in=params['species'].split(','))
+    if params.get('grade'):
+        queryset = queryset.filter(quality_grade__in=params['grade'].split(','))
+    if params.get('date_from'):
+        queryset = queryset.filter(harvest_date__gte=parse_date(params['date_from'], 'date_from'))
+    if params.get('date_to'):
+        queryset = queryset.filter(harvest_date__lte=parse_date(params['date_to'], 'date_to'))
+    return queryset
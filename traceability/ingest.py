@@ -0,0 +1,163 @@
+"""
+Bulk ingestion of collection events synced from offline collector devices.
+
+A sync is validated record by record, then species and collectors are
+resolved with one query each, unknown collectors of otherwise valid records
+are created with a single bulk insert, and all valid events are written with bulk_create inside one
+transaction. Because bulk_create bypasses model signals, the
+collection_events_created and collectors_created signals are sent so the
+ledger, map tiles, statistics and version stamps stay in step.
+
+Records may carry an idempotency_key. Keys already stored (or repeated
+within the same upload) are answered with the original event_id instead of
+being inserted again, at the cost of one indexed lookup per sync.
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import Collector, HerbSpecies, CollectionEvent, IdempotencyKey
+from .serializers import CollectionEventIngestSerializer
+from .signals import collection_events_created, collectors_created
+from .spatial import encode_geohash
+
+EVENT_FIELDS = ('harvest_date', 'gps_latitude', 'gps_longitude', 'quantity_kg', 'quality_grade',
+                'weather_conditions', 'soil_ph', 'organic_certified', 'fair_trade_certified')
+
+
+def max_records():
+    return getattr(settings, 'INGEST_MAX_RECORDS', 10000)
+
+
+def _resolve_collectors(records, results):
+    """Map collector_id -> Collector, creating unknown collectors in one bulk insert"""
+    collector_ids = {record['collector_id'] for _, record in records}
+    collectors = Collector.objects.in_bulk(collector_ids, field_name='collector_id')
+
+    new_collectors = {}
+    for index, record in records:
+        collector_id = record['collector_id']
+        if collector_id in collectors or collector_id in new_collectors:
+            continue
+        missing = [field for field in ('collector_name', 'village', 'state') if not record.get(field)]
+        if missing:
+            results[index] = {'index': index, 'status': 'error',
+                              'errors': {field: ['Required for a new collector.'] for field in missing}}
+            continue
+        new_collectors[collector_id] = Collector(
+            collector_id=collector_id,
+            name=record['collector_name'],
+            village=record['village'],
+            state=record['state'],
+            phone=record.get('phone', ''),
+        )
+    if new_collectors:
+        Collector.objects.bulk_create(new_collectors.values(), ignore_conflicts=True)
+        stored = Collector.objects.in_bulk(new_collectors, field_name='collector_id')
+        collectors.update(stored)
+        # A concurrent sync may have inserted some of them first and already
+        # sent its own signal; only rows carrying our created_at are ours
+        created = [collector for collector_id, collector in stored.items()
+                   if collector.created_at == new_collectors[collector_id].created_at]
+        if created:
+            collectors_created.send(sender=Collector, collectors=created)
+    return collectors
+
+
+def _skip_duplicates(records, results):
+    """Answer records whose idempotency key was already ingested; return the rest"""
+    keys = {record['idempotency_key'] for _, record in records if record.get('idempotency_key')}
+    if not keys:
+        return records
+    seen = {
+        key: str(event_id)
+        for key, event_id in IdempotencyKey.objects.filter(key__in=keys).values_list('key', 'event__event_id')
+    }
+    first_index = {}
+    remaining = []
+    for index, record in records:
+        key = record.get('idempotency_key')
+        if key in seen:
+            results[index] = {'index': index, 'status': 'duplicate', 'event_id': seen[key]}
+        elif key in first_index:
+            results[index] = {'index': index, 'status': 'duplicate', 'duplicate_of': first_index[key]}
+        else:
+            if key:
+                first_index[key] = index
+            remaining.append((index, record))
+    return remaining
+
+
+def _store(valid, results):
+    """Insert the valid records not already ingested; return [(index, event)] for those created"""
+    valid = _skip_duplicates(valid, results)
+    species = HerbSpecies.objects.in_bulk({record['species'] for _, record in valid}, field_name='name')
+    accepted = []
+    for index, record in valid:
+        if record['species'] not in species:
+            results[index] = {'index': index, 'status': 'error',
+                              'errors': {'species': [f"Unknown species '{record['species']}'."]}}
+        else:
+            accepted.append((index, record))
+    # Collectors last, so a rejected record never leaves one behind
+    collectors = _resolve_collectors(accepted, results)
+
+    pending = []
+    keys = []
+    for index, record in accepted:
+        if results[index] is not None:
+            continue
+        event = CollectionEvent(
+            collector=collectors[record['collector_id']],
+            species=species[record['species']],
+            geohash=encode_geohash(record['gps_latitude'], record['gps_longitude']),
+            **{field: record[field] for field in EVENT_FIELDS if field in record},
+        )
+        pending.append((index, event))
+        if record.get('idempotency_key'):
+            keys.append(IdempotencyKey(key=record['idempotency_key'], event=event))
+
+    events = CollectionEvent.objects.bulk_create([event for _, event in pending], batch_size=500)
+    IdempotencyKey.objects.bulk_create(keys, batch_size=500)
+    if events:
+        collection_events_created.send(sender=CollectionEvent, events=events)
+    return pending
+
+
+def ingest_collection_events(payloads):
+    """
+    Validate and insert a list of harvest dicts. Returns one result per input
+    record, in order: {'index', 'status': 'created' | 'duplicate', 'event_id'}
+    or {'index', 'status': 'error', 'errors'}.
+    """
+    results = [None] * len(payloads)
+    valid = []
+    for index, payload in enumerate(payloads):
+        serializer = CollectionEventIngestSerializer(data=payload)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            results[index] = {'index': index, 'status': 'error', 'errors': serializer.errors}
+
+    # A concurrent sync can store the same idempotency key between our lookup
+    # and insert; the retry then answers those records as duplicates
+    checked = results
+    for attempt in range(2):
+        results = list(checked)
+        try:
+            with transaction.atomic():
+                pending = _store(valid, results)
+            break
+        except IntegrityError:
+            if attempt:
+                raise
+
+    for index, event in pending:
+        results[index] = {'index': index, 'status': 'created', 'event_id': str(event.event_id)}
+    for result in results:
+        if 'duplicate_of' in result:
+            original = results[result.pop('duplicate_of')]
+            if original['status'] == 'error':
+                result.update(status='error', errors=original['errors'])
+            else:
+                result['event_id'] = original['event_id']
+    return results
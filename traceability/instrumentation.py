@@ -0,0 +1,215 @@
+"""
+Per-request performance instrumentation.
+
+RequestMetricsMiddleware times every request and records, per view: wall
+time, database query count and time, response rendering time (DRF and
+template responses) and response size. Each response carries the numbers
+in a Server-Timing header, which browser dev tools display, and the
+running totals are served in Prometheus text format by metrics_view.
+Totals are per process; scrape every worker, or run one for profiling.
+
+Set METRICS_TOKEN in production and have Prometheus send it as a bearer
+token. Without one the endpoint answers only METRICS_ALLOWED_IPS, which is
+no protection behind a reverse proxy: nginx connects to gunicorn from
+127.0.0.1, so every proxied request looks local. Requests carrying
+X-Forwarded-For are refused for that reason, but that relies on the proxy
+setting the header.
+
+With PROFILE_REQUESTS_SAMPLE_RATE > 0, that fraction of requests runs
+under cProfile and any that take longer than PROFILE_REQUESTS_THRESHOLD_MS
+are dumped to PROFILE_REQUESTS_DIR as .prof files (open with snakeviz or
+tuna for a flame graph, or pstats).
+"""
+import cProfile
+import hmac
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metrics:
+    """Thread-safe running totals per view, rendered in Prometheus text format"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = {}
+        self.views = {}
+
+    def observe(self, view, method, status, timing):
+        with self.lock:
+            key = (view, method, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            totals = self.views.setdefault(view, {
+                'duration': 0.0, 'db_queries': 0, 'db': 0.0, 'render': 0.0, 'bytes': 0,
+                'buckets': [0] * len(DURATION_BUCKETS), 'count': 0,
+            })
+            totals['count'] += 1
+            totals['duration'] += timing.total
+            totals['db_queries'] += timing.queries
+            totals['db'] += timing.db
+            totals['render'] += timing.render
+            totals['bytes'] += timing.size or 0
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if timing.total <= bound:
+                    totals['buckets'][i] += 1
+
+    def render(self):
+        lines = [
+            '# HELP traceability_http_requests_total Requests by view, method and status.',
+            '# TYPE traceability_http_requests_total counter',
+        ]
+        with self.lock:
+            for (view, method, status), count in sorted(self.requests.items()):
+                lines.append(f'traceability_http_requests_total{{view="{view}",method="{method}",'
+                             f'status="{status}"}} {count}')
+            lines += [
+                '# HELP traceability_http_request_duration_seconds Wall time per request.',
+                '# TYPE traceability_http_request_duration_seconds histogram',
+            ]
+            for view, totals in sorted(self.views.items()):
+                for bound, count in zip(DURATION_BUCKETS, totals['buckets']):
+                    lines.append(f'traceability_http_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} '
+                                 f'{count}')
+                lines.append(f'traceability_http_request_duration_seconds_bucket{{view="{view}",le="+Inf"}} '
+                             f'{totals["count"]}')
+                lines.append(f'traceability_http_request_duration_seconds_sum{{view="{view}"}} {totals["duration"]}')
+                lines.append(f'traceability_http_request_duration_seconds_count{{view="{view}"}} {totals["count"]}')
+            for name, field, kind, description in (
+                ('db_queries_total', 'db_queries', 'counter', 'Database queries issued by the view.'),
+                ('db_seconds_total', 'db', 'counter', 'Time spent executing database queries.'),
+                ('render_seconds_total', 'render', 'counter', 'Time spent rendering DRF and template responses.'),
+                ('response_bytes_total', 'bytes', 'counter', 'Response body bytes (streamed bodies excluded).'),
+            ):
+                lines += [f'# HELP traceability_http_{name} {description}', f'# TYPE traceability_http_{name} {kind}']
+                for view, totals in sorted(self.views.items()):
+                    lines.append(f'traceability_http_{name}{{view="{view}"}} {totals[field]}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+class RequestTiming:
+    """Measurements for one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.queries = 0
+        self.db = 0.0
+        self.render = 0.0
+        self.render_started = None
+        self.size = None
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - started
+
+    def server_timing(self):
+        return (f'app;dur={self.total * 1000:.1f}, '
+                f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries", '
+                f'render;dur={self.render * 1000:.1f}')
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unresolved'
+
+
+def _profiling_sampled():
+    rate = getattr(settings, 'PROFILE_REQUESTS_SAMPLE_RATE', 0)
+    return rate > 0 and random.random() < rate
+
+
+def _dump_profile(profiler, request, timing):
+    directory = getattr(settings, 'PROFILE_REQUESTS_DIR', None) or os.path.join(
+        tempfile.gettempdir(), 'traceability_profiles')
+    os.makedirs(directory, exist_ok=True)
+    name = f'{_view_name(request).replace(":", "_")}-{int(time.time() * 1000)}-{timing.total * 1000:.0f}ms.prof'
+    path = os.path.join(directory, name)
+    profiler.dump_stats(path)
+    logger.warning('Slow request %s %s took %.0f ms; profile written to %s',
+                   request.method, request.path, timing.total * 1000, path)
+    return path
+
+
+class RequestMetricsMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = request._timing = RequestTiming()
+        profiler = cProfile.Profile() if _profiling_sampled() else None
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timing.record_query))
+            if profiler is not None:
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Another profiler is already active in this thread
+                    profiler = None
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+
+        timing.total = time.perf_counter() - timing.started
+        if not response.streaming:
+            timing.size = len(response.content)
+        if getattr(settings, 'SERVER_TIMING', settings.DEBUG):
+            response['Server-Timing'] = timing.server_timing()
+        metrics.observe(_view_name(request), request.method, response.status_code, timing)
+        if profiler is not None and timing.total * 1000 >= getattr(settings, 'PROFILE_REQUESTS_THRESHOLD_MS', 500):
+            _dump_profile(profiler, request, timing)
+        return response
+
+    def process_template_response(self, request, response):
+        # Rendering happens after every process_template_response hook
+        timing = request._timing
+        timing.render_started = time.perf_counter()
+        response.add_post_render_callback(lambda rendered: self._rendered(timing))
+        return response
+
+    def _rendered(self, timing):
+        timing.render += time.perf_counter() - timing.render_started
+
+
+def _metrics_allowed(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(credentials.encode(), token.encode())
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+    return 'X-Forwarded-For' not in request.headers and request.META.get('REMOTE_ADDR') in allowed
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint, answered for the METRICS_TOKEN bearer token,
+    or without a token configured for direct requests from METRICS_ALLOWED_IPS
+    """
+    if not _metrics_allowed(request):
+        raise Http404
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,104 @@
+"""
+Print-ready QR label sheets for packaging runs.
+
+Labels are rendered one page at a time and composed onto A4 sheets. The
+print_qr_labels command renders each page in parallel across CPU cores;
+web requests render serially, since a process pool per request would fork
+workers x CPUs processes under load. Each sheet is written to the PDF as an incremental
+update (PDF pages appended after the existing bytes), so output can be
+streamed page by page while only a single sheet is held in memory.
+"""
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from PIL import Image
+
+from .models import ProcessingBatch
+from .qr_render import LABEL_DPI, LABEL_SIZE, qr_payload, render_label
+
+# A4 at LABEL_DPI
+SHEET_SIZE = (2480, 3508)
+SHEET_MARGIN = 90
+DEFAULT_COLUMNS = 3
+DEFAULT_ROWS = 4
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def default_workers():
+    """Render processes for the print_qr_labels command"""
+    return getattr(settings, 'QR_LABEL_WORKERS', None) or os.cpu_count() or 1
+
+
+def select_batch_ids(batch_ids=None, status=None):
+    """Existing batch_ids to label, optionally restricted to a list or a status"""
+    queryset = ProcessingBatch.objects.order_by('batch_id')
+    if batch_ids:
+        queryset = queryset.filter(batch_id__in=batch_ids)
+    if status:
+        queryset = queryset.filter(status=status)
+    return list(queryset.values_list('batch_id', flat=True))
+
+
+def _render_label_bytes(batch_id_and_payload):
+    """Worker entry point: raw greyscale pixels are cheaper to pickle than PNG"""
+    batch_id, payload = batch_id_and_payload
+    return render_label(payload, batch_id).tobytes()
+
+
+@contextmanager
+def _label_renderer(workers):
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield pool.map
+    else:
+        yield map
+
+
+def _place(sheet, labels, columns, rows):
+    width, height = SHEET_SIZE
+    cell_width = (width - 2 * SHEET_MARGIN) // columns
+    cell_height = (height - 2 * SHEET_MARGIN) // rows
+    for i, label in enumerate(labels):
+        if label.width > cell_width or label.height > cell_height:
+            label.thumbnail((cell_width, cell_height))
+        col, row = i % columns, i // columns
+        sheet.paste(label, (
+            SHEET_MARGIN + col * cell_width + (cell_width - label.width) // 2,
+            SHEET_MARGIN + row * cell_height + (cell_height - label.height) // 2,
+        ))
+
+
+def iter_sheets(batch_ids, columns=DEFAULT_COLUMNS, rows=DEFAULT_ROWS, workers=1):
+    """Yield one sheet image per page; with workers > 1 a page's labels are rendered in parallel"""
+    per_page = columns * rows
+    batch_ids = list(batch_ids)
+    with _label_renderer(workers) as render:
+        for start in range(0, len(batch_ids), per_page):
+            page = [(batch_id, qr_payload(batch_id)) for batch_id in batch_ids[start:start + per_page]]
+            sheet = Image.new('L', SHEET_SIZE, 255)
+            labels = (Image.frombytes('L', LABEL_SIZE, data) for data in render(_render_label_bytes, page))
+            _place(sheet, labels, columns, rows)
+            yield sheet
+
+
+def write_label_pdf(batch_ids, fileobj, **options):
+    """Append label sheets to a seekable binary file, yielding its size after each page"""
+    for page, sheet in enumerate(iter_sheets(batch_ids, **options)):
+        fileobj.seek(0, os.SEEK_END)
+        sheet.save(fileobj, format='PDF', append=page > 0, resolution=LABEL_DPI)
+        yield fileobj.tell()
+
+
+def stream_label_pdf(batch_ids, **options):
+    """Generate PDF bytes page by page through a temporary spool file"""
+    with tempfile.TemporaryFile() as spool:
+        sent = 0
+        for end in write_label_pdf(batch_ids, spool, **options):
+            spool.seek(sent)
+            while sent < end:
+                chunk = spool.read(min(STREAM_CHUNK_SIZE, end - sent))
+                sent += len(chunk)
+                yield chunk
@@ -0,0 +1,370 @@
+"""
+Hash-chained provenance ledger.
+
+Every write to a CollectionEvent, ProcessingStep or QualityTest appends a
+LedgerEntry holding the SHA-256 hash of the record's canonical payload.
+Pending entries are sealed into LedgerBlocks; each block stores the Merkle
+root of its entries and is chained to its predecessor via previous_hash.
+
+Leaves and interior nodes are domain separated (0x00 / 0x01 prefixes) and an
+odd node at the end of a level is promoted unchanged, as in RFC 6962, so a
+proof for any entry is at most ceil(log2(n)) sibling hashes.
+"""
+import hashlib
+import json
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import versioning
+from .models import (CollectionEvent, ProcessingStep, QualityTest,
+                     LedgerBlock, LedgerEntry, LedgerCheckpoint)
+
+GENESIS_HASH = '0' * 64
+
+RECORD_MODELS = {
+    'collection_event': CollectionEvent,
+    'processing_step': ProcessingStep,
+    'quality_test': QualityTest,
+}
+RECORD_TYPES = {model: record_type for record_type, model in RECORD_MODELS.items()}
+
+# Columns derived from other fields (e.g. index keys) are left out of the
+# canonical payload so adding one does not change existing record hashes
+DERIVED_FIELDS = {'geohash'}
+
+VerificationResult = namedtuple('VerificationResult', ['ok', 'blocks_checked', 'head_index', 'error'])
+
+
+def block_size():
+    return getattr(settings, 'LEDGER_BLOCK_SIZE', 256)
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def canonical_payload(instance):
+    """Deterministic JSON encoding of a record's concrete field values"""
+    values = {
+        field.attname: field.value_from_object(instance)
+        for field in instance._meta.concrete_fields
+        if field.attname not in DERIVED_FIELDS
+    }
+    return json.dumps(values, sort_keys=True, separators=(',', ':'), cls=DjangoJSONEncoder)
+
+
+def payload_hash(instance):
+    return _sha256(canonical_payload(instance).encode())
+
+
+def leaf_hash(record_type, record_id, action, payload_digest):
+    return _sha256(b'\x00' + f'{record_type}:{record_id}:{action}:{payload_digest}'.encode())
+
+
+def entry_leaf(entry):
+    return leaf_hash(entry.record_type, entry.record_id, entry.action, entry.payload_hash)
+
+
+def node_hash(left, right):
+    return _sha256(b'\x01' + bytes.fromhex(left) + bytes.fromhex(right))
+
+
+def block_hash(index, previous_hash, merkle_root, entry_count, created_at):
+    header = f'{index}:{previous_hash}:{merkle_root}:{entry_count}:{created_at.isoformat()}'
+    return _sha256(header.encode())
+
+
+def _next_level(level):
+    parents = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2:
+        parents.append(level[-1])
+    return parents
+
+
+def merkle_levels(leaves):
+    """Every level of the Merkle tree, from the leaves up to the root"""
+    levels = [list(leaves) or [_sha256(b'')]]
+    while len(levels[-1]) > 1:
+        levels.append(_next_level(levels[-1]))
+    return levels
+
+
+def merkle_root(leaves):
+    """Merkle root of a list of hex leaf hashes"""
+    return merkle_levels(leaves)[-1][0]
+
+
+def _path(levels, index):
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append(['L' if sibling < index else 'R', level[sibling]])
+        index //= 2
+    return proof
+
+
+def merkle_proof(leaves, index):
+    """Audit path for leaves[index] as a list of [side, sibling_hash] pairs"""
+    return _path(merkle_levels(leaves), index)
+
+
+def verify_proof(leaf, proof, root):
+    """Check an audit path produced by merkle_proof against a Merkle root"""
+    current = leaf
+    for side, sibling in proof:
+        current = node_hash(sibling, current) if side == 'L' else node_hash(current, sibling)
+    return current == root
+
+
+def append(instance, action):
+    """Append a ledger entry for a write to a tracked record"""
+    record_type = RECORD_TYPES[type(instance)]
+    digest = _sha256(b'') if action == 'delete' else payload_hash(instance)
+    entry = LedgerEntry.objects.create(
+        record_type=record_type,
+        record_id=instance.pk,
+        action=action,
+        payload_hash=digest,
+    )
+    transaction.on_commit(seal_full_blocks)
+    return entry
+
+
+def append_many(instances, action):
+    """Append entries for many writes at once, e.g. after bulk_create"""
+    entries = LedgerEntry.objects.bulk_create([
+        LedgerEntry(record_type=RECORD_TYPES[type(instance)], record_id=instance.pk,
+                    action=action, payload_hash=payload_hash(instance))
+        for instance in instances
+    ], batch_size=500)
+    transaction.on_commit(seal_full_blocks)
+    return entries
+
+
+def backfill():
+    """Append 'create' entries for records written before the ledger existed"""
+    appended = 0
+    for record_type, model in RECORD_MODELS.items():
+        recorded = LedgerEntry.objects.filter(record_type=record_type).values('record_id')
+        entries = [
+            LedgerEntry(record_type=record_type, record_id=instance.pk,
+                        action='create', payload_hash=payload_hash(instance))
+            for instance in model.objects.exclude(pk__in=recorded).order_by('pk').iterator()
+        ]
+        LedgerEntry.objects.bulk_create(entries, batch_size=500)
+        appended += len(entries)
+    return appended
+
+
+def seal_block(limit=None):
+    """Seal up to `limit` pending entries into a new block chained to the head"""
+    limit = limit or block_size()
+    with transaction.atomic():
+        pending = list(LedgerEntry.objects.filter(block__isnull=True).order_by('id')[:limit])
+        if not pending:
+            return None
+
+        head = LedgerBlock.objects.order_by('-index').first()
+        index = head.index + 1 if head else 0
+        previous_hash = head.block_hash if head else GENESIS_HASH
+        levels = merkle_levels([entry_leaf(entry) for entry in pending])
+        root = levels[-1][0]
+        created_at = timezone.now()
+
+        block = LedgerBlock.objects.create(
+            index=index,
+            previous_hash=previous_hash,
+            merkle_root=root,
+            block_hash=block_hash(index, previous_hash, root, len(pending), created_at),
+            entry_count=len(pending),
+            created_at=created_at,
+        )
+        # One prepared UPDATE per entry; bulk_update's CASE expressions cost
+        # far more to build than to run for a full block
+        proof_field = LedgerEntry._meta.get_field('proof')
+        table = connection.ops.quote_name(LedgerEntry._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE {table} SET block_id = %s, position = %s, proof = %s WHERE id = %s',
+                [(block.pk, position, proof_field.get_db_prep_save(_path(levels, position), connection), entry.pk)
+                 for position, entry in enumerate(pending)],
+            )
+        versioning.bump([versioning.LEDGER])
+        return block
+
+
+def seal_full_blocks():
+    """Seal pending entries only while there are enough to fill a block"""
+    sealed = []
+    try:
+        while LedgerEntry.objects.filter(block__isnull=True).count() >= block_size():
+            sealed.append(seal_block())
+    except IntegrityError:
+        # Another worker sealed the same entries first
+        pass
+    return sealed
+
+
+def seal_pending():
+    """Seal every pending entry, including a final partial block"""
+    sealed = []
+    while True:
+        block = seal_block()
+        if block is None:
+            return sealed
+        sealed.append(block)
+
+
+def block_leaves(block):
+    entries = LedgerEntry.objects.filter(block=block).order_by('position')
+    return [
+        leaf_hash(record_type, record_id, action, digest)
+        for record_type, record_id, action, digest
+        in entries.values_list('record_type', 'record_id', 'action', 'payload_hash')
+    ]
+
+
+def inclusion_proof(entry):
+    """O(log n) inclusion proof for a sealed entry, or None if still pending"""
+    if entry.block_id is None:
+        return None
+    block = entry.block
+    proof = entry.proof
+    if proof is None:
+        proof = merkle_proof(block_leaves(block), entry.position)
+    return {
+        'leaf': entry_leaf(entry),
+        'proof': proof,
+        'merkle_root': block.merkle_root,
+        'block_index': block.index,
+        'block_hash': block.block_hash,
+    }
+
+
+def batch_proof(batch_id):
+    """
+    Inclusion proofs for every collection event, processing step and quality
+    test of a batch, built from the proofs stored when each block was sealed.
+
+    Block headers are listed once and referenced by index from each record.
+    """
+    records = (
+        Q(record_type='collection_event',
+          record_id__in=CollectionEvent.objects.filter(processingbatch__batch_id=batch_id).values('pk'))
+        | Q(record_type='processing_step',
+            record_id__in=ProcessingStep.objects.filter(batch__batch_id=batch_id).values('pk'))
+        | Q(record_type='quality_test',
+            record_id__in=QualityTest.objects.filter(batch__batch_id=batch_id).values('pk'))
+    )
+    latest = {}
+    for entry in LedgerEntry.objects.filter(records).select_related('block').order_by('id'):
+        latest[(entry.record_type, entry.record_id)] = entry
+
+    blocks = {}
+    anchored = []
+    pending = []
+    for (record_type, record_id), entry in sorted(latest.items()):
+        if entry.action == 'delete':
+            continue
+        if entry.block_id is None:
+            pending.append({'type': record_type, 'id': record_id})
+            continue
+        proof = inclusion_proof(entry)
+        block = entry.block
+        blocks[block.index] = {
+            'previous_hash': block.previous_hash,
+            'merkle_root': block.merkle_root,
+            'block_hash': block.block_hash,
+        }
+        anchored.append({
+            'type': record_type,
+            'id': record_id,
+            'action': entry.action,
+            'payload_hash': entry.payload_hash,
+            'leaf': proof['leaf'],
+            'block': block.index,
+            'proof': proof['proof'],
+        })
+
+    checkpoint = LedgerCheckpoint.objects.order_by('-block_index').values_list('block_index', flat=True).first()
+    return {
+        'anchored': not pending,
+        'verified_through_block': checkpoint,
+        'blocks': blocks,
+        'records': anchored,
+        'pending': pending,
+    }
+
+
+def _verify_blocks(blocks, previous_hash):
+    checked = 0
+    last = None
+    for block in blocks:
+        if block.previous_hash != previous_hash:
+            return checked, last, f'Block #{block.index} does not link to its predecessor'
+        leaves = block_leaves(block)
+        if len(leaves) != block.entry_count:
+            return checked, last, f'Block #{block.index} entry count mismatch'
+        if merkle_root(leaves) != block.merkle_root:
+            return checked, last, f'Block #{block.index} Merkle root mismatch'
+        expected = block_hash(block.index, block.previous_hash, block.merkle_root,
+                              block.entry_count, block.created_at)
+        if expected != block.block_hash:
+            return checked, last, f'Block #{block.index} header hash mismatch'
+        previous_hash = block.block_hash
+        last = block
+        checked += 1
+    return checked, last, None
+
+
+def verify_chain(full=False):
+    """
+    Verify blocks sealed since the last checkpoint (or the whole chain when
+    full=True) and record a new checkpoint at the verified head.
+    """
+    checkpoint = None if full else LedgerCheckpoint.objects.order_by('-block_index').first()
+    blocks = LedgerBlock.objects.order_by('index')
+
+    if checkpoint is None:
+        previous_hash = GENESIS_HASH
+        head_index = None
+    else:
+        anchored = LedgerBlock.objects.filter(index=checkpoint.block_index).values_list('block_hash', flat=True).first()
+        if anchored != checkpoint.block_hash:
+            return VerificationResult(False, 0, checkpoint.block_index,
+                                      f'Checkpointed block #{checkpoint.block_index} has changed')
+        previous_hash = checkpoint.block_hash
+        head_index = checkpoint.block_index
+        blocks = blocks.filter(index__gt=checkpoint.block_index)
+
+    checked, last, error = _verify_blocks(blocks.iterator(), previous_hash)
+    if last is not None:
+        head_index = last.index
+        if error is None:
+            LedgerCheckpoint.objects.create(block_index=last.index, block_hash=last.block_hash)
+            # Cached batch proofs report the checkpoint they were verified through
+            versioning.bump([versioning.LEDGER])
+    return VerificationResult(error is None, checked, head_index, error)
+
+
+def verify_records(record_type=None):
+    """
+    Compare each tracked record's current contents with its latest ledger
+    entry and yield (record_type, record_id) for every row that differs.
+    """
+    record_types = [record_type] if record_type else list(RECORD_MODELS)
+    for rtype in record_types:
+        latest = dict(
+            LedgerEntry.objects.filter(record_type=rtype)
+            .order_by('id')
+            .values_list('record_id', 'payload_hash')
+        )
+        for instance in RECORD_MODELS[rtype].objects.iterator():
+            if latest.get(instance.pk) != payload_hash(instance):
+                yield rtype, instance.pk
@@ -0,0 +1,127 @@
+import json
+import random
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from traceability.models import CollectionEvent, ProcessingBatch
+from traceability.spatial import radius_bbox
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def _endpoints(batch_ids, points):
+    """{name: url factory}; factories take a Random so every run hits a spread of records"""
+    def batch(name, suffix=''):
+        return lambda rng: reverse(name, args=[rng.choice(batch_ids)]) + suffix
+
+    def around(template):
+        def url(rng):
+            lat, lng = rng.choice(points)
+            bbox = ','.join(f'{value:.5f}' for value in radius_bbox(lat, lng, 25))
+            return template.format(lat=lat, lng=lng, bbox=bbox)
+        return url
+
+    return {
+        'home': lambda rng: reverse('home'),
+        'processing_form': lambda rng: reverse('processing_form'),
+        'lab_form': lambda rng: reverse('lab_form'),
+        'batch_detail': batch('batch_detail'),
+        'batch_data': batch('batch_data_api'),
+        'batch_data_proof': batch('batch_data_api', '?proof=1'),
+        'qr_png': lambda rng: reverse('qr_code_image', args=[rng.choice(batch_ids), 'png']),
+        'stats': lambda rng: reverse('stats_api'),
+        'analytics_harvest': lambda rng: reverse('analytics_api', args=['harvest']) + '?dimension=species',
+        'analytics_processing': lambda rng: reverse('analytics_api', args=['processing']) + '?dimension=facility',
+        'api_batches': lambda rng: '/api/batches/',
+        'api_batch': lambda rng: f'/api/batches/{rng.choice(batch_ids)}/',
+        'map_data': around('/api/collections/map_data/?bbox={bbox}&limit=1000'),
+        'within_radius': around('/api/collections/within-radius/?lat={lat}&lng={lng}&radius_km=25&limit=1000'),
+        'tiles': lambda rng: '/api/collections/tiles/4/11/6/',
+        'autocomplete_batches': lambda rng: reverse('autocomplete_api', args=['batches']) + '?q='
+                                            + rng.choice(batch_ids)[:rng.randint(1, 8)],
+        'autocomplete_events': lambda rng: reverse('autocomplete_api', args=['events']) + '?q='
+                                           + rng.choice(['ra', 'su', 'mo', 'geeta', 'vijay k']),
+        'search': lambda rng: reverse('search_api') + '?q=' + rng.choice(
+            [rng.choice(batch_ids)[:rng.randint(3, 10)], 'herbal testing', 'ramesh', 'deccan', 'cert-', 'wayanad']),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Time the main views and API endpoints with the test client: latency percentiles, queries and memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per endpoint first')
+        parser.add_argument('--endpoint', action='append', help='Only these endpoints (repeatable)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+
+    def handle(self, *args, **options):
+        batch_ids = list(ProcessingBatch.objects.order_by('?').values_list('batch_id', flat=True)[:200])
+        points = list(CollectionEvent.objects.order_by('?').values_list('gps_latitude', 'gps_longitude')[:200])
+        if not batch_ids or not points:
+            raise CommandError('Load some data first (e.g. manage.py generate_synthetic_data)')
+        endpoints = _endpoints(batch_ids, points)
+        selected = options['endpoint'] or list(endpoints)
+        unknown = set(selected) - set(endpoints)
+        if unknown:
+            raise CommandError(f'Unknown endpoint(s) {", ".join(sorted(unknown))}; '
+                               f'expected any of {", ".join(endpoints)}')
+
+        client = Client()
+        rng = random.Random(options['seed'])
+        self.stdout.write(f'{"endpoint":<22}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"max ms":>9}'
+                          f'{"queries":>9}{"peak KiB":>10}')
+        results = {}
+        for name in selected:
+            url = endpoints[name]
+            for _ in range(options['warmup']):
+                self._request(client, url(rng))
+            latencies, queries = [], []
+            for _ in range(options['requests']):
+                with ExitStack() as stack:
+                    captured = [stack.enter_context(CaptureQueriesContext(connection))
+                                for connection in connections.all()]
+                    started = time.perf_counter()
+                    self._request(client, url(rng))
+                    latencies.append(time.perf_counter() - started)
+                queries.append(sum(len(context.captured_queries) for context in captured))
+            # Memory is measured on a separate request; tracing slows everything down
+            tracemalloc.start()
+            self._request(client, url(rng))
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            results[name] = {
+                'p50_ms': _percentile(latencies, 0.5) * 1000,
+                'p95_ms': _percentile(latencies, 0.95) * 1000,
+                'p99_ms': _percentile(latencies, 0.99) * 1000,
+                'max_ms': max(latencies) * 1000,
+                'queries': _percentile(queries, 0.5),
+                'peak_kib': peak / 1024,
+            }
+            row = results[name]
+            self.stdout.write(f'{name:<22}{row["p50_ms"]:9.1f}{row["p95_ms"]:9.1f}{row["p99_ms"]:9.1f}'
+                              f'{row["max_ms"]:9.1f}{row["queries"]:9d}{row["peak_kib"]:10.0f}')
+        if options['json_path']:
+            with open(options['json_path'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+    def _request(self, client, url):
+        response = client.get(url)
+        if response.status_code >= 400:
+            raise CommandError(f'{url} returned {response.status_code}')
+        # Streaming responses do their work while being consumed
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from traceability import fastjson
+from traceability.models import CollectionEvent, ProcessingBatch
+from traceability.serializers import CollectionEventSerializer, ProcessingBatchListSerializer
+from traceability.views import CollectionEventViewSet, ProcessingBatchViewSet
+
+
+def _serializer_path(queryset, serializer_class):
+    def run():
+        return JSONRenderer().render(serializer_class(queryset.all(), many=True).data)
+    return run
+
+
+def _fast_path(queryset, viewset):
+    columns, extract = viewset.fast_list_extractor()
+
+    def run():
+        return fastjson.dumps([extract(row) for row in queryset.values_list(*columns, named=True)])
+    return run
+
+
+class Command(BaseCommand):
+    help = 'Compare rows/sec of the DRF serializers against the values_list fast path for list endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Rows per endpoint')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per path; the best is reported')
+
+    def handle(self, *args, **options):
+        if not CollectionEvent.objects.exists():
+            raise CommandError('Load some data first (e.g. manage.py load_sample_data)')
+        endpoints = {
+            'collections': (
+                CollectionEvent.objects.select_related('collector', 'species').order_by('id'),
+                CollectionEventSerializer, CollectionEventViewSet,
+            ),
+            'batches': (
+                ProcessingBatch.objects.order_by('-start_date', '-id'),
+                ProcessingBatchListSerializer, ProcessingBatchViewSet,
+            ),
+        }
+        encoder = 'orjson' if fastjson.orjson is not None else 'json (orjson not installed)'
+        self.stdout.write(f'Fast path encoder: {encoder}')
+        for name, (queryset, serializer_class, viewset) in endpoints.items():
+            queryset = queryset[:options['rows']]
+            rows = queryset.count()
+            if not rows:
+                continue
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{name}: {rows} rows'))
+            results = {}
+            for label, run in (('serializer', _serializer_path(queryset, serializer_class)),
+                               ('fast path', _fast_path(queryset, viewset))):
+                best = min(self._time(run) for _ in range(options['repeat']))
+                results[label] = best
+                self.stdout.write(f'  {label:<11} {rows / best:12.0f} rows/s   {best * 1000:8.1f} ms')
+            self.stdout.write(f'  speedup     {results["serializer"] / results["fast path"]:12.1f}x')
+
+    def _time(self, run):
+        started = time.perf_counter()
+        run()
+        return time.perf_counter() - started
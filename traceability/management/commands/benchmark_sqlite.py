@@ -0,0 +1,144 @@
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.utils import OperationalError
+
+from traceability import sqlite, stats
+from traceability.models import CollectionEvent, Collector, HerbSpecies, ProcessingBatch
+from traceability.provenance import load_batch_provenance
+
+# Rollback journal and Django's default (deferred) transactions: the
+# behaviour before tuning
+BASELINE_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+BASELINE_OPTIONS = {}
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def _read(batch_ids):
+    choice = random.random()
+    if choice < 0.4 and batch_ids:
+        load_batch_provenance(random.choice(batch_ids))
+    elif choice < 0.8:
+        lat, lng = random.uniform(20, 30), random.uniform(75, 85)
+        list(CollectionEvent.objects.filter(
+            gps_latitude__range=(lat - 1, lat + 1), gps_longitude__range=(lng - 1, lng + 1),
+        ).values_list('id', 'quantity_kg')[:100])
+    else:
+        stats.dashboard_totals()
+
+
+def _write(collector, species):
+    with transaction.atomic():
+        CollectionEvent.objects.create(
+            collector=collector, species=species, harvest_date=date.today(),
+            gps_latitude=random.uniform(20, 30), gps_longitude=random.uniform(75, 85),
+            quantity_kg=round(random.uniform(1, 50), 2), quality_grade=random.choice('ABC'),
+            weather_conditions='Benchmark',
+        )
+
+
+def _worker(path, pragmas, db_options, duration, write_ratio, results):
+    database = connections['default']
+    database.close()
+    database.settings_dict['NAME'] = path
+    if db_options is not None:
+        database.settings_dict['OPTIONS'] = db_options
+    settings.SQLITE_PRAGMAS = pragmas
+    random.seed(os.getpid())
+
+    collector = Collector.objects.order_by('?').first()
+    species = HerbSpecies.objects.order_by('?').first()
+    batch_ids = list(ProcessingBatch.objects.values_list('batch_id', flat=True)[:200])
+    reads, writes, errors = [], [], 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        is_write = random.random() < write_ratio
+        started = time.perf_counter()
+        try:
+            if is_write:
+                _write(collector, species)
+            else:
+                _read(batch_ids)
+        except OperationalError:
+            errors += 1
+            continue
+        (writes if is_write else reads).append(time.perf_counter() - started)
+    database.close()
+    results.put((reads, writes, errors))
+
+
+class Command(BaseCommand):
+    help = 'Measure mixed read/write throughput of several worker processes against a copy of the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent worker processes')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per run')
+        parser.add_argument('--write-ratio', type=float, default=0.2, help='Fraction of operations that write')
+        parser.add_argument('--mode', choices=['baseline', 'tuned', 'both'], default='both',
+                            help='SQLite defaults, settings.SQLITE_PRAGMAS, or both for comparison')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark targets the SQLite backend')
+        if not Collector.objects.exists() or not HerbSpecies.objects.exists():
+            raise CommandError('Load some data first (e.g. manage.py load_sample_data)')
+
+        modes = ['baseline', 'tuned'] if options['mode'] == 'both' else [options['mode']]
+        source = str(connection.settings_dict['NAME'])
+        connections.close_all()
+        workdir = tempfile.mkdtemp(prefix='sqlite_bench_')
+        try:
+            for mode in modes:
+                path = os.path.join(workdir, f'{mode}.sqlite3')
+                with sqlite3.connect(source) as src, sqlite3.connect(path) as dst:
+                    src.backup(dst)
+                    dst.execute(f"PRAGMA journal_mode = {'DELETE' if mode == 'baseline' else 'WAL'}")
+                if mode == 'baseline':
+                    self._run(mode, path, BASELINE_PRAGMAS, BASELINE_OPTIONS, options)
+                else:
+                    self._run(mode, path, sqlite.pragmas(), None, options)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _run(self, mode, path, pragmas, db_options, options):
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = [
+            context.Process(target=_worker, args=(path, pragmas, db_options, options['duration'],
+                                                  options['write_ratio'], results))
+            for _ in range(options['workers'])
+        ]
+        for process in processes:
+            process.start()
+        reads, writes, errors = [], [], 0
+        for _ in processes:
+            worker_reads, worker_writes, worker_errors = results.get()
+            reads += worker_reads
+            writes += worker_writes
+            errors += worker_errors
+        for process in processes:
+            process.join()
+
+        elapsed = options['duration']
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{mode}: {options["workers"]} workers, {elapsed:.0f}s'))
+        self.stdout.write(f'  throughput   {(len(reads) + len(writes)) / elapsed:10.1f} ops/s '
+                          f'({len(reads) / elapsed:.1f} reads/s, {len(writes) / elapsed:.1f} writes/s)')
+        for label, latencies in (('read', reads), ('write', writes)):
+            self.stdout.write(f'  {label:<5} p50 {_percentile(latencies, 0.5) * 1000:8.2f} ms   '
+                              f'p99 {_percentile(latencies, 0.99) * 1000:8.2f} ms')
+        self.stdout.write(f'  "database is locked" errors: {errors}')
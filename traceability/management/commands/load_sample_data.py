@@ -169,10 +169,8 @@ class Command(BaseCommand):
             
             self.stdout.write(f'Created batch: {batch_id}')
         
-        # Generate QR codes for all batches
-        for batch in ProcessingBatch.objects.all():
-            if not batch.qr_code:
-                batch.generate_qr_code()
+        # QR codes are rendered on demand (or queued by ProcessingBatch.save);
+        # print label sheets with `manage.py print_qr_labels`
         
         self.stdout.write(self.style.SUCCESS('Sample data loaded successfully!'))
         
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from traceability import labels
+
+
+class Command(BaseCommand):
+    help = 'Render QR labels for many batches into print-ready PDF sheets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', action='append', dest='batch_ids', help='Batch ID (repeatable); default all')
+        parser.add_argument('--status', help='Only batches with this status')
+        parser.add_argument('--output', default='qr_labels.pdf', help='PDF file to write')
+        parser.add_argument('--columns', type=int, default=labels.DEFAULT_COLUMNS, help='Labels per row')
+        parser.add_argument('--rows', type=int, default=labels.DEFAULT_ROWS, help='Rows per sheet')
+        parser.add_argument('--workers', type=int, help='Render processes (default: CPU count)')
+
+    def handle(self, *args, **options):
+        if options['columns'] < 1 or options['rows'] < 1:
+            raise CommandError('--columns and --rows must be positive')
+        batch_ids = labels.select_batch_ids(options['batch_ids'], options['status'])
+        if not batch_ids:
+            raise CommandError('No matching batches')
+        workers = options['workers'] or labels.default_workers()
+        with open(options['output'], 'w+b') as output:
+            for page, _ in enumerate(labels.write_label_pdf(
+                    batch_ids, output, columns=options['columns'],
+                    rows=options['rows'], workers=workers), start=1):
+                self.stdout.write(f'Wrote sheet {page}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {len(batch_ids)} label(s) to {options["output"]}'))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from traceability import qr
+
+
+class Command(BaseCommand):
+    help = 'Render queued batch QR codes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new jobs')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between polls with --loop')
+        parser.add_argument('--limit', type=int, default=100, help='Jobs claimed per poll')
+
+    def handle(self, *args, **options):
+        while True:
+            rendered = qr.process_jobs(limit=options['limit'])
+            if rendered:
+                self.stdout.write(f'Rendered {rendered} QR code(s)')
+            if not options['loop']:
+                break
+            if not rendered:
+                time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('QR job queue drained'))
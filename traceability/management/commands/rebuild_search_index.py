@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from traceability import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search documents for batches, collectors and quality tests'
+
+    def handle(self, *args, **options):
+        if not search.available():
+            raise CommandError('The full-text search index needs SQLite FTS5; other databases search the tables')
+        count = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} search documents'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from traceability import analytics, stats
+
+
+class Command(BaseCommand):
+    help = 'Reconcile the dashboard statistics and analytics rollups with the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Report drifted counters without rewriting them')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drifted = list(stats.drift()) + list(analytics.drift())
+            for *counter, stored, expected in drifted:
+                self.stdout.write(f'{":".join(map(str, counter))} stored {stored}, expected {expected}')
+            if drifted:
+                self.stdout.write(self.style.WARNING(f'{len(drifted)} counter(s) out of date'))
+            else:
+                self.stdout.write(self.style.SUCCESS('Statistics are up to date'))
+            return
+        count = stats.rebuild()
+        rollups = analytics.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} statistics counters and {rollups} daily rollups'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from traceability import tiles
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the pre-aggregated harvest map tiles from collection events'
+
+    def handle(self, *args, **options):
+        count = tiles.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} harvest tile cells'))
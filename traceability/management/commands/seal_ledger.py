@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from traceability import ledger
+
+
+class Command(BaseCommand):
+    help = 'Seal pending ledger entries into hash-chained blocks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backfill', action='store_true',
+                            help='Append entries for existing records that are not yet in the ledger')
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            appended = ledger.backfill()
+            self.stdout.write(f'Appended {appended} entries for existing records')
+
+        blocks = ledger.seal_pending()
+        for block in blocks:
+            self.stdout.write(f'Sealed block #{block.index}: {block.entry_count} entries, root {block.merkle_root}')
+        self.stdout.write(self.style.SUCCESS(f'Sealed {len(blocks)} block(s)'))
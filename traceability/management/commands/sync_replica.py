@@ -0,0 +1,41 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from traceability import routers
+
+# Pages copied per backup step; readers of the replica are only blocked
+# while a step is written
+PAGES_PER_STEP = 1024
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database onto the read replica file (local replica setups)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep copying every --interval seconds')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between copies with --loop')
+
+    def handle(self, *args, **options):
+        alias = routers.replica_alias()
+        if alias is None:
+            raise CommandError('No replica database is configured (set REPLICA_DATABASE_NAME)')
+        primary, replica = connections['default'], connections[alias]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('sync_replica only copies SQLite files; use streaming replication for Postgres')
+        source, target = str(primary.settings_dict['NAME']), str(replica.settings_dict['NAME'])
+        if source == target:
+            raise CommandError('The replica must be a different file from the primary')
+
+        while True:
+            started = time.perf_counter()
+            with sqlite3.connect(source) as src, sqlite3.connect(target) as dst:
+                src.backup(dst, pages=PAGES_PER_STEP)
+            src.close()
+            dst.close()
+            self.stdout.write(f'Copied {source} to {target} in {(time.perf_counter() - started) * 1000:.0f} ms')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from traceability import ledger
+
+
+class Command(BaseCommand):
+    help = 'Verify the provenance ledger incrementally from the last checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Re-verify the whole chain from the genesis block')
+        parser.add_argument('--records', action='store_true',
+                            help='Also compare current records against their latest ledger entries')
+
+    def handle(self, *args, **options):
+        result = ledger.verify_chain(full=options['full'])
+        if not result.ok:
+            raise CommandError(result.error)
+        self.stdout.write(f'Verified {result.blocks_checked} block(s), head at #{result.head_index}')
+
+        if options['records']:
+            tampered = list(ledger.verify_records())
+            for record_type, record_id in tampered:
+                self.stdout.write(self.style.ERROR(f'{record_type} {record_id} does not match the ledger'))
+            if tampered:
+                raise CommandError(f'{len(tampered)} record(s) differ from the ledger')
+
+        self.stdout.write(self.style.SUCCESS('Ledger verified'))
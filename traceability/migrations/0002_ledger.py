@@ -0,0 +1,59 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traceability', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField(unique=True)),
+                ('previous_hash', models.CharField(max_length=64)),
+                ('merkle_root', models.CharField(max_length=64)),
+                ('block_hash', models.CharField(max_length=64, unique=True)),
+                ('entry_count', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['index'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('block_index', models.PositiveIntegerField()),
+                ('block_hash', models.CharField(max_length=64)),
+                ('verified_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['block_index'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('record_type', models.CharField(choices=[('collection_event', 'Collection Event'), ('processing_step', 'Processing Step'), ('quality_test', 'Quality Test')], max_length=20)),
+                ('record_id', models.PositiveBigIntegerField()),
+                ('action', models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete')], max_length=10)),
+                ('payload_hash', models.CharField(max_length=64)),
+                ('position', models.PositiveIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('block', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='traceability.ledgerblock')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['record_type', 'record_id'], name='ledger_entry_record_idx')],
+            },
+        ),
+    ]
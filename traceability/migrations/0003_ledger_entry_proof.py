@@ -0,0 +1,112 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:52
+
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import migrations, models
+from django.utils import timezone
+
+# Frozen copy of the hashing and sealing in traceability.ledger (backfill()
+# followed by seal_pending()), so later changes there cannot alter what this
+# migration writes
+GENESIS_HASH = '0' * 64
+RECORD_MODELS = (
+    ('collection_event', 'CollectionEvent'),
+    ('processing_step', 'ProcessingStep'),
+    ('quality_test', 'QualityTest'),
+)
+DERIVED_FIELDS = {'geohash'}
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def payload_hash(instance):
+    values = {
+        field.attname: field.value_from_object(instance)
+        for field in instance._meta.concrete_fields
+        if field.attname not in DERIVED_FIELDS
+    }
+    return _sha256(json.dumps(values, sort_keys=True, separators=(',', ':'), cls=DjangoJSONEncoder).encode())
+
+
+def leaf_hash(entry):
+    return _sha256(b'\x00' + f'{entry.record_type}:{entry.record_id}:{entry.action}:{entry.payload_hash}'.encode())
+
+
+def merkle_levels(leaves):
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [_sha256(b'\x01' + bytes.fromhex(level[i]) + bytes.fromhex(level[i + 1]))
+                   for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def merkle_path(levels, index):
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append(['L' if sibling < index else 'R', level[sibling]])
+        index //= 2
+    return proof
+
+
+def backfill_ledger(apps, schema_editor):
+    """Append and seal 'create' entries for records written before the ledger existed"""
+    LedgerEntry = apps.get_model('traceability', 'LedgerEntry')
+    LedgerBlock = apps.get_model('traceability', 'LedgerBlock')
+    for record_type, model_name in RECORD_MODELS:
+        recorded = LedgerEntry.objects.filter(record_type=record_type).values('record_id')
+        LedgerEntry.objects.bulk_create([
+            LedgerEntry(record_type=record_type, record_id=instance.pk, action='create',
+                        payload_hash=payload_hash(instance))
+            for instance in apps.get_model('traceability', model_name).objects.exclude(pk__in=recorded)
+            .order_by('pk').iterator()
+        ], batch_size=500)
+
+    block_size = getattr(settings, 'LEDGER_BLOCK_SIZE', 256)
+    head = LedgerBlock.objects.order_by('-index').first()
+    index = head.index + 1 if head else 0
+    previous_hash = head.block_hash if head else GENESIS_HASH
+    while True:
+        pending = list(LedgerEntry.objects.filter(block__isnull=True).order_by('id')[:block_size])
+        if not pending:
+            return
+        levels = merkle_levels([leaf_hash(entry) for entry in pending])
+        root = levels[-1][0]
+        created_at = timezone.now()
+        header = f'{index}:{previous_hash}:{root}:{len(pending)}:{created_at.isoformat()}'
+        block = LedgerBlock.objects.create(index=index, previous_hash=previous_hash, merkle_root=root,
+                                           block_hash=_sha256(header.encode()), entry_count=len(pending),
+                                           created_at=created_at)
+        for position, entry in enumerate(pending):
+            entry.block = block
+            entry.position = position
+            entry.proof = merkle_path(levels, position)
+        LedgerEntry.objects.bulk_update(pending, ['block', 'position', 'proof'], batch_size=500)
+        index += 1
+        previous_hash = block.block_hash
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traceability', '0002_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='proof',
+            field=models.JSONField(blank=True, help_text='Merkle audit path, stored when the block is sealed', null=True),
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
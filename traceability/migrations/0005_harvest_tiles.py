@@ -0,0 +1,74 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:56
+
+import math
+from collections import defaultdict
+
+from django.db import migrations, models
+
+# Frozen copy of traceability.tiles.cell_for / tile_deltas, so later changes
+# there cannot alter what this migration writes
+CELL_MAX_ZOOM = 15
+MAX_LATITUDE = 85.05112878
+CHUNK_SIZE = 2000
+
+
+def cell_for(lat, lng, zoom):
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    n = 1 << zoom
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def populate_harvest_tiles(apps, schema_editor):
+    """Aggregate existing events one zoom level at a time, so memory stays bounded by the cell count"""
+    CollectionEvent = apps.get_model('traceability', 'CollectionEvent')
+    HarvestTile = apps.get_model('traceability', 'HarvestTile')
+    rows = CollectionEvent.objects.values_list('gps_latitude', 'gps_longitude', 'quantity_kg', 'quality_grade')
+    if not rows.exists():
+        return
+    for zoom in range(CELL_MAX_ZOOM + 1):
+        cells = defaultdict(lambda: [0, 0.0, 0, 0, 0, 0.0, 0.0])
+        for lat, lng, quantity, grade in rows.iterator(chunk_size=CHUNK_SIZE):
+            cell = cells[cell_for(lat, lng, zoom)]
+            cell[0] += 1
+            cell[1] += quantity
+            if grade in ('A', 'B', 'C'):
+                cell[2 + 'ABC'.index(grade)] += 1
+            cell[5] += lat
+            cell[6] += lng
+        HarvestTile.objects.bulk_create([
+            HarvestTile(zoom=zoom, x=x, y=y, event_count=count, total_quantity_kg=quantity, grade_a=grade_a,
+                        grade_b=grade_b, grade_c=grade_c, latitude_sum=lat_sum, longitude_sum=lng_sum)
+            for (x, y), (count, quantity, grade_a, grade_b, grade_c, lat_sum, lng_sum) in cells.items()
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traceability', '0004_version_stamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HarvestTile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zoom', models.PositiveSmallIntegerField()),
+                ('x', models.PositiveIntegerField()),
+                ('y', models.PositiveIntegerField()),
+                ('event_count', models.IntegerField(default=0)),
+                ('total_quantity_kg', models.FloatField(default=0)),
+                ('grade_a', models.IntegerField(default=0)),
+                ('grade_b', models.IntegerField(default=0)),
+                ('grade_c', models.IntegerField(default=0)),
+                ('latitude_sum', models.FloatField(default=0)),
+                ('longitude_sum', models.FloatField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('zoom', 'x', 'y'), name='harvest_tile_cell_unique')],
+            },
+        ),
+        migrations.RunPython(populate_harvest_tiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:57
+
+from django.db import migrations, models
+
+CHUNK_SIZE = 2000
+# Frozen copy of traceability.spatial.encode_geohash, so later changes there
+# cannot alter what this migration writes
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 12
+
+
+def encode_geohash(lat, lng, precision=PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        interval, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def populate_geohash(apps, schema_editor):
+    CollectionEvent = apps.get_model('traceability', 'CollectionEvent')
+    chunk = []
+    for event in CollectionEvent.objects.only('gps_latitude', 'gps_longitude').iterator(chunk_size=CHUNK_SIZE):
+        event.geohash = encode_geohash(event.gps_latitude, event.gps_longitude)
+        chunk.append(event)
+        if len(chunk) == CHUNK_SIZE:
+            CollectionEvent.objects.bulk_update(chunk, ['geohash'], batch_size=1000)
+            chunk = []
+    CollectionEvent.objects.bulk_update(chunk, ['geohash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traceability', '0005_harvest_tiles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collectionevent',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(populate_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:07
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_stat_counters(apps, schema_editor):
+    CollectionEvent = apps.get_model('traceability', 'CollectionEvent')
+    Collector = apps.get_model('traceability', 'Collector')
+    ProcessingBatch = apps.get_model('traceability', 'ProcessingBatch')
+    StatCounter = apps.get_model('traceability', 'StatCounter')
+
+    totals = CollectionEvent.objects.aggregate(count=Count('id'), quantity=Sum('quantity_kg'))
+    counters = [
+        StatCounter(scope='collections', key='', count=totals['count'], quantity_kg=totals['quantity'] or 0),
+        StatCounter(scope='collectors', key='', count=Collector.objects.count()),
+        StatCounter(scope='batches', key='', count=ProcessingBatch.objects.count()),
+    ]
+    for scope, field in (('species', 'species__name'), ('state', 'collector__state'),
+                         ('grade', 'quality_grade'), ('day', 'harvest_date')):
+        groups = CollectionEvent.objects.values_list(field).annotate(Count('id'), Sum('quantity_kg')).order_by()
+        counters += [StatCounter(scope=scope, key=str(key), count=count, quantity_kg=quantity or 0)
+                     for key, count, quantity in groups]
+    for scope, field in (('batch_status', 'status'), ('facility', 'processing_facility')):
+        groups = ProcessingBatch.objects.values_list(field).annotate(Count('id')).order_by()
+        counters += [StatCounter(scope=scope, key=key, count=count) for key, count in groups]
+    StatCounter.objects.bulk_create(counters, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traceability', '0008_qr_code_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('collections', 'Collection events'), ('species', 'Collection events by species'), ('state', 'Collection events by collector state'), ('grade', 'Collection events by quality grade'), ('day', 'Collection events by harvest date'), ('collectors', 'Collectors'), ('batches', 'Processing batches'), ('batch_status', 'Processing batches by status'), ('facility', 'Processing batches by facility')], max_length=20)),
+                ('key', models.CharField(blank=True, max_length=200)),
+                ('count', models.BigIntegerField(default=0)),
+                ('quantity_kg', models.FloatField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('scope', 'key'), name='stat_counter_unique')],
+            },
+        ),
+        migrations.RunPython(populate_stat_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:10
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_daily_rollups(apps, schema_editor):
+    """Same groups as traceability.analytics.expected_rollups"""
+    CollectionEvent = apps.get_model('traceability', 'CollectionEvent')
+    ProcessingStep = apps.get_model('traceability', 'ProcessingStep')
+    DailyRollup = apps.get_model('traceability', 'DailyRollup')
+
+    rollups = []
+    harvest_fields = {'all': None, 'species': 'species__name', 'collector': 'collector__collector_id',
+                      'state': 'collector__state'}
+    for dimension, field in harvest_fields.items():
+        fields = [field] if field else []
+        groups = CollectionEvent.objects.values_list(*fields, 'harvest_date').annotate(
+            Count('id'), Sum('quantity_kg')).order_by()
+        rollups += [DailyRollup(metric='harvest', dimension=dimension, key=key[0] if key else '', day=day,
+                                count=count, total=total or 0.0) for *key, day, count, total in groups]
+
+    step_fields = {'all': None, 'facility': 'batch__processing_facility', 'step_type': 'step_type'}
+    for dimension, field in step_fields.items():
+        fields = [field] if field else []
+        groups = ProcessingStep.objects.annotate(day=TruncDate('timestamp')).values_list(*fields, 'day').annotate(
+            Count('id'), Sum('duration_hours')).order_by()
+        rollups += [DailyRollup(metric='processing', dimension=dimension, key=key[0] if key else '', day=day,
+                                count=count, total=total or 0.0) for *key, day, count, total in groups]
+    DailyRollup.objects.bulk_create(rollups, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traceability', '0009_stat_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('harvest', 'Harvested quantity (kg)'), ('processing', 'Processing duration (hours)')], max_length=20)),
+                ('dimension', models.CharField(max_length=20)),
+                ('key', models.CharField(blank=True, max_length=200)),
+                ('day', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.FloatField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('metric', 'dimension', 'key', 'day'), name='daily_rollup_unique')],
+            },
+        ),
+        migrations.RunPython(populate_daily_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traceability', '0010_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='collectionevent',
+            index=models.Index(fields=['-created_at'], name='event_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='collectionevent',
+            index=models.Index(fields=['species', 'harvest_date'], name='event_species_harvest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='collectionevent',
+            index=models.Index(fields=['harvest_date'], name='event_harvest_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgercheckpoint',
+            index=models.Index(fields=['block_index'], name='ledger_checkpoint_block_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='processingbatch',
+            index=models.Index(fields=['-start_date'], name='batch_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='processingbatch',
+            index=models.Index(fields=['status', '-start_date'], name='batch_status_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='processingstep',
+            index=models.Index(fields=['batch', 'timestamp'], name='step_batch_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='qualitytest',
+            index=models.Index(fields=['test_status'], name='quality_test_status_idx'),
+        ),
+    ]
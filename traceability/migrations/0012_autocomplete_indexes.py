@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:37
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traceability', '0011_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='collector',
+            index=models.Index(django.db.models.functions.text.Lower('collector_id'), name='collector_id_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='collector',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='collector_name_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='processingbatch',
+            index=models.Index(django.db.models.functions.text.Lower('batch_id'), name='batch_id_lower_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:40
+
+from django.db import migrations
+
+# rowid = pk * 3 + position of the kind in traceability.search.KINDS
+CREATE_AND_POPULATE = [
+    "CREATE VIRTUAL TABLE traceability_search USING fts5("
+    "kind UNINDEXED, key UNINDEXED, batch_id UNINDEXED, title, body, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')",
+    "INSERT INTO traceability_search (rowid, kind, key, batch_id, title, body) "
+    "SELECT id * 3, 'batch', batch_id, batch_id, batch_id, processing_facility FROM traceability_processingbatch",
+    "INSERT INTO traceability_search (rowid, kind, key, batch_id, title, body) "
+    "SELECT id * 3 + 1, 'collector', collector_id, '', name || ' ' || collector_id, "
+    "village || ' ' || state || ' ' || license_number FROM traceability_collector",
+    "INSERT INTO traceability_search (rowid, kind, key, batch_id, title, body) "
+    "SELECT test.id * 3 + 2, 'test', test.certificate_number, batch.batch_id, test.certificate_number, "
+    "test.lab_name || ' ' || test.lab_license || ' ' || batch.batch_id "
+    "FROM traceability_qualitytest test JOIN traceability_processingbatch batch ON batch.id = test.batch_id",
+]
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite only; other databases search the source tables
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_AND_POPULATE:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS traceability_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traceability', '0012_autocomplete_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
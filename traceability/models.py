@@ -1,12 +1,11 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 import uuid
-import qrcode
-from PIL import Image
-import io
-import os
 from django.conf import settings
 from django.core.files.base import ContentFile
+from .qr_render import qr_code_url, qr_payload, render_png
+from .spatial import encode_geohash
 
 class Collector(models.Model):
     collector_id = models.CharField(max_length=50, unique=True)
@@ -16,6 +15,13 @@ class Collector(models.Model):
     state = models.CharField(max_length=50)
     license_number = models.CharField(max_length=100, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Case-insensitive prefix search (see traceability.autocomplete)
+            models.Index(Lower('collector_id'), name='collector_id_lower_idx'),
+            models.Index(Lower('name'), name='collector_name_lower_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.collector_id})"
@@ -53,8 +59,20 @@ class CollectionEvent(models.Model):
     soil_ph = models.FloatField(null=True, blank=True)
     organic_certified = models.BooleanField(default=False)
     fair_trade_certified = models.BooleanField(default=False)
+    geohash = models.CharField(max_length=12, db_index=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at'], name='event_recent_idx'),
+            models.Index(fields=['species', 'harvest_date'], name='event_species_harvest_idx'),
+            models.Index(fields=['harvest_date'], name='event_harvest_date_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        self.geohash = encode_geohash(self.gps_latitude, self.gps_longitude)
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return f"{self.species.name} - {self.collector.name} - {self.harvest_date}"
 
@@ -73,25 +91,32 @@ class ProcessingBatch(models.Model):
     ], default='processing')
     qr_code = models.ImageField(upload_to='qr_codes/', blank=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['-start_date'], name='batch_recent_idx'),
+            models.Index(fields=['status', '-start_date'], name='batch_status_start_idx'),
+            models.Index(Lower('batch_id'), name='batch_id_lower_idx'),
+        ]
+    
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        if not self.qr_code:
-            self.generate_qr_code()
+        # QR codes are rendered on demand by default; stored PNGs are opt-in
+        rendering = getattr(settings, 'QR_CODE_RENDERING', 'on_demand')
+        if not self.qr_code and rendering != 'on_demand':
+            if rendering == 'sync':
+                self.generate_qr_code()
+            else:
+                QRCodeJob.enqueue(self)
     
     def generate_qr_code(self):
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr_data = f"{settings.SITE_URL if hasattr(settings, 'SITE_URL') else 'http://127.0.0.1:8000'}/batch/{self.batch_id}/"
-        qr.add_data(qr_data)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
         filename = f'qr_{self.batch_id}.png'
-        
-        self.qr_code.save(filename, ContentFile(buffer.getvalue()), save=False)
+        self.qr_code.save(filename, ContentFile(render_png(qr_payload(self.batch_id))), save=False)
         super().save(update_fields=['qr_code'])
     
+    @property
+    def qr_code_url(self):
+        return qr_code_url(self.batch_id)
+    
     def __str__(self):
         return f"Batch {self.batch_id}"
 
@@ -116,6 +141,9 @@ class ProcessingStep(models.Model):
     
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['batch', 'timestamp'], name='step_batch_timestamp_idx'),
+        ]
     
     def __str__(self):
         return f"{self.batch.batch_id} - {self.get_step_type_display()}"
@@ -148,5 +176,214 @@ class QualityTest(models.Model):
     certificate_number = models.CharField(max_length=100, unique=True)
     notes = models.TextField(blank=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['test_status'], name='quality_test_status_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.batch.batch_id} - {self.lab_name} - {self.test_status}"
+
+class LedgerBlock(models.Model):
+    index = models.PositiveIntegerField(unique=True)
+    previous_hash = models.CharField(max_length=64)
+    merkle_root = models.CharField(max_length=64)
+    block_hash = models.CharField(max_length=64, unique=True)
+    entry_count = models.PositiveIntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['index']
+    
+    def __str__(self):
+        return f"Block #{self.index} ({self.block_hash[:12]})"
+
+class LedgerEntry(models.Model):
+    RECORD_TYPES = [
+        ('collection_event', 'Collection Event'),
+        ('processing_step', 'Processing Step'),
+        ('quality_test', 'Quality Test'),
+    ]
+    ACTIONS = [
+        ('create', 'Create'),
+        ('update', 'Update'),
+        ('delete', 'Delete'),
+    ]
+    
+    record_type = models.CharField(max_length=20, choices=RECORD_TYPES)
+    record_id = models.PositiveBigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    payload_hash = models.CharField(max_length=64)
+    block = models.ForeignKey(LedgerBlock, on_delete=models.PROTECT, null=True, blank=True, related_name='entries')
+    position = models.PositiveIntegerField(null=True, blank=True)
+    proof = models.JSONField(null=True, blank=True, help_text="Merkle audit path, stored when the block is sealed")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['record_type', 'record_id'], name='ledger_entry_record_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        # Entries are append-only; sealing assigns block/position via bulk_update
+        if not self._state.adding:
+            raise ValueError("Ledger entries are append-only and cannot be modified")
+        super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        raise ValueError("Ledger entries are append-only and cannot be deleted")
+    
+    def __str__(self):
+        return f"{self.record_type}:{self.record_id} ({self.action})"
+
+class LedgerCheckpoint(models.Model):
+    block_index = models.PositiveIntegerField()
+    block_hash = models.CharField(max_length=64)
+    verified_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['block_index']
+        indexes = [
+            models.Index(fields=['block_index'], name='ledger_checkpoint_block_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Checkpoint at block #{self.block_index}"
+
+class VersionStamp(models.Model):
+    """Monotonic version counter for a batch or dataset, bumped on every write"""
+    key = models.CharField(max_length=100, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
+class HarvestTile(models.Model):
+    """Pre-aggregated collection events per Web Mercator grid cell and zoom level"""
+    zoom = models.PositiveSmallIntegerField()
+    x = models.PositiveIntegerField()
+    y = models.PositiveIntegerField()
+    event_count = models.IntegerField(default=0)
+    total_quantity_kg = models.FloatField(default=0)
+    grade_a = models.IntegerField(default=0)
+    grade_b = models.IntegerField(default=0)
+    grade_c = models.IntegerField(default=0)
+    latitude_sum = models.FloatField(default=0)
+    longitude_sum = models.FloatField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['zoom', 'x', 'y'], name='harvest_tile_cell_unique'),
+        ]
+    
+    def __str__(self):
+        return f"Tile {self.zoom}/{self.x}/{self.y} ({self.event_count} events)"
+
+class IdempotencyKey(models.Model):
+    """Client-supplied key recorded for an ingested collection event, so retries are not re-inserted"""
+    key = models.CharField(max_length=100, unique=True)
+    event = models.ForeignKey(CollectionEvent, on_delete=models.CASCADE, related_name='idempotency_keys')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return self.key
+
+class SyncSession(models.Model):
+    """Resumable chunked upload from a collector device"""
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('completed', 'Completed'),
+    ]
+    
+    session_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    device_id = models.CharField(max_length=100)
+    committed_seq = models.PositiveIntegerField(default=0, help_text="Highest chunk sequence number committed")
+    record_count = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Sync {self.session_id} ({self.device_id})"
+
+class QRCodeJob(models.Model):
+    """Pending QR code render for a batch, drained by the process_qr_jobs worker"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    batch = models.ForeignKey(ProcessingBatch, on_delete=models.CASCADE, related_name='qr_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id'], name='qr_job_status_idx'),
+        ]
+    
+    @classmethod
+    def enqueue(cls, batch):
+        """Queue a render for batch unless one is already waiting"""
+        if not cls.objects.filter(batch=batch, status__in=['pending', 'running']).exists():
+            cls.objects.create(batch=batch)
+    
+    def __str__(self):
+        return f"QR job for {self.batch_id} ({self.status})"
+
+class StatCounter(models.Model):
+    """Running count and quantity for one dashboard statistic, e.g. ('species', 'tulsi')"""
+    SCOPE_CHOICES = [
+        ('collections', 'Collection events'),
+        ('species', 'Collection events by species'),
+        ('state', 'Collection events by collector state'),
+        ('grade', 'Collection events by quality grade'),
+        ('day', 'Collection events by harvest date'),
+        ('collectors', 'Collectors'),
+        ('batches', 'Processing batches'),
+        ('batch_status', 'Processing batches by status'),
+        ('facility', 'Processing batches by facility'),
+    ]
+    
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES)
+    key = models.CharField(max_length=200, blank=True)
+    count = models.BigIntegerField(default=0)
+    quantity_kg = models.FloatField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='stat_counter_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.scope}:{self.key} = {self.count}"
+
+class DailyRollup(models.Model):
+    """Per-day count and total for one metric, e.g. harvested kg of tulsi on a date"""
+    METRIC_CHOICES = [
+        ('harvest', 'Harvested quantity (kg)'),
+        ('processing', 'Processing duration (hours)'),
+    ]
+    
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    dimension = models.CharField(max_length=20)
+    key = models.CharField(max_length=200, blank=True)
+    day = models.DateField()
+    count = models.IntegerField(default=0)
+    total = models.FloatField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['metric', 'dimension', 'key', 'day'], name='daily_rollup_unique'),
+        ]
+    
     def __str__(self):
-        return f"{self.batch.batch_id} - {self.lab_name} - {self.test_status}"
\ No newline at end of file
+        return f"{self.metric}/{self.dimension}:{self.key} {self.day} = {self.total}"
@@ -0,0 +1,13 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class BatchCursorPagination(CursorPagination):
+    """Newest batches first; each page is one range read on batch_recent_idx"""
+    ordering = ('-start_date', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def get_page_size(self, request):
+        self.page_size = getattr(settings, 'BATCH_PAGE_SIZE', 50)
+        return super().get_page_size(request)
@@ -0,0 +1,133 @@
+"""
+Shared loader and cached documents for a batch's provenance tree.
+
+Views that show a batch to consumers read the same graph: the batch, its
+collection events with their collector and species, its processing steps
+and its quality tests. Loading it through batch_provenance_queryset() costs
+a fixed number of queries regardless of how many records the batch holds.
+
+The consumer JSON document is built from .values_list() rows of the same
+graph (see traceability.fastjson) and cached in the 'provenance' cache
+alias under the batch's version stamp, so repeat scans of a batch are
+served without touching the database. Signal handlers bump the stamp
+whenever any part of the graph changes; superseded documents are never
+read again and age out with the cache TIMEOUT. The batch's ledger proofs
+are cached the same way, under its stamp and the ledger's.
+"""
+from django.core.cache import caches
+from django.db.models import Prefetch
+
+from . import fastjson, ledger
+from .models import CollectionEvent, HerbSpecies, ProcessingBatch, ProcessingStep, QualityTest
+
+# Queries issued by load_batch_provenance() and build_provenance_document():
+# the batch plus one per relation
+PROVENANCE_QUERY_COUNT = 4
+
+CACHE_ALIAS = 'provenance'
+
+
+RELATIONS = ('collection_events', 'processing_steps', 'quality_tests')
+
+
+def batch_provenance_queryset(relations=RELATIONS):
+    """Batches with the given provenance relations prefetched, one query each"""
+    lookups = {
+        'collection_events': Prefetch('collection_events',
+                                      queryset=CollectionEvent.objects.select_related('collector', 'species')),
+        'processing_steps': 'processing_steps',
+        'quality_tests': 'quality_tests',
+    }
+    return ProcessingBatch.objects.prefetch_related(*(lookups[name] for name in relations))
+
+
+def load_batch_provenance(batch_id):
+    """Fetch a batch with its whole provenance tree; raises DoesNotExist"""
+    return batch_provenance_queryset().get(batch_id=batch_id)
+
+
+EVENT_COLUMNS, _event = fastjson.compile_extractor([
+    ('lat', 'gps_latitude', None),
+    ('lng', 'gps_longitude', None),
+    ('collector', 'collector__name', None),
+    ('species', 'species__name', fastjson.display(HerbSpecies, 'name')),
+    ('harvest_date', 'harvest_date', fastjson.day),
+    ('quantity', 'quantity_kg', None),
+    ('grade', 'quality_grade', None),
+])
+
+STEP_COLUMNS, _step = fastjson.compile_extractor([
+    ('step', 'step_type', fastjson.display(ProcessingStep, 'step_type')),
+    ('timestamp', 'timestamp', fastjson.minutes),
+    ('operator', 'operator_name', None),
+    ('temperature', 'temperature', None),
+    ('humidity', 'humidity', None),
+])
+
+TEST_COLUMNS, _test = fastjson.compile_extractor([
+    ('lab', 'lab_name', None),
+    ('date', 'test_date', fastjson.day),
+    ('status', 'test_status', fastjson.display(QualityTest, 'test_status')),
+    ('moisture', 'moisture_content', None),
+    ('pesticide', 'pesticide_residue', fastjson.display(QualityTest, 'pesticide_residue')),
+    ('certificate', 'certificate_number', None),
+])
+
+_batch_status = fastjson.display(ProcessingBatch, 'status')
+
+
+def build_provenance_document(batch_id):
+    """
+    Consumer-facing JSON document for a batch, built from .values_list() rows
+    with PROVENANCE_QUERY_COUNT queries; raises ProcessingBatch.DoesNotExist.
+    """
+    pk, status, facility = ProcessingBatch.objects.values_list(
+        'pk', 'status', 'processing_facility').get(batch_id=batch_id)
+    events = CollectionEvent.objects.filter(processingbatch=pk).order_by('id').values_list(*EVENT_COLUMNS)
+    steps = ProcessingStep.objects.filter(batch=pk).values_list(*STEP_COLUMNS)
+    tests = QualityTest.objects.filter(batch=pk).order_by('id').values_list(*TEST_COLUMNS)
+    return {
+        'batch_id': batch_id,
+        'status': _batch_status(status),
+        'facility': facility,
+        'collection_events': [_event(row) for row in events],
+        'processing_timeline': [_step(row) for row in steps],
+        'quality_tests': [_test(row) for row in tests],
+    }
+
+
+def _cache_key(batch_id, version):
+    return f'provenance:{batch_id}:{version}'
+
+
+def get_provenance_document(batch_id, version):
+    """
+    Cached provenance document for a batch at the given version stamp;
+    raises ProcessingBatch.DoesNotExist.
+
+    Keying by version means a change is picked up as soon as the stamp is
+    bumped, and a document read from a lagging replica is never served for
+    a newer version.
+    """
+    cache = caches[CACHE_ALIAS]
+    key = _cache_key(batch_id, version)
+    document = cache.get(key)
+    if document is None:
+        document = build_provenance_document(batch_id)
+        cache.set(key, document)
+    return document
+
+
+def get_batch_proof(batch_id, batch_version, ledger_version):
+    """
+    Cached ledger.batch_proof() for a batch, keyed like the provenance
+    document by the batch's version stamp and also by the ledger's, which
+    sealing a block or recording a checkpoint bumps.
+    """
+    cache = caches[CACHE_ALIAS]
+    key = f'provenance-proof:{batch_id}:{batch_version}:{ledger_version}'
+    proof = cache.get(key)
+    if proof is None:
+        proof = ledger.batch_proof(batch_id)
+        cache.set(key, proof)
+    return proof
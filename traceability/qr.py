@@ -0,0 +1,87 @@
+"""
+Background QR code rendering.
+
+ProcessingBatch.save() only queues a QRCodeJob, so creating a batch commits
+in one write and never waits on PNG encoding. Jobs are drained by the
+process_qr_jobs management command (run it alongside the web workers), or
+by an in-process background thread when QR_CODE_WORKER_THREAD is enabled,
+which is convenient with runserver.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import QRCodeJob
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+# Running jobs not updated for this long are assumed to belong to a dead worker
+STALE_AFTER = timedelta(minutes=10)
+
+_executor = None
+
+
+def _claim(job_id):
+    """Atomically move a pending job to running; False if another worker got it"""
+    return QRCodeJob.objects.filter(pk=job_id, status='pending').update(
+        status='running', attempts=F('attempts') + 1, updated_at=timezone.now(),
+    ) == 1
+
+
+def requeue_stale_jobs():
+    return QRCodeJob.objects.filter(
+        status='running', updated_at__lt=timezone.now() - STALE_AFTER,
+    ).update(status='pending', updated_at=timezone.now())
+
+
+def run_job(job):
+    batch = job.batch
+    try:
+        if not batch.qr_code:
+            batch.generate_qr_code()
+    except Exception as exc:
+        logger.exception('QR render failed for batch %s', batch.batch_id)
+        job.refresh_from_db(fields=['attempts'])
+        job.status = 'failed' if job.attempts >= MAX_ATTEMPTS else 'pending'
+        job.last_error = str(exc)
+        job.save(update_fields=['status', 'last_error', 'updated_at'])
+        return False
+    job.status = 'done'
+    job.last_error = ''
+    job.save(update_fields=['status', 'last_error', 'updated_at'])
+    return True
+
+
+def process_jobs(limit=100):
+    """Render up to `limit` pending jobs; returns the number rendered"""
+    requeue_stale_jobs()
+    rendered = 0
+    job_ids = list(QRCodeJob.objects.filter(status='pending').values_list('id', flat=True)[:limit])
+    for job_id in job_ids:
+        if not _claim(job_id):
+            continue
+        job = QRCodeJob.objects.select_related('batch').get(pk=job_id)
+        rendered += run_job(job)
+    return rendered
+
+
+def _drain_in_background():
+    try:
+        while process_jobs():
+            pass
+    finally:
+        close_old_connections()
+
+
+def submit_background_drain():
+    """Drain the queue on this process's single background worker thread"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='qr-worker')
+    _executor.submit(_drain_in_background)
@@ -0,0 +1,110 @@
+"""
+QR code rendering for batch labels.
+
+A batch's QR code is fully determined by SITE_URL and its batch_id, so
+images are rendered on demand and cached by a content address: the SHA-256
+of the encoded URL, format and size. Rendered bytes live in a small
+in-process LRU and in the 'qr' cache alias (file based by default, culled at
+MAX_ENTRIES), so storage stays bounded and changing SITE_URL simply produces
+new addresses instead of requiring thousands of files to be regenerated.
+"""
+import hashlib
+import io
+from functools import lru_cache
+
+import qrcode
+import qrcode.image.svg
+from django.conf import settings
+from django.core.cache import caches
+from django.urls import reverse
+from PIL import Image, ImageDraw, ImageFont
+
+CACHE_ALIAS = 'qr'
+# Bump when rendering changes so cached images get new content addresses
+RENDER_VERSION = 1
+
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'pdf': 'application/pdf',
+}
+PNG_SIZES = (128, 256, 512, 1024)
+LABEL_DPI = 300
+LABEL_SIZE = (600, 720)
+
+
+def qr_payload(batch_id):
+    site_url = settings.SITE_URL if hasattr(settings, 'SITE_URL') else 'http://127.0.0.1:8000'
+    return f"{site_url}/batch/{batch_id}/"
+
+
+def content_address(payload, fmt, size=None):
+    return hashlib.sha256(f'{RENDER_VERSION}|{fmt}|{size or ""}|{payload}'.encode()).hexdigest()
+
+
+def qr_code_url(batch_id):
+    """On-demand QR image URL, versioned by content address so it can be cached immutably"""
+    address = content_address(qr_payload(batch_id), 'png')
+    return f"{reverse('qr_code_image', args=[batch_id, 'png'])}?v={address[:16]}"
+
+
+def _qr_image(payload, box_size=10, border=5):
+    qr = qrcode.QRCode(version=1, box_size=box_size, border=border)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return qr.make_image(fill_color="black", back_color="white").get_image().convert('L')
+
+
+def render_png(payload, size=None):
+    img = _qr_image(payload)
+    if size:
+        img = img.resize((size, size), Image.NEAREST)
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def render_svg(payload):
+    img = qrcode.make(payload, image_factory=qrcode.image.svg.SvgPathImage, box_size=10, border=4)
+    buffer = io.BytesIO()
+    img.save(buffer)
+    return buffer.getvalue()
+
+
+def render_label(payload, caption):
+    """Printable label image: the QR code with the batch_id caption underneath"""
+    width, height = LABEL_SIZE
+    label = Image.new('L', LABEL_SIZE, 255)
+    label.paste(_qr_image(payload).resize((width - 40, width - 40), Image.NEAREST), (20, 10))
+    draw = ImageDraw.Draw(label)
+    font = ImageFont.load_default(size=44)
+    text_width = draw.textlength(caption, font=font)
+    draw.text(((width - text_width) / 2, width - 10), caption, fill=0, font=font)
+    return label
+
+
+def render_pdf(payload, caption):
+    buffer = io.BytesIO()
+    render_label(payload, caption).save(buffer, format='PDF', resolution=LABEL_DPI)
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=256)
+def _render(payload, fmt, size, caption):
+    if fmt == 'svg':
+        return render_svg(payload)
+    if fmt == 'pdf':
+        return render_pdf(payload, caption)
+    return render_png(payload, size)
+
+
+def get_qr_code(batch_id, fmt='png', size=None):
+    """(content_address, bytes) for a batch's QR code, rendered at most once per address"""
+    payload = qr_payload(batch_id)
+    address = content_address(payload, fmt, size)
+    cache = caches[CACHE_ALIAS]
+    data = cache.get(address)
+    if data is None:
+        data = _render(payload, fmt, size, batch_id)
+        cache.set(address, data)
+    return address, data
@@ -0,0 +1,90 @@
+"""
+Read/write split for consumer traffic.
+
+Views wrapped in @replica_reads (consumer QR lookups, stats and analytics)
+send their reads to the READ_REPLICA_ALIAS database when it is configured;
+everything else, and every write, uses 'default'. After a client POSTs,
+ReplicaStickinessMiddleware sets a short-lived cookie so that client's
+reads stay on the primary until the replica has caught up with its write.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+STICKY_COOKIE = 'primary_reads_until'
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def replica_alias():
+    """The configured replica alias, or None when there is no replica"""
+    alias = getattr(settings, 'READ_REPLICA_ALIAS', 'replica')
+    return alias if alias in connections.databases else None
+
+
+def sticky_seconds():
+    return getattr(settings, 'READ_REPLICA_STICKY_SECONDS', 10)
+
+
+def is_pinned_to_primary(request):
+    try:
+        return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+@contextmanager
+def reading_from(alias):
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def replica_reads(view):
+    """Route the view's reads to the replica unless the client recently wrote"""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        alias = replica_alias()
+        if alias is None or is_pinned_to_primary(request):
+            return view(request, *args, **kwargs)
+        with reading_from(alias):
+            return view(request, *args, **kwargs)
+    return wrapped
+
+
+class ReadReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary and is never migrated itself
+        return db != replica_alias()
+
+
+class ReplicaStickinessMiddleware:
+    """Pin a client's reads to the primary for a few seconds after it writes"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and replica_alias() is not None:
+            seconds = sticky_seconds()
+            response.set_cookie(STICKY_COOKIE, str(time.time() + seconds), max_age=seconds,
+                                httponly=True, samesite='Lax')
+        return response
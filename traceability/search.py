@@ -0,0 +1,167 @@
+"""
+Full-text search over batches, collectors and quality tests.
+
+On SQLite every record has one document in the traceability_search FTS5
+table (created by migration 0013), kept in step by signals, including the
+bulk-create ones. Every query term matches as a prefix, served by FTS5
+prefix indexes, and results are ranked with bm25 with title matches
+weighted above body matches.
+
+A document's rowid is pk * len(KINDS) + the kind's position, so saving a
+record replaces its document in place. Other databases fall back to
+icontains lookups on the source tables, unranked.
+"""
+import re
+
+from django.db import connection, connections, router, transaction
+from django.db.models import Q
+from django.urls import reverse
+
+from .models import Collector, ProcessingBatch, QualityTest
+
+TABLE = 'traceability_search'
+KINDS = ('batch', 'collector', 'test')
+# bm25 weights for the kind, key, batch_id, title and body columns
+WEIGHTS = (0.0, 0.0, 0.0, 10.0, 1.0)
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# unicode61 splits tokens on anything but letters and digits
+TOKEN = re.compile(r'[^\W_]+')
+
+
+def available(using=None):
+    return (connections[using] if using else connection).vendor == 'sqlite'
+
+
+def _rowid(kind, pk):
+    return pk * len(KINDS) + KINDS.index(kind)
+
+
+def batch_document(batch):
+    return 'batch', batch.pk, batch.batch_id, batch.batch_id, batch.batch_id, batch.processing_facility
+
+
+def collector_document(collector):
+    return ('collector', collector.pk, collector.collector_id, '', f'{collector.name} {collector.collector_id}',
+            f'{collector.village} {collector.state} {collector.license_number}')
+
+
+def test_document(test, batch_id):
+    return ('test', test.pk, test.certificate_number, batch_id, test.certificate_number,
+            f'{test.lab_name} {test.lab_license} {batch_id}')
+
+
+def index(documents):
+    """Insert or replace the given documents"""
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {TABLE} (rowid, kind, key, batch_id, title, body) VALUES (%s, %s, %s, %s, %s, %s)',
+            [(_rowid(kind, pk), kind, *fields) for kind, pk, *fields in documents],
+        )
+
+
+def remove(kind, pks):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [(_rowid(kind, pk),) for pk in pks])
+
+
+def index_tests(tests):
+    """Index quality tests, looking up the batch_ids not already loaded"""
+    tests = list(tests)
+    batch_ids = dict(ProcessingBatch.objects.filter(
+        pk__in={test.batch_id for test in tests if not QualityTest.batch.is_cached(test)}
+    ).values_list('pk', 'batch_id')) if tests else {}
+    index([
+        test_document(test, test.batch.batch_id if QualityTest.batch.is_cached(test) else batch_ids[test.batch_id])
+        for test in tests
+    ])
+
+
+def rebuild(chunk_size=5000):
+    """Recreate every document from the source tables"""
+    if not available():
+        return 0
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+        for queryset, document in (
+            (ProcessingBatch.objects.all(), batch_document),
+            (Collector.objects.all(), collector_document),
+            (QualityTest.objects.select_related('batch'), lambda test: test_document(test, test.batch.batch_id)),
+        ):
+            chunk = []
+            for instance in queryset.iterator(chunk_size=chunk_size):
+                chunk.append(document(instance))
+                if len(chunk) == chunk_size:
+                    index(chunk)
+                    chunk = []
+            index(chunk)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {TABLE}')
+            return cursor.fetchone()[0]
+
+
+def match_expression(query):
+    """
+    FTS5 query for user input: each whitespace-separated term becomes a
+    phrase of its tokens with the last one matched as a prefix, so
+    'ash-2024-0' finds ASH-2024-001. All terms must match.
+    """
+    phrases = []
+    for term in query.split():
+        tokens = TOKEN.findall(term.lower())
+        if tokens:
+            phrases.append(f'"{" ".join(tokens)}"*')
+    return ' '.join(phrases)
+
+
+def _url(kind, pk, batch_id):
+    if kind == 'collector':
+        return reverse('collector-detail', args=[pk])
+    return reverse('batch_detail', args=[batch_id])
+
+
+def _result(kind, pk, key, batch_id, title, body, score):
+    return {'type': kind, 'key': key, 'batch_id': batch_id or None, 'title': title, 'body': body,
+            'score': score, 'url': _url(kind, pk, batch_id)}
+
+
+def search(query, kinds=KINDS, limit=DEFAULT_LIMIT):
+    """Best matches first, as dicts with type, key, batch_id, title, body, score and url"""
+    expression = match_expression(query or '')
+    if not expression:
+        return []
+    using = router.db_for_read(ProcessingBatch)
+    if not available(using):
+        return _search_source_tables(query.strip(), kinds, limit)
+    kinds = list(kinds)
+    with connections[using].cursor() as cursor:
+        # Ordering by the rank column lets FTS5 sort internally, faster than ORDER BY bm25(...)
+        cursor.execute(
+            f'SELECT rowid, kind, key, batch_id, title, body, rank FROM {TABLE} '
+            f'WHERE {TABLE} MATCH %s AND rank MATCH %s AND kind IN ({", ".join(["%s"] * len(kinds))}) '
+            f'ORDER BY rank LIMIT %s',
+            [expression, f'bm25({", ".join(map(str, WEIGHTS))})', *kinds, limit],
+        )
+        # bm25 is negative, best first; report it as a positive relevance
+        return [_result(kind, rowid // len(KINDS), key, batch_id, title, body, -rank)
+                for rowid, kind, key, batch_id, title, body, rank in cursor.fetchall()]
+
+
+def _search_source_tables(query, kinds, limit):
+    results = []
+    if 'batch' in kinds:
+        results += [_result(*batch_document(batch), None) for batch in ProcessingBatch.objects.filter(
+            Q(batch_id__icontains=query) | Q(processing_facility__icontains=query))[:limit]]
+    if 'collector' in kinds:
+        results += [_result(*collector_document(collector), None) for collector in Collector.objects.filter(
+            Q(collector_id__icontains=query) | Q(name__icontains=query) | Q(village__icontains=query))[:limit]]
+    if 'test' in kinds:
+        results += [_result(*test_document(test, test.batch.batch_id), None)
+                    for test in QualityTest.objects.select_related('batch').filter(
+                        Q(certificate_number__icontains=query) | Q(lab_name__icontains=query))[:limit]]
+    return results[:limit]
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Collector, HerbSpecies, CollectionEvent, ProcessingBatch, ProcessingStep, QualityTest
+from .models import (Collector, HerbSpecies, CollectionEvent, ProcessingBatch, ProcessingStep, QualityTest,
+                     SyncSession)
 
 class CollectorSerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,6 +20,25 @@ class CollectionEventSerializer(serializers.ModelSerializer):
         model = CollectionEvent
         fields = '__all__'
 
+class CollectionEventIngestSerializer(serializers.Serializer):
+    """One harvest record in a bulk upload; collector and species are referenced by natural key"""
+    idempotency_key = serializers.CharField(max_length=100, required=False)
+    collector_id = serializers.CharField(max_length=50)
+    collector_name = serializers.CharField(max_length=200, required=False)
+    village = serializers.CharField(max_length=100, required=False)
+    state = serializers.CharField(max_length=50, required=False)
+    phone = serializers.CharField(max_length=15, required=False, allow_blank=True)
+    species = serializers.CharField(max_length=50)
+    harvest_date = serializers.DateField()
+    gps_latitude = serializers.FloatField(min_value=-90, max_value=90)
+    gps_longitude = serializers.FloatField(min_value=-180, max_value=180)
+    quantity_kg = serializers.FloatField(min_value=0)
+    quality_grade = serializers.ChoiceField(choices=['A', 'B', 'C'])
+    weather_conditions = serializers.CharField(max_length=100)
+    soil_ph = serializers.FloatField(required=False, allow_null=True)
+    organic_certified = serializers.BooleanField(default=False)
+    fair_trade_certified = serializers.BooleanField(default=False)
+
 class ProcessingStepSerializer(serializers.ModelSerializer):
     step_type_display = serializers.CharField(source='get_step_type_display', read_only=True)
     
@@ -33,11 +53,41 @@ class QualityTestSerializer(serializers.ModelSerializer):
         model = QualityTest
         fields = '__all__'
 
+class ProcessingBatchListSerializer(serializers.ModelSerializer):
+    """One row per batch with no related records, for listings"""
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    qr_code_url = serializers.CharField(read_only=True)
+    
+    class Meta:
+        model = ProcessingBatch
+        fields = ('id', 'batch_id', 'processing_facility', 'start_date', 'end_date', 'batch_size_kg',
+                  'status', 'status_display', 'qr_code_url')
+
 class ProcessingBatchSerializer(serializers.ModelSerializer):
+    """
+    A batch with its provenance records nested. When the context carries an
+    `expand` set, only those relations are included.
+    """
+    EXPANDABLE_FIELDS = ('collection_events', 'processing_steps', 'quality_tests')
+    
     processing_steps = ProcessingStepSerializer(many=True, read_only=True)
     quality_tests = QualityTestSerializer(many=True, read_only=True)
     collection_events = CollectionEventSerializer(many=True, read_only=True)
+    qr_code_url = serializers.CharField(read_only=True)
     
     class Meta:
         model = ProcessingBatch
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = self.context.get('expand')
+        if expand is not None:
+            for name in set(self.EXPANDABLE_FIELDS) - set(expand):
+                self.fields.pop(name)
+
+class SyncSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SyncSession
+        fields = ('session_id', 'device_id', 'committed_seq', 'record_count', 'status', 'created_at', 'updated_at')
+        read_only_fields = ('committed_seq', 'record_count', 'status')
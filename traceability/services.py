@@ -0,0 +1,44 @@
+"""
+Write operations that span several models.
+
+Each runs in one transaction, so a failure leaves nothing behind, and
+issues a fixed number of queries however many rows it touches.
+"""
+import uuid
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CollectionEvent, ProcessingBatch
+
+
+def create_batch(batch_id, processing_facility, event_ids=(), batch_size_kg=None, start_date=None):
+    """
+    Create a processing batch linked to the collection events with the given
+    event_ids. All event_ids must exist. batch_size_kg defaults to the total
+    harvested quantity of those events.
+    """
+    try:
+        event_ids = {uuid.UUID(str(event_id)) for event_id in event_ids}
+    except ValueError:
+        raise ValueError('Collection event IDs must be UUIDs')
+    with transaction.atomic():
+        events = {
+            event_id: (pk, quantity_kg)
+            for pk, event_id, quantity_kg in CollectionEvent.objects.filter(event_id__in=event_ids)
+            .values_list('pk', 'event_id', 'quantity_kg')
+        }
+        missing = event_ids - events.keys()
+        if missing:
+            raise ValueError(f'Unknown collection events: {", ".join(sorted(map(str, missing)))}')
+        if batch_size_kg is None:
+            batch_size_kg = round(sum(quantity_kg for _, quantity_kg in events.values()), 2)
+        batch = ProcessingBatch.objects.create(
+            batch_id=batch_id,
+            processing_facility=processing_facility,
+            start_date=start_date or timezone.now(),
+            batch_size_kg=batch_size_kg,
+        )
+        # One INSERT for all links; m2m_changed still fires once for cache invalidation
+        batch.collection_events.add(*(pk for pk, _ in events.values()))
+    return batch
@@ -0,0 +1,347 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import Signal, receiver
+
+from . import analytics, ledger, qr, search, sqlite, stats, tiles, versioning
+from .models import Collector, CollectionEvent, HerbSpecies, ProcessingBatch, ProcessingStep, QualityTest, QRCodeJob
+
+# Sent with events=[...] after CollectionEvent.objects.bulk_create(), which
+# does not send post_save for the rows it inserts
+collection_events_created = Signal()
+# Sent with collectors=[...] after Collector.objects.bulk_create()
+collectors_created = Signal()
+
+
+def batches_changed(batch_ids):
+    """Bump the version stamps of changed batches; cached documents are keyed by them"""
+    versioning.bump([versioning.batch_key(batch_id) for batch_id in batch_ids])
+
+
+@receiver(post_save, sender=CollectionEvent)
+@receiver(post_save, sender=ProcessingStep)
+@receiver(post_save, sender=QualityTest)
+def record_ledger_write(sender, instance, created, raw=False, **kwargs):
+    """Append every write to a tracked record to the provenance ledger"""
+    if raw:
+        return
+    ledger.append(instance, 'create' if created else 'update')
+
+
+@receiver(post_delete, sender=CollectionEvent)
+@receiver(post_delete, sender=ProcessingStep)
+@receiver(post_delete, sender=QualityTest)
+def record_ledger_delete(sender, instance, **kwargs):
+    ledger.append(instance, 'delete')
+
+
+# Batch version stamps (ETags and provenance document cache keys)
+
+@receiver(post_save, sender=ProcessingBatch)
+@receiver(post_delete, sender=ProcessingBatch)
+def invalidate_batch_document(sender, instance, **kwargs):
+    # A renamed batch also retires the documents cached under its old batch_id
+    previous = getattr(instance, '_previous_batch_id', None)
+    batches_changed({instance.batch_id, previous} - {None})
+
+
+@receiver(post_save, sender=ProcessingStep)
+@receiver(post_delete, sender=ProcessingStep)
+@receiver(post_save, sender=QualityTest)
+@receiver(post_delete, sender=QualityTest)
+def invalidate_parent_batch_document(sender, instance, **kwargs):
+    batch_ids = ProcessingBatch.objects.filter(pk=instance.batch_id).values_list('batch_id', flat=True)
+    batches_changed(batch_ids)
+
+
+@receiver(post_save, sender=CollectionEvent)
+@receiver(pre_delete, sender=CollectionEvent)
+def invalidate_event_batch_documents(sender, instance, **kwargs):
+    # pre_delete: the M2M rows linking the event to its batches are gone by post_delete
+    batch_ids = ProcessingBatch.objects.filter(collection_events=instance).values_list('batch_id', flat=True)
+    batches_changed(batch_ids)
+
+
+@receiver(post_save, sender=Collector)
+def invalidate_collector_batch_documents(sender, instance, created, **kwargs):
+    if created:
+        return
+    batch_ids = ProcessingBatch.objects.filter(collection_events__collector=instance).values_list('batch_id', flat=True)
+    batches_changed(batch_ids.distinct())
+
+
+@receiver(post_save, sender=HerbSpecies)
+def invalidate_species_batch_documents(sender, instance, created, **kwargs):
+    if created:
+        return
+    batch_ids = ProcessingBatch.objects.filter(collection_events__species=instance).values_list('batch_id', flat=True)
+    batches_changed(batch_ids.distinct())
+
+
+@receiver(m2m_changed, sender=ProcessingBatch.collection_events.through)
+def invalidate_linked_batch_documents(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear', 'post_clear'):
+        return
+    if not reverse:
+        if action != 'pre_clear':
+            batches_changed([instance.batch_id])
+        return
+    # Reverse side: instance is a CollectionEvent and pk_set holds batch pks
+    if action == 'pre_clear':
+        batches = ProcessingBatch.objects.filter(collection_events=instance)
+    elif action == 'post_clear':
+        return
+    else:
+        batches = ProcessingBatch.objects.filter(pk__in=pk_set)
+    batches_changed(batches.values_list('batch_id', flat=True))
+
+
+@receiver(post_save, sender=CollectionEvent)
+@receiver(post_delete, sender=CollectionEvent)
+def bump_collection_events_version(sender, instance, **kwargs):
+    versioning.bump([versioning.COLLECTION_EVENTS])
+
+
+@receiver(post_save, sender=Collector)
+@receiver(post_save, sender=HerbSpecies)
+def bump_collection_events_version_for_names(sender, instance, created, **kwargs):
+    # Collector and species names appear in the map data
+    if not created:
+        versioning.bump([versioning.COLLECTION_EVENTS])
+
+
+# Harvest map tiles, dashboard statistics and analytics rollups
+
+@receiver(pre_save, sender=CollectionEvent)
+def remember_aggregated_rows(sender, instance, raw=False, **kwargs):
+    """Fetch the stored tile, stats and rollup rows of an updated event in one query"""
+    instance._previous_tile_row = instance._previous_stat_row = instance._previous_rollup_row = None
+    if instance.pk and not raw:
+        previous = (
+            CollectionEvent.objects.filter(pk=instance.pk)
+            .values_list('gps_latitude', 'gps_longitude', 'quantity_kg', 'quality_grade',
+                         'species__name', 'collector__state', 'harvest_date', 'collector__collector_id')
+            .first()
+        )
+        if previous is not None:
+            lat, lng, quantity, grade, species, state, day, collector_id = previous
+            instance._previous_tile_row = (lat, lng, quantity, grade)
+            instance._previous_stat_row = (species, state, grade, day, quantity)
+            instance._previous_rollup_row = (day, quantity, ('', species, collector_id, state))
+
+
+@receiver(post_save, sender=CollectionEvent)
+def update_harvest_tiles(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    row = tiles.event_row(instance)
+    previous = getattr(instance, '_previous_tile_row', None)
+    if previous == row:
+        return
+    if previous is not None:
+        tiles.record_events([previous], sign=-1)
+    tiles.record_events([row])
+
+
+@receiver(post_delete, sender=CollectionEvent)
+def remove_from_harvest_tiles(sender, instance, **kwargs):
+    tiles.record_events([tiles.event_row(instance)], sign=-1)
+
+
+@receiver(post_save, sender=CollectionEvent)
+def update_event_stats(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    row = stats.event_row(instance)
+    previous = getattr(instance, '_previous_stat_row', None)
+    if previous == row:
+        return
+    deltas = stats.event_deltas([row])
+    if previous is not None:
+        stats.event_deltas([previous], sign=-1, deltas=deltas)
+    stats.apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=CollectionEvent)
+def remove_event_stats(sender, instance, **kwargs):
+    stats.record_events([stats.event_row(instance)], sign=-1)
+
+
+@receiver(post_save, sender=CollectionEvent)
+def update_harvest_rollups(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    row = analytics.harvest_row(instance)
+    previous = getattr(instance, '_previous_rollup_row', None)
+    if previous == row:
+        return
+    deltas = analytics.rollup_deltas(analytics.HARVEST, [row])
+    if previous is not None:
+        analytics.rollup_deltas(analytics.HARVEST, [previous], sign=-1, deltas=deltas)
+    analytics.apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=CollectionEvent)
+def remove_harvest_rollups(sender, instance, **kwargs):
+    analytics.record(analytics.HARVEST, [analytics.harvest_row(instance)], sign=-1)
+
+
+@receiver(pre_save, sender=ProcessingStep)
+def remember_step_rollup_row(sender, instance, raw=False, **kwargs):
+    instance._previous_rollup_row = None
+    if instance.pk and not raw:
+        previous = (
+            ProcessingStep.objects.filter(pk=instance.pk)
+            .values_list('timestamp', 'duration_hours', 'batch__processing_facility', 'step_type')
+            .first()
+        )
+        if previous is not None:
+            timestamp, duration, facility, step_type = previous
+            instance._previous_rollup_row = (analytics.step_day(timestamp), duration or 0.0,
+                                             ('', facility, step_type))
+
+
+@receiver(post_save, sender=ProcessingStep)
+def update_processing_rollups(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    row = analytics.step_row(instance)
+    previous = getattr(instance, '_previous_rollup_row', None)
+    if previous == row:
+        return
+    deltas = analytics.rollup_deltas(analytics.PROCESSING, [row])
+    if previous is not None:
+        analytics.rollup_deltas(analytics.PROCESSING, [previous], sign=-1, deltas=deltas)
+    analytics.apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=ProcessingStep)
+def remove_processing_rollups(sender, instance, **kwargs):
+    analytics.record(analytics.PROCESSING, [analytics.step_row(instance)], sign=-1)
+
+
+@receiver(pre_save, sender=ProcessingBatch)
+def remember_batch_stat_row(sender, instance, raw=False, **kwargs):
+    """Fetch the stored stats row and batch_id of an updated batch in one query"""
+    instance._previous_stat_row = instance._previous_batch_id = None
+    if instance.pk and not raw:
+        previous = (
+            ProcessingBatch.objects.filter(pk=instance.pk)
+            .values_list('status', 'processing_facility', 'batch_id')
+            .first()
+        )
+        if previous is not None:
+            instance._previous_stat_row = previous[:2]
+            instance._previous_batch_id = previous[2]
+
+
+@receiver(post_save, sender=ProcessingBatch)
+def update_batch_stats(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    row = stats.batch_row(instance)
+    previous = getattr(instance, '_previous_stat_row', None)
+    if previous == row:
+        return
+    deltas = stats.batch_deltas([row])
+    if previous is not None:
+        stats.batch_deltas([previous], sign=-1, deltas=deltas)
+        if previous[1] != instance.processing_facility:
+            analytics.move(analytics.PROCESSING, 'facility', previous[1], instance.processing_facility,
+                           analytics.step_day_totals(instance.processing_steps.all()))
+    stats.apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=ProcessingBatch)
+def remove_batch_stats(sender, instance, **kwargs):
+    stats.record_batches([stats.batch_row(instance)], sign=-1)
+
+
+@receiver(pre_save, sender=Collector)
+def remember_collector_keys(sender, instance, raw=False, **kwargs):
+    instance._previous_keys = None
+    if instance.pk and not raw:
+        instance._previous_keys = (
+            Collector.objects.filter(pk=instance.pk).values_list('state', 'collector_id').first()
+        )
+
+
+@receiver(post_save, sender=Collector)
+def update_collector_stats(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        stats.record_collectors(1)
+        return
+    previous = getattr(instance, '_previous_keys', None)
+    if previous is None:
+        return
+    state, collector_id = previous
+    if state != instance.state:
+        stats.move_collector_state(instance, state)
+    for dimension, old_key, new_key in (('state', state, instance.state),
+                                        ('collector', collector_id, instance.collector_id)):
+        if old_key != new_key:
+            analytics.move(analytics.HARVEST, dimension, old_key, new_key,
+                           analytics.harvest_day_totals(CollectionEvent.objects.filter(collector=instance)))
+
+
+@receiver(post_delete, sender=Collector)
+def remove_collector_stats(sender, instance, **kwargs):
+    stats.record_collectors(-1)
+
+
+@receiver(collection_events_created)
+def record_bulk_created_events(sender, events, **kwargs):
+    ledger.append_many(events, 'create')
+    tiles.record_events([tiles.event_row(event) for event in events])
+    stats.record_events([stats.event_row(event) for event in events])
+    analytics.record(analytics.HARVEST, [analytics.harvest_row(event) for event in events])
+    versioning.bump([versioning.COLLECTION_EVENTS])
+
+
+@receiver(collectors_created)
+def record_bulk_created_collectors(sender, collectors, **kwargs):
+    stats.record_collectors(len(collectors))
+    search.index([search.collector_document(collector) for collector in collectors])
+
+
+# Full-text search documents
+
+@receiver(post_save, sender=ProcessingBatch)
+def index_batch(sender, instance, created, **kwargs):
+    search.index([search.batch_document(instance)])
+    # Test documents carry the batch_id, remembered by remember_batch_stat_row
+    previous = getattr(instance, '_previous_batch_id', None)
+    if previous is not None and previous != instance.batch_id:
+        search.index_tests(instance.quality_tests.select_related('batch'))
+
+
+@receiver(post_save, sender=Collector)
+def index_collector(sender, instance, **kwargs):
+    search.index([search.collector_document(instance)])
+
+
+@receiver(post_save, sender=QualityTest)
+def index_quality_test(sender, instance, **kwargs):
+    search.index_tests([instance])
+
+
+@receiver(post_delete, sender=ProcessingBatch)
+@receiver(post_delete, sender=Collector)
+@receiver(post_delete, sender=QualityTest)
+def remove_search_document(sender, instance, **kwargs):
+    kind = {ProcessingBatch: 'batch', Collector: 'collector', QualityTest: 'test'}[sender]
+    search.remove(kind, [instance.pk])
+
+
+@receiver(post_save, sender=QRCodeJob)
+def start_qr_worker_thread(sender, instance, created, **kwargs):
+    if created and getattr(settings, 'QR_CODE_WORKER_THREAD', False):
+        transaction.on_commit(qr.submit_background_drain)
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    sqlite.apply_pragmas(connection)
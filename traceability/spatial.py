@@ -0,0 +1,123 @@
+"""
+Geohash spatial index for collection events.
+
+Each CollectionEvent stores the geohash of its GPS position in an indexed
+column. A bounding box is covered by a small set of geohash prefixes, and
+each prefix becomes a B-tree range scan (prefix <= geohash < prefix + '{'),
+so radius, bounding-box and polygon lookups only touch rows near the query
+area. The index is a plain column, so it works on SQLite and any other
+database without extensions.
+"""
+import math
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 12
+# '{' sorts immediately after 'z', the last geohash character
+RANGE_END = '{'
+MAX_COVER_CELLS = 32
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+
+def encode_geohash(lat, lng, precision=PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        interval, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(lat_degrees, lng_degrees) spanned by a geohash cell of the given length"""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def cover_prefixes(min_lng, min_lat, max_lng, max_lat):
+    """Smallest-cell set of geohash prefixes (at most MAX_COVER_CELLS) covering a bbox"""
+    for precision in range(PRECISION, 0, -1):
+        lat_step, lng_step = cell_size(precision)
+        rows = math.floor(max_lat / lat_step) - math.floor(min_lat / lat_step) + 1
+        cols = math.floor(max_lng / lng_step) - math.floor(min_lng / lng_step) + 1
+        if rows * cols <= MAX_COVER_CELLS:
+            break
+    prefixes = set()
+    lat = min_lat
+    while True:
+        lng = min_lng
+        while True:
+            prefixes.add(encode_geohash(min(lat, max_lat), min(lng, max_lng), precision))
+            if lng >= max_lng:
+                break
+            lng += lng_step
+        if lat >= max_lat:
+            break
+        lat += lat_step
+    return sorted(prefixes)
+
+
+def bbox_q(min_lng, min_lat, max_lng, max_lat):
+    """Q object selecting events inside a bbox via geohash prefix ranges"""
+    ranges = [
+        Q(geohash__gte=prefix, geohash__lt=prefix + RANGE_END)
+        for prefix in cover_prefixes(min_lng, min_lat, max_lng, max_lat)
+    ]
+    return reduce(or_, ranges) & Q(
+        gps_longitude__gte=min_lng, gps_longitude__lte=max_lng,
+        gps_latitude__gte=min_lat, gps_latitude__lte=max_lat,
+    )
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def radius_bbox(lat, lng, radius_km):
+    """Bounding box (min_lng, min_lat, max_lng, max_lat) enclosing a circle"""
+    lat_delta = radius_km / KM_PER_DEGREE
+    lng_delta = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    return (max(lng - lng_delta, -180.0), max(lat - lat_delta, -90.0),
+            min(lng + lng_delta, 180.0), min(lat + lat_delta, 90.0))
+
+
+def polygon_bbox(polygon):
+    lngs = [lng for lng, _ in polygon]
+    lats = [lat for _, lat in polygon]
+    return min(lngs), min(lats), max(lngs), max(lats)
+
+
+def point_in_polygon(lng, lat, polygon):
+    """Ray casting test for a point against a list of (lng, lat) vertices"""
+    inside = False
+    j = len(polygon) - 1
+    for i, (xi, yi) in enumerate(polygon):
+        xj, yj = polygon[j]
+        if (yi > lat) != (yj > lat) and lng < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
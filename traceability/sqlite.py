@@ -0,0 +1,38 @@
+"""
+SQLite connection tuning.
+
+Every new SQLite connection gets settings.SQLITE_PRAGMAS applied: WAL so
+readers never block the writer, synchronous=NORMAL (durable at checkpoints,
+safe with WAL), a busy timeout so writers queue instead of failing, and a
+larger page cache and memory map for read-heavy traffic.
+"""
+from django.conf import settings
+
+# Pragmas that return their new value, which is read back and discarded
+RESULT_PRAGMAS = {'journal_mode', 'mmap_size'}
+
+
+def pragmas():
+    return getattr(settings, 'SQLITE_PRAGMAS', {})
+
+
+def apply_pragmas(connection, values=None):
+    values = pragmas() if values is None else values
+    if connection.vendor != 'sqlite' or not values:
+        return
+    with connection.cursor() as cursor:
+        for name, value in values.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+            if name in RESULT_PRAGMAS:
+                cursor.fetchone()
+
+
+def current_pragmas(connection, names=None):
+    """{name: value} as reported by the connection"""
+    with connection.cursor() as cursor:
+        result = {}
+        for name in names or pragmas():
+            cursor.execute(f'PRAGMA {name}')
+            row = cursor.fetchone()
+            result[name] = row[0] if row else None
+        return result
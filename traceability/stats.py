@@ -0,0 +1,189 @@
+"""
+Pre-aggregated dashboard statistics.
+
+StatCounter rows hold a running count (and harvested quantity, for
+collection events) per (scope, key): totals, species, collector state,
+quality grade and harvest day for collection events, plus collectors and
+processing batches by status and facility. Signals apply +1/-1 deltas as
+rows are written, so reading any statistic is a unique-index lookup instead
+of a COUNT(*) scan. rebuild() recomputes everything from the source tables.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+
+from .models import Collector, CollectionEvent, ProcessingBatch, StatCounter
+
+EVENT_SCOPES = ('species', 'state', 'grade', 'day')
+BREAKDOWN_SCOPES = ('species', 'state', 'grade', 'batch_status', 'facility')
+ACTIVE_BATCH_STATUSES = ('processing', 'quality_testing')
+
+
+def event_row(event):
+    """(species, state, grade, harvest_date, quantity_kg) of a collection event"""
+    return (event.species.name, event.collector.state, event.quality_grade,
+            event.harvest_date, event.quantity_kg)
+
+
+def batch_row(batch):
+    return batch.status, batch.processing_facility
+
+
+def event_deltas(rows, sign=1, deltas=None):
+    deltas = deltas if deltas is not None else defaultdict(lambda: [0, 0.0])
+    for species, state, grade, day, quantity in rows:
+        keys = zip(('collections',) + EVENT_SCOPES, ('', species, state, grade, str(day)))
+        for counter in keys:
+            deltas[counter][0] += sign
+            deltas[counter][1] += sign * quantity
+    return deltas
+
+
+def batch_deltas(rows, sign=1, deltas=None):
+    deltas = deltas if deltas is not None else defaultdict(lambda: [0, 0.0])
+    for status, facility in rows:
+        for counter in (('batches', ''), ('batch_status', status), ('facility', facility)):
+            deltas[counter][0] += sign
+    return deltas
+
+
+def apply_deltas(deltas):
+    """Add {(scope, key): [count, quantity]} deltas with a single multi-row upsert"""
+    deltas = {counter: delta for counter, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    qn = connection.ops.quote_name
+    table = qn(StatCounter._meta.db_table)
+    sql = (
+        f'INSERT INTO {table} (scope, {qn("key")}, count, quantity_kg) VALUES (%s, %s, %s, %s) '
+        f'ON CONFLICT (scope, {qn("key")}) DO UPDATE SET '
+        f'count = {table}.count + excluded.count, '
+        f'quantity_kg = {table}.quantity_kg + excluded.quantity_kg'
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [counter + tuple(delta) for counter, delta in deltas.items()])
+
+
+def record_events(rows, sign=1):
+    apply_deltas(event_deltas(rows, sign))
+
+
+def record_batches(rows, sign=1):
+    apply_deltas(batch_deltas(rows, sign))
+
+
+def record_collectors(count):
+    apply_deltas({('collectors', ''): [count, 0.0]})
+
+
+def move_collector_state(collector, old_state):
+    """Re-file a collector's events under its new state"""
+    totals = CollectionEvent.objects.filter(collector=collector).aggregate(
+        count=Count('id'), quantity=Sum('quantity_kg'))
+    if totals['count']:
+        quantity = totals['quantity'] or 0.0
+        apply_deltas({
+            ('state', old_state): [-totals['count'], -quantity],
+            ('state', collector.state): [totals['count'], quantity],
+        })
+
+
+def expected_counters():
+    """{(scope, key): [count, quantity]} computed from the source tables"""
+    expected = defaultdict(lambda: [0, 0.0])
+    event_groups = {
+        'species': 'species__name',
+        'state': 'collector__state',
+        'grade': 'quality_grade',
+        'day': 'harvest_date',
+    }
+    totals = CollectionEvent.objects.aggregate(count=Count('id'), quantity=Sum('quantity_kg'))
+    expected[('collections', '')] = [totals['count'], totals['quantity'] or 0.0]
+    for scope, field in event_groups.items():
+        groups = CollectionEvent.objects.values_list(field).annotate(Count('id'), Sum('quantity_kg')).order_by()
+        for key, count, quantity in groups:
+            expected[(scope, str(key))] = [count, quantity or 0.0]
+
+    expected[('collectors', '')] = [Collector.objects.count(), 0.0]
+    expected[('batches', '')] = [ProcessingBatch.objects.count(), 0.0]
+    for scope, field in (('batch_status', 'status'), ('facility', 'processing_facility')):
+        for key, count in ProcessingBatch.objects.values_list(field).annotate(Count('id')).order_by():
+            expected[(scope, key)] = [count, 0.0]
+    return expected
+
+
+def drift():
+    """Yield (scope, key, stored_count, expected_count) for every counter that is off"""
+    expected = expected_counters()
+    stored = {(scope, key): count for scope, key, count in StatCounter.objects.values_list('scope', 'key', 'count')}
+    for counter in sorted(set(expected) | set(stored)):
+        actual = expected[counter][0] if counter in expected else 0
+        if stored.get(counter, 0) != actual:
+            yield counter + (stored.get(counter, 0), actual)
+
+
+def rebuild():
+    """Recompute every counter from the source tables"""
+    with transaction.atomic():
+        expected = expected_counters()
+        StatCounter.objects.all().delete()
+        apply_deltas(expected)
+    return StatCounter.objects.count()
+
+
+def counters(*counters):
+    """{(scope, key): count} for the requested counters in one query; missing ones are 0"""
+    found = {
+        (scope, key): count
+        for scope, key, count in StatCounter.objects.filter(
+            scope__in={scope for scope, _ in counters}, key__in={key for _, key in counters},
+        ).values_list('scope', 'key', 'count')
+    }
+    return {counter: found.get(counter, 0) for counter in counters}
+
+
+def dashboard_totals():
+    """The four dashboard tiles, read from the counters with one query"""
+    found = counters(
+        ('collections', ''), ('collectors', ''),
+        ('batch_status', 'completed'), *(('batch_status', status) for status in ACTIVE_BATCH_STATUSES),
+    )
+    return {
+        'total_collections': found[('collections', '')],
+        'active_batches': sum(found[('batch_status', status)] for status in ACTIVE_BATCH_STATUSES),
+        'completed_batches': found[('batch_status', 'completed')],
+        'total_collectors': found[('collectors', '')],
+    }
+
+
+def summary(date_from=None, date_to=None):
+    """
+    Totals plus per-species, state, grade, batch status and facility
+    breakdowns; per-day counts are included when a date range is given.
+    """
+    data = {
+        'totals': {'collections': 0, 'quantity_kg': 0.0, 'collectors': 0, 'batches': 0},
+        **{scope: {} for scope in BREAKDOWN_SCOPES},
+    }
+    selected = Q(scope__in=('collections', 'collectors', 'batches') + BREAKDOWN_SCOPES)
+    if date_from or date_to:
+        data['day'] = {}
+        days = Q(scope='day')
+        if date_from:
+            days &= Q(key__gte=date_from.isoformat())
+        if date_to:
+            days &= Q(key__lte=date_to.isoformat())
+        selected |= days
+
+    rows = StatCounter.objects.filter(selected, count__gt=0).order_by('scope', 'key')
+    for scope, key, count, quantity in rows.values_list('scope', 'key', 'count', 'quantity_kg'):
+        if scope in data['totals']:
+            data['totals'][scope] = count
+            if scope == 'collections':
+                data['totals']['quantity_kg'] = round(quantity, 3)
+        elif scope in ('batch_status', 'facility'):
+            data[scope][key] = count
+        else:
+            data[scope][key] = {'count': count, 'quantity_kg': round(quantity, 3)}
+    return data
@@ -0,0 +1,251 @@
+"""
+Reproducible synthetic data at production scale.
+
+generate() streams collectors, collection events, processing batches,
+steps and quality tests into the database with bulk_create in chunks, each
+chunk in its own transaction, so memory stays flat however many rows are
+requested. The same seed always produces the same rows.
+
+bulk_create skips save() and post_save, so geohashes are set here and the
+derived data (ledger entries, tiles, statistics, analytics rollups) is
+recorded per chunk exactly as the bulk ingest path does, along with the
+search documents of the batches and quality tests.
+"""
+import random
+import uuid
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+from . import analytics, ledger, search, spatial, stats
+from .models import Collector, CollectionEvent, HerbSpecies, ProcessingBatch, ProcessingStep, QualityTest
+from .signals import collection_events_created, collectors_created
+
+SCIENTIFIC_NAMES = {
+    'ashwagandha': 'Withania somnifera',
+    'tulsi': 'Ocimum tenuiflorum',
+    'brahmi': 'Bacopa monnieri',
+    'neem': 'Azadirachta indica',
+    'turmeric': 'Curcuma longa',
+    'ginger': 'Zingiber officinale',
+    'amla': 'Phyllanthus emblica',
+}
+# Harvest regions: state, (latitude, longitude) centre, spread in degrees
+REGIONS = [
+    ('Uttar Pradesh', (26.8, 80.9), 1.5),
+    ('Madhya Pradesh', (23.3, 77.4), 2.0),
+    ('Rajasthan', (26.9, 75.8), 2.0),
+    ('Uttarakhand', (30.1, 79.0), 0.8),
+    ('Kerala', (10.5, 76.2), 0.8),
+    ('Karnataka', (14.5, 75.7), 1.5),
+    ('Maharashtra', (19.0, 75.5), 2.0),
+    ('Gujarat', (22.7, 71.6), 1.5),
+]
+VILLAGES = ['Sitapur', 'Barabanki', 'Rampur', 'Khandwa', 'Almora', 'Wayanad', 'Hassan', 'Nashik', 'Anand',
+            'Bundi', 'Mandla', 'Chamoli']
+FIRST_NAMES = ['Ramesh', 'Sunita', 'Mohan', 'Geeta', 'Vijay', 'Maya', 'Arjun', 'Lakshmi', 'Suresh', 'Anita',
+               'Ravi', 'Kavita', 'Prakash', 'Meena', 'Dinesh', 'Pooja']
+LAST_NAMES = ['Kumar', 'Devi', 'Singh', 'Sharma', 'Prasad', 'Kumari', 'Patel', 'Nair', 'Yadav', 'Gupta']
+WEATHER = ['Sunny, 28°C', 'Cloudy, 25°C', 'Light rain, 22°C', 'Clear sky, 30°C', 'Humid, 32°C']
+FACILITIES = ['Himalayan Herbs Processing Pvt Ltd', 'Organic India Processing Center',
+              'Ayurvedic Wellness Solutions', 'Natural Remedies Facility', 'Golden Spice Processing Unit',
+              'Deccan Botanicals', 'Malabar Herbal Extracts']
+OPERATORS = ['Rajesh Kumar', 'Priya Singh', 'Amit Sharma', 'Neha Gupta', 'Farhan Ali', 'Deepa Menon']
+LABS = ['Analytical Labs India Pvt Ltd', 'Quality Control Testing Services', 'Ayurvedic Research Laboratory',
+        'Herbal Testing Institute']
+REGIONS_BY_STATE = {state: (centre, spread) for state, centre, spread in REGIONS}
+STEP_TYPES = [step_type for step_type, _ in ProcessingStep.STEP_TYPES]
+BATCH_STATUSES = (['processing', 'quality_testing', 'completed', 'rejected'], [2, 2, 5, 1])
+
+
+def ensure_species():
+    for name, _ in HerbSpecies.SPECIES_CHOICES:
+        HerbSpecies.objects.get_or_create(name=name, defaults={'scientific_name': SCIENTIFIC_NAMES.get(name, name)})
+    return list(HerbSpecies.objects.order_by('name'))
+
+
+def _chunks(total, size):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+def _aware(day, rng):
+    return datetime.combine(day, time(rng.randint(6, 18), rng.randint(0, 59)), tzinfo=dt_timezone.utc)
+
+
+def _collector(rng, prefix, n):
+    state, _, _ = rng.choice(REGIONS)
+    return Collector(
+        collector_id=f'{prefix}C{n:07d}',
+        name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+        phone=f'9{rng.randint(100000000, 999999999)}',
+        village=rng.choice(VILLAGES),
+        state=state,
+        license_number=f'LIC{n:07d}',
+    )
+
+
+def _event(rng, collector, species, end_date, days):
+    # Collectors from other sources harvest around the first region
+    (lat, lng), spread = REGIONS_BY_STATE.get(collector.state, REGIONS[0][1:])
+    lat, lng = round(lat + rng.uniform(-spread, spread), 6), round(lng + rng.uniform(-spread, spread), 6)
+    return CollectionEvent(
+        event_id=uuid.UUID(int=rng.getrandbits(128), version=4),
+        collector=collector,
+        species=species,
+        harvest_date=end_date - timedelta(days=rng.randrange(days)),
+        gps_latitude=lat,
+        gps_longitude=lng,
+        geohash=spatial.encode_geohash(lat, lng),
+        quantity_kg=round(rng.uniform(2.0, 80.0), 2),
+        quality_grade=rng.choices('ABC', weights=[5, 3, 2])[0],
+        weather_conditions=rng.choice(WEATHER),
+        soil_ph=round(rng.uniform(6.0, 8.0), 1),
+        organic_certified=rng.random() < 0.4,
+        fair_trade_certified=rng.random() < 0.25,
+    )
+
+
+def _batch(rng, prefix, n, events):
+    start = _aware(max(event.harvest_date for event in events), rng) + timedelta(days=rng.randint(1, 7))
+    status = rng.choices(*BATCH_STATUSES)[0]
+    return ProcessingBatch(
+        batch_id=f'{prefix}B{n:08d}',
+        processing_facility=rng.choice(FACILITIES),
+        start_date=start,
+        end_date=start + timedelta(days=rng.randint(5, 15)) if status in ('completed', 'rejected') else None,
+        batch_size_kg=round(sum(event.quantity_kg for event in events), 2),
+        status=status,
+    )
+
+
+def _steps(rng, batch):
+    for day, step_type in enumerate(STEP_TYPES[:rng.randint(2, len(STEP_TYPES))]):
+        heated = step_type in ('cleaning', 'drying')
+        yield ProcessingStep(
+            batch=batch,
+            step_type=step_type,
+            temperature=round(rng.uniform(20.0, 60.0), 1) if heated else None,
+            humidity=round(rng.uniform(30.0, 70.0), 1) if heated else None,
+            duration_hours=round(rng.uniform(1.0, 24.0), 1),
+            operator_name=rng.choice(OPERATORS),
+            equipment_used=f'Equipment-{rng.randint(100, 999)}',
+            timestamp=batch.start_date + timedelta(days=day, hours=rng.randint(0, 12)),
+        )
+
+
+def _tests(rng, batch):
+    if batch.status == 'processing':
+        return
+    for attempt in range(rng.randint(1, 2)):
+        if batch.status == 'completed':
+            test_status = 'passed'
+        elif batch.status == 'rejected':
+            test_status = 'failed'
+        else:
+            test_status = rng.choice(['pending', 'passed'])
+        yield QualityTest(
+            batch=batch,
+            test_date=batch.start_date + timedelta(days=rng.randint(3, 10)),
+            lab_name=rng.choice(LABS),
+            lab_license=f'LAB-{rng.randint(1000, 9999)}',
+            moisture_content=round(rng.uniform(5.0, 15.0), 1),
+            pesticide_residue=rng.choices(['none', 'low', 'high'], weights=[6, 3, 1])[0],
+            heavy_metals='pass' if test_status != 'failed' else 'fail',
+            microbial_count=rng.randint(100, 10000),
+            test_status=test_status,
+            certificate_number=f'CERT-{batch.batch_id}-{attempt}',
+            active_compounds={'withanolides': f'{rng.uniform(0.5, 5.0):.2f}%'},
+        )
+
+
+def _restore_timestamps(steps, timestamps):
+    """auto_now_add overwrites the planned step timestamps on insert; put them back"""
+    table = connection.ops.quote_name(ProcessingStep._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(f'UPDATE {table} SET timestamp = %s WHERE id = %s', [
+            (connection.ops.adapt_datetimefield_value(timestamp), step.pk)
+            for step, timestamp in zip(steps, timestamps)
+        ])
+    for step, timestamp in zip(steps, timestamps):
+        step.timestamp = timestamp
+
+
+def _save_batches(batches, links, rng):
+    """bulk_create batches with their event links, steps and tests, then record the derived data"""
+    ProcessingBatch.objects.bulk_create(batches)
+    through = ProcessingBatch.collection_events.through
+    through.objects.bulk_create([
+        through(processingbatch_id=batch.pk, collectionevent_id=event.pk)
+        for batch, events in zip(batches, links) for event in events
+    ], batch_size=1000)
+    steps = [step for batch in batches for step in _steps(rng, batch)]
+    timestamps = [step.timestamp for step in steps]
+    ProcessingStep.objects.bulk_create(steps, batch_size=1000)
+    _restore_timestamps(steps, timestamps)
+    tests = QualityTest.objects.bulk_create(
+        [test for batch in batches for test in _tests(rng, batch)], batch_size=1000)
+
+    ledger.append_many(steps, 'create')
+    ledger.append_many(tests, 'create')
+    stats.record_batches([stats.batch_row(batch) for batch in batches])
+    analytics.record(analytics.PROCESSING, [analytics.step_row(step) for step in steps])
+    search.index([search.batch_document(batch) for batch in batches])
+    search.index_tests(tests)
+    return len(steps), len(tests)
+
+
+def generate(collectors=1000, events=100000, events_per_batch=20, seed=0, chunk_size=5000, days=730,
+             prefix='SYN', end_date=None, progress=None):
+    """
+    Insert the requested rows and return {model name: rows created}.
+
+    Every event belongs to one batch of about events_per_batch events (0
+    leaves events unbatched). progress(label, done, total) is called after
+    each chunk.
+    """
+    # Datasets with different prefixes get different event_ids for the same seed
+    rng = random.Random(f'{prefix}:{seed}')
+    end_date = end_date or date.today()
+    species = ensure_species()
+    counts = {'collectors': 0, 'events': 0, 'batches': 0, 'steps': 0, 'tests': 0}
+
+    created_collectors = []
+    for start, size in _chunks(collectors, chunk_size):
+        with transaction.atomic():
+            chunk = Collector.objects.bulk_create([_collector(rng, prefix, start + i) for i in range(size)])
+            collectors_created.send(sender=Collector, collectors=chunk)
+        created_collectors += chunk
+        counts['collectors'] += size
+        if progress:
+            progress('collectors', counts['collectors'], collectors)
+
+    # Events can also be spread over collectors that already exist
+    created_collectors = created_collectors or list(Collector.objects.all())
+    if events and not created_collectors:
+        raise ValueError('Events need at least one collector')
+    batch_number = 0
+    for start, size in _chunks(events, chunk_size):
+        with transaction.atomic():
+            chunk = CollectionEvent.objects.bulk_create([
+                _event(rng, rng.choice(created_collectors), rng.choice(species), end_date, days)
+                for _ in range(size)
+            ], batch_size=1000)
+            collection_events_created.send(sender=CollectionEvent, events=chunk)
+            counts['events'] += size
+            if events_per_batch:
+                batches, links = [], []
+                position = 0
+                while position < len(chunk):
+                    group = chunk[position:position + rng.randint(1, 2 * events_per_batch - 1)]
+                    batches.append(_batch(rng, prefix, batch_number, group))
+                    links.append(group)
+                    batch_number += 1
+                    position += len(group)
+                steps, tests = _save_batches(batches, links, rng)
+                counts['batches'] += len(batches)
+                counts['steps'] += steps
+                counts['tests'] += tests
+        if progress:
+            progress('events', counts['events'], events)
+    return counts
@@ -1,3 +1,1467 @@
-from django.test import TestCase
+import io
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import uuid
+from datetime import date, timedelta
+from importlib import import_module
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from . import (analytics, autocomplete, fastjson, ingest, instrumentation, labels, ledger, provenance, qr, routers,
+               search, services, spatial, sqlite, stats, synthetic, tiles, versioning)
+from .models import (Collector, HerbSpecies, CollectionEvent, DailyRollup, HarvestTile, IdempotencyKey,
+                     LedgerBlock, LedgerCheckpoint, LedgerEntry, ProcessingBatch, ProcessingStep, QualityTest,
+                     StatCounter)
+from .serializers import CollectionEventSerializer, ProcessingBatchListSerializer
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def create_batch(batch_id, events=3, steps=3, tests=1):
+    """Create a batch with the given number of collection events, steps and tests"""
+    species, _ = HerbSpecies.objects.get_or_create(name='ashwagandha', defaults={'scientific_name': 'Withania somnifera'})
+    batch = ProcessingBatch.objects.create(
+        batch_id=batch_id,
+        processing_facility='Himalayan Herbs Processing Pvt Ltd',
+        start_date=timezone.now(),
+        batch_size_kg=250.0,
+    )
+    for i in range(events):
+        collector = Collector.objects.create(
+            collector_id=f'{batch_id}-COL{i}', name=f'Collector {i}', village='Sitapur', state='Uttar Pradesh',
+        )
+        batch.collection_events.add(CollectionEvent.objects.create(
+            collector=collector,
+            species=species,
+            harvest_date=date.today() - timedelta(days=i),
+            gps_latitude=26.8 + i * 0.01,
+            gps_longitude=80.9 + i * 0.01,
+            quantity_kg=10.0,
+            quality_grade='A',
+            weather_conditions='Sunny, 28°C',
+        ))
+    for i in range(steps):
+        ProcessingStep.objects.create(batch=batch, step_type='drying', operator_name=f'Operator {i}')
+    for i in range(tests):
+        QualityTest.objects.create(
+            batch=batch,
+            lab_name='Herbal Testing Institute',
+            lab_license='LAB-1000',
+            moisture_content=8.5,
+            pesticide_residue='none',
+            heavy_metals='pass',
+            microbial_count=500,
+            certificate_number=f'CERT-{batch_id}-{i}',
+        )
+    return batch
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class BatchQueryBudgetTests(TestCase):
+    """Batch endpoints must issue a bounded number of queries whatever the batch size"""
+
+    # Upper bound on queries per request for each batch endpoint
+    QUERY_BUDGETS = {
+        'batch_detail': 7,
+        'batch_data_api': 5,
+        'batch_data_api_proof': 7,
+        'api_batch_detail': 4,
+        'api_batch_list': 1,
+    }
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        create_batch('SMALL-001', events=1, steps=1, tests=1)
+        create_batch('LARGE-001', events=25, steps=5, tests=3)
+
+    def setUp(self):
+        caches[provenance.CACHE_ALIAS].clear()
+
+    def endpoint_urls(self, batch_id):
+        return {
+            'batch_detail': reverse('batch_detail', args=[batch_id]),
+            'batch_data_api': reverse('batch_data_api', args=[batch_id]),
+            'batch_data_api_proof': reverse('batch_data_api', args=[batch_id]) + '?proof=1',
+            'api_batch_detail': f'/api/batches/{batch_id}/',
+            'api_batch_list': '/api/batches/',
+        }
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(ctx.captured_queries)
+
+    def test_endpoints_stay_within_budget(self):
+        for name, url in self.endpoint_urls('LARGE-001').items():
+            with self.subTest(endpoint=name):
+                self.assertLessEqual(self.count_queries(url), self.QUERY_BUDGETS[name])
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        small = self.endpoint_urls('SMALL-001')
+        large = self.endpoint_urls('LARGE-001')
+        for name in small:
+            with self.subTest(endpoint=name):
+                self.assertEqual(self.count_queries(small[name]), self.count_queries(large[name]))
+
+    def test_batch_data_contents(self):
+        data = self.client.get(reverse('batch_data_api', args=['LARGE-001'])).json()
+        self.assertEqual(len(data['collection_events']), 25)
+        self.assertEqual(len(data['processing_timeline']), 5)
+        self.assertEqual(len(data['quality_tests']), 3)
+        self.assertEqual(data['collection_events'][0]['species'], 'Ashwagandha (Withania somnifera)')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class BatchListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(5):
+            create_batch(f'LIST-{i:03}', events=i + 1, steps=2, tests=1)
+
+    def test_list_rows_are_flat(self):
+        rows = self.client.get('/api/batches/').json()['results']
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['status_display'], 'Processing')
+        self.assertNotIn('collection_events', rows[0])
+
+    def test_cursor_pagination(self):
+        seen = []
+        url = '/api/batches/?page_size=2'
+        while url:
+            page = self.client.get(url).json()
+            seen += [row['batch_id'] for row in page['results']]
+            url = page['next']
+        self.assertEqual(sorted(seen), [f'LIST-{i:03}' for i in range(5)])
+        self.assertEqual(len(seen), 5)
+
+    def test_expand_nests_only_requested_relations(self):
+        with self.assertNumQueries(2):
+            rows = self.client.get('/api/batches/?expand=quality_tests').json()['results']
+        self.assertEqual(len(rows[0]['quality_tests']), 1)
+        self.assertNotIn('processing_steps', rows[0])
+        detail = self.client.get('/api/batches/LIST-004/?expand=collection_events').json()
+        self.assertEqual(len(detail['collection_events']), 5)
+        self.assertNotIn('quality_tests', detail)
+
+    def test_detail_includes_every_relation_by_default(self):
+        detail = self.client.get('/api/batches/LIST-002/').json()
+        self.assertEqual(len(detail['collection_events']), 3)
+        self.assertEqual(len(detail['processing_steps']), 2)
+        self.assertEqual(len(detail['quality_tests']), 1)
+
+    def test_unknown_expand_is_rejected(self):
+        self.assertEqual(self.client.get('/api/batches/?expand=collector').status_code, 400)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ProvenanceDocumentCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batch = create_batch('CACHE-001', events=2, steps=1, tests=0)
+
+    def setUp(self):
+        caches[provenance.CACHE_ALIAS].clear()
+        self.url = reverse('batch_data_api', args=['CACHE-001'])
+
+    def test_repeat_scans_are_served_from_cache(self):
+        self.client.get(self.url)
+        # Only the version stamp lookup for conditional requests
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.json()['collection_events']), 2)
+
+    def test_new_processing_step_invalidates_document(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            ProcessingStep.objects.create(batch=self.batch, step_type='grinding', operator_name='Priya Singh')
+        self.assertEqual(len(self.client.get(self.url).json()['processing_timeline']), 2)
+
+    def test_status_change_invalidates_document(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.batch.status = 'completed'
+            self.batch.save()
+        self.assertEqual(self.client.get(self.url).json()['status'], 'Completed')
+
+    def test_collection_event_link_invalidates_document(self):
+        self.client.get(self.url)
+        event = self.batch.collection_events.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            event.processingbatch_set.remove(self.batch)
+        self.assertEqual(len(self.client.get(self.url).json()['collection_events']), 1)
+
+    def test_species_rename_invalidates_document(self):
+        self.client.get(self.url)
+        species = self.batch.collection_events.first().species
+        with self.captureOnCommitCallbacks(execute=True):
+            species.name = 'tulsi'
+            species.save()
+        events = self.client.get(self.url).json()['collection_events']
+        self.assertEqual({event['species'] for event in events}, {'Tulsi (Ocimum tenuiflorum)'})
+
+    def test_batch_id_change_retires_old_document(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.batch.batch_id = 'CACHE-002'
+            self.batch.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        response = self.client.get(reverse('batch_data_api', args=['CACHE-002']))
+        self.assertEqual(response.json()['batch_id'], 'CACHE-002')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ConditionalRequestTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batch = create_batch('ETAG-001', events=1, steps=1, tests=0)
+
+    def test_unchanged_batch_returns_not_modified(self):
+        url = reverse('batch_data_api', args=['ETAG-001'])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_write_changes_batch_etag(self):
+        url = reverse('batch_detail', args=['ETAG-001'])
+        etag = self.client.get(url)['ETag']
+        ProcessingStep.objects.create(batch=self.batch, step_type='sieving', operator_name='Amit Sharma')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_map_data_if_modified_since(self):
+        url = '/api/collections/map_data/'
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class MapDataTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_batch('MAP-001', events=5, steps=0, tests=0)
+
+    def get_rows(self, query=''):
+        response = self.client.get('/api/collections/map_data/' + query)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_streams_json_array(self):
+        response, body = self.get_rows()
+        rows = json.loads(body)
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(set(rows[0]), {'id', 'lat', 'lng', 'collector', 'species', 'harvest_date', 'quantity', 'grade'})
+
+    def test_bbox_filter(self):
+        _, body = self.get_rows('?bbox=80.89,26.79,80.925,26.825')
+        self.assertEqual(len(json.loads(body)), 3)
+
+    def test_cursor_pagination(self):
+        response, body = self.get_rows('?limit=2')
+        self.assertEqual(len(json.loads(body)), 2)
+        seen = len(json.loads(body))
+        while response.has_header('X-Next-Cursor'):
+            response, body = self.get_rows(f'?limit=2&cursor={response["X-Next-Cursor"]}')
+            seen += len(json.loads(body))
+        self.assertEqual(seen, 5)
+
+    def test_ndjson(self):
+        response, body = self.get_rows('?ndjson=1&species=ashwagandha')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(body.decode().splitlines()), 5)
+
+    def test_invalid_bbox(self):
+        response = self.client.get('/api/collections/map_data/?bbox=1,2,3')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class HarvestTileTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batch = create_batch('TILE-001', events=4, steps=0, tests=0)
+
+    def world_tile(self):
+        return self.client.get('/api/collections/tiles/0/0/0/').json()
+
+    def test_tiles_track_inserts_updates_and_deletes(self):
+        cells = self.world_tile()['cells']
+        self.assertEqual(sum(cell['count'] for cell in cells), 4)
+        self.assertAlmostEqual(sum(cell['quantity_kg'] for cell in cells), 40.0)
+
+        event = self.batch.collection_events.first()
+        event.quality_grade = 'B'
+        event.save()
+        grades = [cell['grades'] for cell in self.world_tile()['cells']]
+        self.assertEqual(sum(grade['B'] for grade in grades), 1)
+
+        event.delete()
+        self.assertEqual(sum(cell['count'] for cell in self.world_tile()['cells']), 3)
+
+    def test_tile_response_is_bounded(self):
+        x, y = tiles.cell_for(26.8, 80.9, 10)
+        data = self.client.get(f'/api/collections/tiles/10/{x}/{y}/').json()
+        self.assertEqual(data['cell_zoom'], 10 + tiles.GRID_SHIFT)
+        self.assertLessEqual(len(data['cells']), 4 ** tiles.GRID_SHIFT)
+        self.assertEqual(sum(cell['count'] for cell in data['cells']), 4)
+
+    def test_rebuild_matches_incremental(self):
+        incremental = self.world_tile()
+        tiles.rebuild()
+        self.assertEqual(self.world_tile()['cells'][0]['count'], incremental['cells'][0]['count'])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class SpatialQueryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Events at 26.80..26.84 N, 80.90..80.94 E, about 1.5 km apart
+        create_batch('GEO-001', events=5, steps=0, tests=0)
+
+    def test_geohash_matches_reference_encoding(self):
+        self.assertEqual(spatial.encode_geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_within_radius_orders_by_distance(self):
+        data = self.client.get('/api/collections/within-radius/?lat=26.8&lng=80.9&radius_km=3').json()
+        self.assertEqual(data['count'], 3)
+        distances = [result['distance_km'] for result in data['results']]
+        self.assertEqual(distances, sorted(distances))
+
+    def test_within_bbox(self):
+        data = self.client.get('/api/collections/within-bbox/?bbox=80.905,26.805,80.935,26.835').json()
+        self.assertEqual(data['count'], 3)
+
+    def test_within_polygon(self):
+        polygon = [[80.89, 26.79], [80.925, 26.79], [80.925, 26.825], [80.89, 26.825]]
+        response = self.client.post('/api/collections/within-polygon/', {'polygon': polygon}, content_type='application/json')
+        self.assertEqual(response.json()['count'], 3)
+
+    def test_within_polygon_rejects_non_object_body(self):
+        response = self.client.post('/api/collections/within-polygon/', [[80.89, 26.79]], content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('polygon', response.json())
+
+    def test_migration_encoder_matches_spatial(self):
+        migration = import_module('traceability.migrations.0006_collection_event_geohash')
+        for lat, lng in ((26.81, 80.91), (-33.86, 151.2), (0.0, 0.0), (89.9, -179.9)):
+            self.assertEqual(migration.encode_geohash(lat, lng), spatial.encode_geohash(lat, lng))
+
+    def test_invalid_bboxes_are_rejected(self):
+        for bbox, message in (('nan,26.8,80.9,26.9', 'finite'), ('80.9,26.8,inf,26.9', 'finite'),
+                              ('80.9,-95,81,26.9', 'within'), ('80.9,26.9,81,26.8', 'min_lat'),
+                              ('179,10,-179,11', 'antimeridian')):
+            with self.subTest(bbox=bbox):
+                response = self.client.get('/api/collections/within-bbox/', {'bbox': bbox})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(message, response.json()['bbox'])
+        response = self.client.get('/api/collections/within-polygon/', {'polygon': '80 26,nan 26,81 27'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_bbox_lookup_uses_geohash_index(self):
+        queryset = CollectionEvent.objects.filter(spatial.bbox_q(80.9, 26.8, 80.92, 26.82))
+        self.assertIn('geohash', queryset.explain())
+
+
+class HarvestRecordMixin:
+    """Reference data and a valid bulk-upload record"""
+
+    @classmethod
+    def setUpTestData(cls):
+        HerbSpecies.objects.create(name='tulsi', scientific_name='Ocimum tenuiflorum')
+        Collector.objects.create(collector_id='COL001', name='Ramesh Kumar', village='Sitapur', state='Uttar Pradesh')
+
+    def record(self, **overrides):
+        record = {
+            'collector_id': 'COL001',
+            'species': 'tulsi',
+            'harvest_date': '2024-03-01',
+            'gps_latitude': 26.85,
+            'gps_longitude': 80.95,
+            'quantity_kg': 12.5,
+            'quality_grade': 'A',
+            'weather_conditions': 'Sunny, 28°C',
+        }
+        record.update(overrides)
+        return record
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class BulkIngestTests(HarvestRecordMixin, TestCase):
+
+    def test_bulk_json_array_uses_constant_queries(self):
+        records = [self.record() for _ in range(50)]
+        records += [self.record(collector_id=f'NEW{i}', collector_name=f'Collector {i}', village='Agra', state='Uttar Pradesh')
+                    for i in range(50)]
+        # Stamp rows are created once per database by the first write of any kind
+        versioning.bump([versioning.ANALYTICS, versioning.COLLECTION_EVENTS])
+        with CaptureQueriesContext(connection) as small:
+            self.client.post('/api/collections/bulk/', records[:2] + records[50:52], content_type='application/json')
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.post('/api/collections/bulk/', records, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 100)
+        # bulk_create splits one INSERT per SQLite bound-parameter limit (999);
+        # that is the only statement whose count depends on the number of rows
+        fields = [field for field in CollectionEvent._meta.concrete_fields if not field.primary_key]
+        insert_statements = -(-len(records) // connection.ops.bulk_batch_size(fields, records))
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries) + insert_statements - 1)
+        self.assertEqual(CollectionEvent.objects.exclude(geohash='').count(), 104)
+        self.assertEqual(stats.counters(('collectors', ''))[('collectors', '')], Collector.objects.count())
+
+    def test_ndjson_reports_per_record_errors(self):
+        lines = [self.record(), self.record(species='unknown'), self.record(collector_id='NEW1'), {'quantity_kg': 'x'}]
+        body = '\n'.join(json.dumps(line) for line in lines)
+        response = self.client.post('/api/collections/bulk/', body, content_type='application/x-ndjson')
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], ['created', 'error', 'error', 'error'])
+        self.assertIn('species', results[1]['errors'])
+        self.assertIn('collector_name', results[2]['errors'])
+
+    def test_rejected_records_do_not_create_collectors(self):
+        new = {'collector_id': 'NEW1', 'collector_name': 'Meena Devi', 'village': 'Agra', 'state': 'Uttar Pradesh'}
+        results = ingest.ingest_collection_events([self.record(species='unknown', **new)])
+        self.assertEqual(results[0]['status'], 'error')
+        self.assertFalse(Collector.objects.filter(collector_id='NEW1').exists())
+
+    def test_collectors_inserted_concurrently_are_counted_once(self):
+        real_bulk_create = Collector.objects.bulk_create
+
+        def race(collectors, **kwargs):
+            # Another sync creates NEW1 between our lookup and our insert
+            Collector.objects.create(collector_id='NEW1', name='Meena Devi', village='Agra', state='Uttar Pradesh')
+            return real_bulk_create(collectors, **kwargs)
+
+        records = [self.record(collector_id=f'NEW{i}', collector_name=f'Collector {i}', village='Agra',
+                               state='Uttar Pradesh') for i in range(1, 3)]
+        with patch.object(Collector.objects, 'bulk_create', side_effect=race):
+            results = ingest.ingest_collection_events(records)
+        self.assertEqual([result['status'] for result in results], ['created', 'created'])
+        self.assertEqual(stats.counters(('collectors', ''))[('collectors', '')], Collector.objects.count())
+
+    def test_bulk_created_events_reach_tiles(self):
+        self.client.post('/api/collections/bulk/', [self.record(), self.record()], content_type='application/json')
+        cells = self.client.get('/api/collections/tiles/0/0/0/').json()['cells']
+        self.assertEqual(sum(cell['count'] for cell in cells), 2)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class IdempotentSyncTests(HarvestRecordMixin, TestCase):
+
+    def test_retried_bulk_upload_is_not_duplicated(self):
+        records = [self.record(idempotency_key=f'device-1:{i}') for i in range(3)]
+        first = self.client.post('/api/collections/bulk/', records, content_type='application/json')
+        self.assertEqual(first.status_code, 201)
+        first = first.json()
+        retry = self.client.post('/api/collections/bulk/', records + [records[0]], content_type='application/json')
+        self.assertEqual(retry.status_code, 200)
+        retry = retry.json()
+        self.assertEqual((retry['created'], retry['duplicates'], retry['failed']), (0, 4, 0))
+        self.assertEqual(CollectionEvent.objects.count(), 3)
+        self.assertEqual([result['status'] for result in retry['results']], ['duplicate'] * 4)
+        self.assertEqual(retry['results'][0]['event_id'], first['results'][0]['event_id'])
+
+    def test_idempotency_key_header_on_create(self):
+        payload = {
+            'collector': Collector.objects.get().pk,
+            'species': HerbSpecies.objects.get().pk,
+            'harvest_date': '2024-03-01',
+            'gps_latitude': 26.85,
+            'gps_longitude': 80.95,
+            'quantity_kg': 12.5,
+            'quality_grade': 'A',
+            'weather_conditions': 'Sunny',
+        }
+        first = self.client.post('/api/collections/', payload, HTTP_IDEMPOTENCY_KEY='abc')
+        retry = self.client.post('/api/collections/', payload, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual((first.status_code, retry.status_code), (201, 200))
+        self.assertEqual(first.json()['event_id'], retry.json()['event_id'])
+
+    def test_concurrent_idempotency_key_returns_original_event(self):
+        payload = {
+            'collector': Collector.objects.get().pk,
+            'species': HerbSpecies.objects.get().pk,
+            'harvest_date': '2024-03-01',
+            'gps_latitude': 26.85,
+            'gps_longitude': 80.95,
+            'quantity_kg': 12.5,
+            'quality_grade': 'A',
+            'weather_conditions': 'Sunny',
+        }
+        first = self.client.post('/api/collections/', payload, HTTP_IDEMPOTENCY_KEY='race')
+        # The other request's key lookup ran before the first one committed
+        with patch('traceability.views.IdempotencyKey.objects.filter') as lookup:
+            lookup.return_value.select_related.return_value.first.side_effect = [
+                None, IdempotencyKey.objects.select_related('event').get(key='race'),
+            ]
+            retry = self.client.post('/api/collections/', payload, HTTP_IDEMPOTENCY_KEY='race')
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json()['event_id'], first.json()['event_id'])
+        self.assertEqual(CollectionEvent.objects.count(), 1)
+
+    def test_concurrent_bulk_sync_answers_duplicates(self):
+        records = [self.record(idempotency_key='device-2:0'), self.record(idempotency_key='device-2:1')]
+        first = ingest.ingest_collection_events(records[:1])
+        real_skip = ingest._skip_duplicates
+        calls = []
+
+        def skip_after_race(valid, results):
+            # First attempt misses the key the "other" sync stored meanwhile
+            calls.append(1)
+            return valid if len(calls) == 1 else real_skip(valid, results)
+
+        with patch('traceability.ingest._skip_duplicates', side_effect=skip_after_race):
+            results = ingest.ingest_collection_events(records)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual([r['status'] for r in results], ['duplicate', 'created'])
+        self.assertEqual(results[0]['event_id'], first[0]['event_id'])
+        self.assertEqual(CollectionEvent.objects.count(), 2)
+
+    def test_resumable_session(self):
+        session = self.client.post('/api/sync-sessions/', {'device_id': 'tablet-7'}).json()
+        url = f"/api/sync-sessions/{session['session_id']}/chunks/"
+
+        def post_chunk(seq, count):
+            return self.client.post(url, {'seq': seq, 'records': [self.record() for _ in range(count)]},
+                                    content_type='application/json')
+
+        self.assertEqual(post_chunk(1, 2).json()['committed_seq'], 1)
+        # Lost acknowledgement: the device re-sends chunk 1
+        self.assertEqual(post_chunk(1, 2).json()['status'], 'already_committed')
+        self.assertEqual(post_chunk(3, 1).status_code, 409)
+        self.assertEqual(post_chunk(2, 1).json()['committed_seq'], 2)
+        self.assertEqual(CollectionEvent.objects.count(), 3)
+        session = self.client.get(f"/api/sync-sessions/{session['session_id']}/").json()
+        self.assertEqual((session['committed_seq'], session['record_count']), (2, 3))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, QR_CODE_RENDERING='async', QR_CODE_WORKER_THREAD=False)
+class QRCodeJobTests(TestCase):
+
+    def test_batch_creation_queues_instead_of_rendering(self):
+        batch = create_batch('QR-001', events=0, steps=0, tests=0)
+        batch.refresh_from_db()
+        self.assertFalse(batch.qr_code)
+        self.assertEqual(batch.qr_jobs.get().status, 'pending')
+
+        self.assertEqual(qr.process_jobs(), 1)
+        batch.refresh_from_db()
+        self.assertTrue(batch.qr_code.name.endswith('qr_QR-001.png'))
+        self.assertEqual(batch.qr_jobs.get().status, 'done')
+        # Saving again does not queue another render
+        batch.save()
+        self.assertEqual(batch.qr_jobs.count(), 1)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class OnDemandQRCodeTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batch = create_batch('QR-002', events=0, steps=0, tests=0)
+
+    def test_nothing_is_stored_on_batch_creation(self):
+        self.assertFalse(self.batch.qr_code)
+        self.assertFalse(self.batch.qr_jobs.exists())
+
+    def test_formats(self):
+        for fmt, signature in (('png', b'\x89PNG'), ('svg', b'<?xml'), ('pdf', b'%PDF')):
+            with self.subTest(fmt=fmt):
+                response = self.client.get(reverse('qr_code_image', args=['QR-002', fmt]))
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.content.startswith(signature))
+
+    def test_png_sizes(self):
+        from PIL import Image
+        response = self.client.get(reverse('qr_code_image', args=['QR-002', 'png']) + '?size=256')
+        self.assertEqual(Image.open(io.BytesIO(response.content)).size, (256, 256))
+        response = self.client.get(reverse('qr_code_image', args=['QR-002', 'png']) + '?size=300')
+        self.assertEqual(response.status_code, 400)
+
+    def test_versioned_url_is_immutable_and_revalidates(self):
+        response = self.client.get(self.batch.qr_code_url)
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get(self.batch.qr_code_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_site_url_change_changes_address(self):
+        before = self.batch.qr_code_url
+        with self.settings(SITE_URL='https://herbs.example.org'):
+            self.assertNotEqual(self.batch.qr_code_url, before)
+
+
+@override_settings(QR_LABEL_WORKERS=1)
+class QRLabelSheetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(5):
+            create_batch(f'LBL-{i:03d}', events=0, steps=0, tests=0)
+
+    def test_sheets_are_paginated(self):
+        sheets = list(labels.iter_sheets(labels.select_batch_ids(), columns=2, rows=1))
+        self.assertEqual(len(sheets), 3)
+        self.assertEqual(sheets[0].size, labels.SHEET_SIZE)
+
+    def test_pdf_is_written_page_by_page(self):
+        output = io.BytesIO()
+        sizes = list(labels.write_label_pdf(labels.select_batch_ids(), output, columns=2, rows=2))
+        self.assertEqual(len(sizes), 2)
+        self.assertLess(sizes[0], sizes[1])
+        self.assertIn(b'/Count 2', output.getvalue())
+
+    def test_api_streams_pdf(self):
+        url = reverse('processingbatch-qr-labels')
+        response = self.client.get(url, {'batch_id': ['LBL-001', 'LBL-003', 'MISSING']})
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content)
+        self.assertTrue(content.startswith(b'%PDF'))
+        self.assertIn(b'/Count 1', content)
+        self.assertEqual(self.client.get(url, {'batch_id': 'MISSING'}).status_code, 400)
+
+    @override_settings(QR_LABEL_WORKERS=8)
+    def test_api_does_not_start_a_process_pool(self):
+        with patch('traceability.labels.ProcessPoolExecutor') as pool:
+            response = self.client.get(reverse('processingbatch-qr-labels'), {'batch_id': 'LBL-001'})
+            self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        pool.assert_not_called()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class StatCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_batch('STAT-001', events=3, steps=0, tests=0)
+        create_batch('STAT-002', events=2, steps=0, tests=0)
+
+    def test_counters_match_source_tables_after_writes(self):
+        event = CollectionEvent.objects.first()
+        event.quality_grade = 'B'
+        event.quantity_kg = 4.0
+        event.save()
+        collector = Collector.objects.first()
+        collector.state = 'Uttarakhand'
+        collector.save()
+        ProcessingBatch.objects.get(batch_id='STAT-002').delete()
+        batch = ProcessingBatch.objects.get(batch_id='STAT-001')
+        batch.status = 'completed'
+        batch.save()
+        CollectionEvent.objects.last().delete()
+        self.assertEqual(list(stats.drift()), [])
+
+    def test_summary(self):
+        data = stats.summary(date_from=date.today())
+        self.assertEqual(data['totals']['collections'], 5)
+        self.assertEqual(data['totals']['quantity_kg'], 50.0)
+        self.assertEqual(data['species'], {'ashwagandha': {'count': 5, 'quantity_kg': 50.0}})
+        self.assertEqual(data['batch_status'], {'processing': 2})
+        self.assertEqual(data['day'], {date.today().isoformat(): {'count': 2, 'quantity_kg': 20.0}})
+
+    def test_dashboard_reads_counters_with_one_query(self):
+        with self.assertNumQueries(1):
+            totals = stats.dashboard_totals()
+        self.assertEqual(totals, {'total_collections': 5, 'active_batches': 2,
+                                  'completed_batches': 0, 'total_collectors': 5})
+        response = self.client.get(reverse('stats_api'), {'date_from': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rebuild(self):
+        StatCounter.objects.all().delete()
+        self.assertTrue(list(stats.drift()))
+        stats.rebuild()
+        self.assertEqual(list(stats.drift()), [])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class AnalyticsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_batch('TREND-001', events=10, steps=2, tests=0)
+
+    def test_rollups_track_writes(self):
+        event = CollectionEvent.objects.first()
+        event.quantity_kg = 25.0
+        event.save()
+        step = ProcessingStep.objects.first()
+        step.duration_hours = 6.0
+        step.save()
+        collector = event.collector
+        collector.collector_id = 'RENAMED'
+        collector.state = 'Kerala'
+        collector.save()
+        batch = ProcessingBatch.objects.get(batch_id='TREND-001')
+        batch.processing_facility = 'Kerala Herbal Works'
+        batch.save()
+        CollectionEvent.objects.last().delete()
+        self.assertEqual(list(analytics.drift()), [])
+
+    def test_weekly_report_matches_rows(self):
+        today = date.today()
+        report = analytics.report('harvest', 'species', today - timedelta(days=9), today, 'week')
+        series, = report['series']
+        self.assertEqual(series['key'], 'ashwagandha')
+        self.assertEqual(series['count'], 10)
+        self.assertEqual(sum(series['totals']), 100.0)
+        self.assertEqual(len(series['counts']), len(report['buckets']))
+        self.assertEqual(report['buckets'][0].weekday(), 0)
+
+    def test_range_totals(self):
+        series = analytics.Series()
+        for ordinal, count, total in ((10, 1, 2.0), (12, 2, 3.0), (20, 1, 5.0)):
+            series.append(ordinal, count, total)
+        self.assertEqual(series.range(11, 21), (3, 8.0))
+        self.assertEqual(series.range(0, 10), (0, 0.0))
+
+    def test_api(self):
+        url = reverse('analytics_api', args=['processing'])
+        params = {'dimension': 'facility', 'interval': 'month'}
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['series'][0]['count'], 2)
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(reverse('analytics_api', args=['harvest']), {'dimension': 'x'}).status_code, 400)
+
+
+def query_plans(queries):
+    """(sql, [plan detail, ...]) from EXPLAIN QUERY PLAN for each captured SELECT"""
+    with connection.cursor() as cursor:
+        for query in queries:
+            if query['sql'].startswith('SELECT'):
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                yield query['sql'], [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(plan):
+    """Tables read by a full scan rather than through an index"""
+    return {detail.split()[1] for detail in plan if detail.startswith('SCAN ') and ' USING ' not in detail}
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class IndexUsageTests(TestCase):
+    """Every query behind the hot views must be served by an index on a large dataset"""
+
+    EVENTS = 3000
+    BATCHES = 500
+
+    # Unpaginated listings read every row by design
+    LISTINGS = {
+        '/api/collectors/': {'traceability_collector'},
+        '/api/species/': {'traceability_herbspecies'},
+        '/api/collections/': {'traceability_collectionevent'},
+        '/api/processing-steps/': {'traceability_processingstep'},
+        '/api/quality-tests/': {'traceability_qualitytest'},
+        '/collector/': {'traceability_herbspecies'},
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batch = create_batch('IDX-000', events=3, steps=3, tests=1)
+        HerbSpecies.objects.bulk_create([
+            HerbSpecies(name=name, scientific_name=name) for name, _ in HerbSpecies.SPECIES_CHOICES if name != 'ashwagandha'
+        ])
+        species = list(HerbSpecies.objects.all())
+        collectors = Collector.objects.bulk_create([
+            Collector(collector_id=f'IDX-C{i}', name=f'Collector {i}', village='Sitapur', state='Uttar Pradesh')
+            for i in range(200)
+        ])
+        events = []
+        for i in range(cls.EVENTS):
+            lat, lng = 20 + (i % 100) * 0.1, 75 + (i // 100) * 0.3
+            events.append(CollectionEvent(
+                collector=collectors[i % 200], species=species[i % len(species)],
+                harvest_date=date(2023, 1, 1) + timedelta(days=i % 700),
+                gps_latitude=lat, gps_longitude=lng, geohash=spatial.encode_geohash(lat, lng),
+                quantity_kg=10.0, quality_grade='ABC'[i % 3], weather_conditions='Sunny',
+            ))
+        events = CollectionEvent.objects.bulk_create(events)
+        batches = ProcessingBatch.objects.bulk_create([
+            ProcessingBatch(batch_id=f'IDX-B{i}', processing_facility='Facility', batch_size_kg=100.0,
+                            start_date=timezone.now() - timedelta(days=i),
+                            status=['processing', 'quality_testing', 'completed', 'rejected'][i % 4])
+            for i in range(cls.BATCHES)
+        ])
+        through = ProcessingBatch.collection_events.through
+        through.objects.bulk_create([
+            through(processingbatch=batches[i % cls.BATCHES], collectionevent=event) for i, event in enumerate(events)
+        ])
+        ProcessingStep.objects.bulk_create([
+            ProcessingStep(batch=batches[i % cls.BATCHES], step_type='drying', operator_name='Operator')
+            for i in range(cls.BATCHES * 3)
+        ])
+        QualityTest.objects.bulk_create([
+            QualityTest(batch=batch, lab_name='Lab', lab_license='LAB-1', moisture_content=8.0,
+                        pesticide_residue='none', heavy_metals='pass', microbial_count=100,
+                        certificate_number=f'IDX-CERT-{i}', test_status=['pending', 'passed', 'failed'][i % 3])
+            for i, batch in enumerate(batches)
+        ])
+
+    def assert_indexed(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertLess(response.status_code, 400, url)
+        allowed = self.LISTINGS.get(url.split('?')[0], set())
+        for sql, plan in query_plans(ctx.captured_queries):
+            self.assertFalse(full_scans(plan) - allowed, f'{url}: {sql}\n{plan}')
+
+    def test_views_use_indexes(self):
+        urls = [
+            reverse('home'),
+            reverse('lab_form'),
+            reverse('processing_form'),
+            reverse('autocomplete_api', args=['batches']) + '?q=idx',
+            reverse('autocomplete_api', args=['collectors']) + '?q=collector 1',
+            reverse('autocomplete_api', args=['events']) + '?q=IDX-C1&species=tulsi',
+            reverse('batch_detail', args=['IDX-000']),
+            reverse('batch_data_api', args=['IDX-000']) + '?proof=1',
+            reverse('stats_api'),
+            reverse('analytics_api', args=['harvest']) + '?dimension=species',
+            '/api/batches/IDX-000/',
+            '/api/batches/?page_size=20',
+            '/api/batches/?expand=collection_events,quality_tests',
+            '/api/collections/map_data/?species=tulsi&date_from=2023-06-01&limit=100',
+            '/api/collections/map_data/?bbox=75,20,76,21&limit=100',
+            '/api/collections/map_data/?date_from=2024-01-01&date_to=2024-01-31',
+            '/api/collections/within-radius/?lat=21&lng=76&radius_km=10',
+            '/api/collections/within-bbox/?bbox=75,20,75.5,20.5',
+            '/api/collections/within-polygon/?polygon=75 20,75.5 20,75.5 20.5,75 20.5',
+            '/api/collections/tiles/6/45/27/',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assert_indexed(url)
+
+    def test_listings_only_scan_their_own_table(self):
+        for url in self.LISTINGS:
+            with self.subTest(url=url):
+                self.assert_indexed(url)
+
+    def test_hot_filters_use_designed_indexes(self):
+        queries = {
+            'batch_status_start_idx': ProcessingBatch.objects.filter(status='completed').order_by('-start_date'),
+            'batch_recent_idx': ProcessingBatch.objects.order_by('-start_date')[:5],
+            'event_recent_idx': CollectionEvent.objects.order_by('-created_at')[:5],
+            'event_species_harvest_idx': CollectionEvent.objects.filter(
+                species__name='tulsi', harvest_date__gte=date(2023, 6, 1)),
+            'quality_test_status_idx': QualityTest.objects.filter(test_status='passed'),
+            'step_batch_timestamp_idx': ProcessingStep.objects.filter(batch=self.batch),
+        }
+        for index, queryset in queries.items():
+            with self.subTest(index=index):
+                self.assertIn(index, queryset.explain())
+
+
+class SQLiteTuningTests(TestCase):
+
+    def test_pragmas_applied_to_new_connections(self):
+        values = sqlite.current_pragmas(connection, ['busy_timeout', 'cache_size', 'synchronous'])
+        self.assertEqual(values, {'busy_timeout': 5000, 'cache_size': -64000, 'synchronous': 1})
+
+
+class ReadReplicaRoutingTests(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def read_alias_view(self, request):
+        return HttpResponse(routers.ReadReplicaRouter().db_for_read(ProcessingBatch) or 'default')
+
+    def test_reads_use_default_without_replica(self):
+        response = routers.replica_reads(self.read_alias_view)(self.factory.get('/'))
+        self.assertEqual(response.content, b'default')
+
+    @override_settings(READ_REPLICA_ALIAS='other')
+    def test_consumer_reads_use_replica_alias(self):
+        with patch.dict(connections.databases, other=connections.databases['default']):
+            response = routers.replica_reads(self.read_alias_view)(self.factory.get('/'))
+            self.assertEqual(response.content, b'other')
+            # Outside the decorated view reads go back to the primary
+            self.assertIsNone(routers.ReadReplicaRouter().db_for_read(ProcessingBatch))
+            self.assertEqual(routers.ReadReplicaRouter().db_for_write(ProcessingBatch), 'default')
+            self.assertFalse(routers.ReadReplicaRouter().allow_migrate('other', 'traceability'))
+
+    @override_settings(READ_REPLICA_ALIAS='other')
+    def test_recent_writer_reads_from_primary(self):
+        with patch.dict(connections.databases, other=connections.databases['default']):
+            response = self.client.post(reverse('collector_form'), {})
+            self.assertIn(routers.STICKY_COOKIE, response.cookies)
+            request = self.factory.get('/')
+            request.COOKIES[routers.STICKY_COOKIE] = response.cookies[routers.STICKY_COOKIE].value
+            self.assertTrue(routers.is_pinned_to_primary(request))
+            response = routers.replica_reads(self.read_alias_view)(request)
+            self.assertEqual(response.content, b'default')
+
+    def test_no_sticky_cookie_without_replica(self):
+        response = self.client.post(reverse('collector_form'), {})
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class FastJSONTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_batch('FAST-001', events=3, steps=2, tests=1)
+        create_batch('FAST-002', events=1, steps=0, tests=0)
+
+    def test_collection_list_matches_serializer(self):
+        events = CollectionEvent.objects.select_related('collector', 'species').order_by('id')
+        expected = json.loads(JSONRenderer().render(CollectionEventSerializer(events, many=True).data))
+        self.assertEqual(self.client.get('/api/collections/').json(), expected)
+
+    def test_batch_list_matches_serializer(self):
+        batches = ProcessingBatch.objects.order_by('-start_date', '-id')
+        expected = json.loads(JSONRenderer().render(ProcessingBatchListSerializer(batches, many=True).data))
+        self.assertEqual(self.client.get('/api/batches/').json()['results'], expected)
+
+    def test_encoders_agree(self):
+        data = {'day': date(2024, 1, 2), 'at': timezone.now(), 'id': uuid.uuid4(), 'name': 'Tulsī', 1: None}
+        fast = fastjson.dumps(data)
+        with patch.object(fastjson, 'orjson', None):
+            self.assertEqual(fastjson.dumps(data), fast)
+
+    def test_extractor_reuses_columns(self):
+        columns, extract = fastjson.compile_extractor(
+            [('a', 'x', None), ('b', 'y', str), ('c', 'x', lambda value: value * 2)], leading=['pk'])
+        self.assertEqual(columns, ['pk', 'x', 'y'])
+        self.assertEqual(extract((7, 1, 2)), {'a': 1, 'b': '2', 'c': 2})
+        self.assertEqual(list(extract((7, 1, 2))), ['a', 'b', 'c'])
+
+    def test_extractor_single_and_unconverted_fields(self):
+        columns, extract = fastjson.compile_extractor([('a', 'x', None)])
+        self.assertEqual(extract(('v',)), {'a': 'v'})
+        columns, extract = fastjson.compile_extractor([('a', 'x', None), ('b', 'y', None)], leading=['pk'])
+        self.assertEqual(extract((7, 1, 2)), {'a': 1, 'b': 2})
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class SyntheticDataTests(TestCase):
+
+    def generate(self, prefix='SYN', seed=0):
+        return synthetic.generate(collectors=20, events=300, events_per_batch=10, seed=seed, chunk_size=120,
+                                  prefix=prefix, end_date=date(2024, 6, 30))
+
+    def test_generates_requested_rows_in_chunks(self):
+        counts = self.generate()
+        self.assertEqual(counts['collectors'], 20)
+        self.assertEqual(CollectionEvent.objects.count(), 300)
+        self.assertEqual(ProcessingBatch.objects.count(), counts['batches'])
+        self.assertEqual(ProcessingBatch.collection_events.through.objects.count(), 300)
+        self.assertEqual(ProcessingStep.objects.count(), counts['steps'])
+        self.assertFalse(CollectionEvent.objects.filter(geohash='').exists())
+        self.assertFalse(ProcessingStep.objects.filter(timestamp__date=timezone.now().date()).exists())
+
+    def test_derived_data_is_consistent(self):
+        self.generate()
+        self.assertEqual(list(stats.drift()), [])
+        self.assertEqual(list(analytics.drift()), [])
+        self.assertEqual(LedgerEntry.objects.count(),
+                         CollectionEvent.objects.count() + ProcessingStep.objects.count()
+                         + QualityTest.objects.count())
+
+    def test_same_seed_same_rows(self):
+        fields = ('collector__collector_id', 'species__name', 'harvest_date', 'gps_latitude', 'quantity_kg',
+                  'event_id')
+        self.generate()
+        first = list(CollectionEvent.objects.order_by('id').values_list(*fields))
+        ProcessingBatch.objects.all().delete()
+        Collector.objects.all().delete()
+        self.generate()
+        self.assertEqual(list(CollectionEvent.objects.order_by('id').values_list(*fields)), first)
+
+    def test_benchmark_endpoints_reports_each_endpoint(self):
+        self.generate()
+        output = io.StringIO()
+        call_command('benchmark_endpoints', requests=2, warmup=0, endpoint=['batch_data', 'stats'], stdout=output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines[1:]], ['batch_data', 'stats'])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, SERVER_TIMING=True)
+class RequestInstrumentationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_batch('METRICS-001', events=2, steps=1, tests=1)
+
+    def setUp(self):
+        instrumentation.metrics.reset()
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/batches/METRICS-001/')
+        timing = response['Server-Timing']
+        self.assertIn('app;dur=', timing)
+        self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', timing)
+        self.assertIn('render;dur=', timing)
+
+    def test_metrics_endpoint_reports_views(self):
+        self.client.get(reverse('batch_data_api', args=['METRICS-001']))
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('traceability_http_requests_total{view="batch_data_api",method="GET",status="200"} 1', body)
+        self.assertIn('traceability_http_request_duration_seconds_count{view="batch_data_api"} 1', body)
+        self.assertIn('traceability_http_db_queries_total{view="batch_data_api"}', body)
+
+    def test_metrics_endpoint_is_local_only(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.5').status_code, 404)
+
+    def test_metrics_endpoint_refuses_proxied_requests(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1', HTTP_X_FORWARDED_FOR='203.0.113.5')
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_metrics_endpoint_requires_token_when_configured(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 404)
+        response = self.client.get(url, REMOTE_ADDR='203.0.113.5', HTTP_X_FORWARDED_FOR='203.0.113.5',
+                                   HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_slow_requests_are_profiled(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with override_settings(PROFILE_REQUESTS_SAMPLE_RATE=1, PROFILE_REQUESTS_THRESHOLD_MS=0,
+                               PROFILE_REQUESTS_DIR=directory), self.assertLogs('traceability.instrumentation'):
+            self.client.get(reverse('stats_api'))
+        [name] = os.listdir(directory)
+        self.assertTrue(name.startswith('stats_api-') and name.endswith('.prof'))
+        pstats.Stats(os.path.join(directory, name))
+
+
+class AutocompleteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batch = create_batch('ASH-2024-001', events=3, steps=1, tests=0)
+        create_batch('ASH-2024-002', events=1, steps=1, tests=0)
+        create_batch('TUL-2024-001', events=1, steps=1, tests=0)
+        cls.event = cls.batch.collection_events.first()
+
+    def search(self, kind, **params):
+        response = self.client.get(reverse('autocomplete_api', args=[kind]), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['results']
+
+    def test_prefix_range(self):
+        self.assertEqual(autocomplete.prefix_range('ash'), ('ash', 'asi'))
+        self.assertEqual(autocomplete.prefix_range('a-'), ('a-', 'a.'))
+
+    def test_batches_match_prefix_case_insensitively(self):
+        self.assertEqual([r['value'] for r in self.search('batches', q='ash')], ['ASH-2024-001', 'ASH-2024-002'])
+        self.assertEqual([r['value'] for r in self.search('batches', q='ASH-2024-002')], ['ASH-2024-002'])
+        self.assertEqual(self.search('batches', q='ASH-2025'), [])
+        self.assertEqual(len(self.search('batches', q='a', limit=1)), 1)
+
+    def test_collectors_match_id_or_name(self):
+        collector = self.event.collector
+        by_id = self.search('collectors', q=collector.collector_id[:4].lower())
+        by_name = self.search('collectors', q=collector.name[:3].upper())
+        self.assertIn(collector.collector_id, [r['value'] for r in by_id])
+        self.assertIn(collector.collector_id, [r['value'] for r in by_name])
+
+    def test_events_by_collector_or_event_id(self):
+        results = self.search('events', q=self.event.collector.collector_id)
+        self.assertIn(str(self.event.event_id), [r['value'] for r in results])
+        self.assertIn(self.event.collector.name, results[0]['label'])
+        [result] = self.search('events', q=str(self.event.event_id))
+        self.assertEqual(result['value'], str(self.event.event_id))
+        self.assertEqual(self.search('events', q=str(self.event.event_id), species='tulsi'), [])
+
+    def test_empty_query_and_unknown_kind(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('batches', q=' '), [])
+        response = self.client.get(reverse('autocomplete_api', args=['labs']), {'q': 'a'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_processing_form_does_not_render_every_row(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('processing_form'))
+        create_batch('ASH-2024-003', events=20, steps=1, tests=0)
+        with self.assertNumQueries(len(ctx.captured_queries)):
+            response = self.client.get(reverse('processing_form'))
+        self.assertNotContains(response, str(self.event.event_id))
+        self.assertContains(response, 'ASH-2024-003')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class BatchCreationTests(HarvestRecordMixin, TestCase):
+
+    def harvests(self, count):
+        results = ingest.ingest_collection_events([self.record(quantity_kg=10 + i) for i in range(count)])
+        return [result['event_id'] for result in results]
+
+    def post(self, batch_id, event_ids, **fields):
+        data = {'batch_id': batch_id, 'processing_facility': 'Deccan Botanicals', 'step_type': 'cleaning',
+                'operator_name': 'Priya Singh', 'collection_events': event_ids, **fields}
+        return self.client.post(reverse('processing_form'), data)
+
+    def test_create_batch_links_events(self):
+        event_ids = self.harvests(3)
+        batch = services.create_batch('SVC-001', 'Deccan Botanicals', event_ids)
+        self.assertEqual({str(e) for e in batch.collection_events.values_list('event_id', flat=True)}, set(event_ids))
+        self.assertEqual(batch.batch_size_kg, 33.0)
+
+    def test_query_count_does_not_grow_with_events(self):
+        few, many = self.harvests(2), self.harvests(40)
+        # Warm up the version stamp and counter rows created by the first write
+        self.post('SVC-WARM', [])
+        counts = []
+        for batch_id, event_ids in (('SVC-FEW', few), ('SVC-MANY', many)):
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.post(batch_id, event_ids).status_code, 302)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(ProcessingBatch.objects.get(batch_id='SVC-MANY').collection_events.count(), 40)
+
+    def test_unknown_event_fails_atomically(self):
+        event_ids = self.harvests(2) + [str(uuid.uuid4())]
+        response = self.post('SVC-BAD', event_ids)
+        self.assertContains(response, 'Unknown collection events')
+        self.assertFalse(ProcessingBatch.objects.filter(batch_id='SVC-BAD').exists())
+        with self.assertRaisesMessage(ValueError, 'UUIDs'):
+            services.create_batch('SVC-BAD', 'Deccan Botanicals', ['not-a-uuid'])
+
+    def test_step_failure_rolls_back_new_batch(self):
+        response = self.post('SVC-STEP', self.harvests(1), temperature='hot')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(ProcessingBatch.objects.filter(batch_id='SVC-STEP').exists())
+
+    def test_existing_batch_gets_step_only(self):
+        batch = services.create_batch('SVC-OLD', 'Deccan Botanicals', self.harvests(1))
+        self.assertEqual(self.post('SVC-OLD', self.harvests(2)).status_code, 302)
+        self.assertEqual(batch.collection_events.count(), 1)
+        self.assertEqual(batch.processing_steps.count(), 1)
+
+
+def search_documents():
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT kind, key, title, body FROM {search.TABLE} ORDER BY rowid')
+        return cursor.fetchall()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class SearchTests(HarvestRecordMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.batch = create_batch('ASH-2024-001', events=2, steps=1, tests=1)
+        create_batch('TUL-2024-007', events=1, steps=1, tests=1)
+
+    def api(self, **params):
+        response = self.client.get(reverse('search_api'), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['results']
+
+    def test_match_expression(self):
+        self.assertEqual(search.match_expression('ASH-2024-0 Himal'), '"ash 2024 0"* "himal"*')
+        self.assertEqual(search.match_expression(' "*( '), '')
+
+    def test_prefix_search_across_kinds(self):
+        self.assertEqual([r['key'] for r in self.api(q='CERT-ASH')], ['CERT-ASH-2024-001-0'])
+        self.assertEqual({r['type'] for r in self.api(q='sitapur')}, {'collector'})
+        self.assertEqual(self.api(q='ramesh kum')[0]['key'], 'COL001')
+        [test] = self.api(q='herbal testing tul')
+        self.assertEqual((test['type'], test['batch_id'], test['url']),
+                         ('test', 'TUL-2024-007', reverse('batch_detail', args=['TUL-2024-007'])))
+
+    def test_title_matches_rank_first(self):
+        # The test mentions the batch_id in its body only
+        results = self.api(q='ash-2024-001', type='batch,test')
+        self.assertEqual([(r['type'], r['key']) for r in results],
+                         [('batch', 'ASH-2024-001'), ('test', 'CERT-ASH-2024-001-0')])
+        self.assertGreater(results[0]['score'], results[1]['score'])
+
+    def test_type_and_limit(self):
+        self.assertEqual({r['type'] for r in self.api(q='2024', type='batch')}, {'batch'})
+        self.assertEqual(len(self.api(q='collector', limit=2)), 2)
+        self.assertEqual(self.api(q=''), [])
+        self.assertEqual(self.client.get(reverse('search_api'), {'q': 'a', 'type': 'lab'}).status_code, 400)
+
+    def test_documents_follow_writes(self):
+        collector = Collector.objects.get(collector_id='COL001')
+        collector.name = 'Suresh Prasad'
+        collector.save()
+        self.assertEqual(self.api(q='ramesh'), [])
+        self.assertEqual(self.api(q='suresh')[0]['key'], 'COL001')
+
+        self.batch.batch_id = 'ASH-2025-001'
+        self.batch.save()
+        self.assertEqual([r['batch_id'] for r in self.api(q='ash-2025', type='test')], ['ASH-2025-001'])
+
+        self.batch.delete()
+        self.assertEqual(self.api(q='ash', type='batch,test'), [])
+
+    def test_other_batch_saves_leave_test_documents_alone(self):
+        with patch('traceability.signals.search.index_tests') as index_tests:
+            self.batch.status = 'completed'
+            self.batch.save()
+            self.batch.save(update_fields=['qr_code'])
+        index_tests.assert_not_called()
+        self.assertEqual(search_documents(), self.rebuilt_documents())
+
+    def test_bulk_created_records_are_indexed(self):
+        ingest.ingest_collection_events([self.record(collector_id='NEW1', collector_name='Kavita Nair',
+                                                     village='Wayanad', state='Kerala')])
+        synthetic.generate(collectors=3, events=20, events_per_batch=5, prefix='SRCH', end_date=date(2024, 6, 30))
+        self.assertEqual(self.api(q='wayanad kerala')[0]['key'], 'NEW1')
+        self.assertTrue(self.api(q='srchb', type='batch'))
+        self.assertTrue(self.api(q='cert-srchb', type='test'))
+        self.assertEqual(search_documents(), self.rebuilt_documents())
+
+    def rebuilt_documents(self):
+        out = io.StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn(f'Indexed {Collector.objects.count() + ProcessingBatch.objects.count() + QualityTest.objects.count()}',
+                      out.getvalue())
+        return search_documents()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, LEDGER_BLOCK_SIZE=4)
+class LedgerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batch = create_batch('LEDGER-001', events=3, steps=3, tests=1)
+        ledger.seal_pending()
+
+    def test_merkle_proofs_verify_for_every_leaf(self):
+        for count in range(1, 10):
+            leaves = [ledger.leaf_hash('collection_event', i, 'create', f'{i:064x}') for i in range(count)]
+            root = ledger.merkle_root(leaves)
+            for index, leaf in enumerate(leaves):
+                proof = ledger.merkle_proof(leaves, index)
+                self.assertTrue(ledger.verify_proof(leaf, proof, root))
+                self.assertFalse(ledger.verify_proof(leaves[(index + 1) % count] if count > 1 else '0' * 64,
+                                                     proof, root))
+                if proof:
+                    tampered = [[side, '0' * 64] for side, _ in proof]
+                    self.assertFalse(ledger.verify_proof(leaf, tampered, root))
+
+    def test_stored_proofs_verify_against_block_roots(self):
+        entries = LedgerEntry.objects.select_related('block')
+        self.assertEqual(entries.filter(block__isnull=True).count(), 0)
+        self.assertGreater(LedgerBlock.objects.count(), 1)
+        for entry in entries:
+            proof = ledger.inclusion_proof(entry)
+            self.assertEqual(proof['merkle_root'], entry.block.merkle_root)
+            self.assertTrue(ledger.verify_proof(proof['leaf'], proof['proof'], proof['merkle_root']))
+
+    def test_chain_verifies(self):
+        result = ledger.verify_chain(full=True)
+        self.assertTrue(result.ok, result.error)
+        self.assertEqual(result.blocks_checked, LedgerBlock.objects.count())
+        self.assertEqual(result.head_index, LedgerBlock.objects.order_by('-index').first().index)
+
+    def test_changed_entry_payload_breaks_chain(self):
+        entry = LedgerEntry.objects.order_by('id')[5]
+        LedgerEntry.objects.filter(pk=entry.pk).update(payload_hash='f' * 64)
+        result = ledger.verify_chain(full=True)
+        self.assertFalse(result.ok)
+        self.assertEqual(result.error, f'Block #{entry.block.index} Merkle root mismatch')
+
+    def test_changed_previous_hash_breaks_chain(self):
+        block = LedgerBlock.objects.get(index=1)
+        LedgerBlock.objects.filter(pk=block.pk).update(previous_hash='f' * 64)
+        result = ledger.verify_chain(full=True)
+        self.assertFalse(result.ok)
+        self.assertEqual((result.error, result.blocks_checked), ('Block #1 does not link to its predecessor', 1))
+
+    def test_changed_block_header_breaks_chain(self):
+        LedgerBlock.objects.filter(index=0).update(created_at=timezone.now() + timedelta(days=1))
+        result = ledger.verify_chain(full=True)
+        self.assertEqual(result.error, 'Block #0 header hash mismatch')
+
+    def test_checkpoint_makes_verification_incremental(self):
+        first = ledger.verify_chain()
+        self.assertTrue(first.ok)
+        self.assertEqual(LedgerCheckpoint.objects.get().block_index, first.head_index)
+        again = ledger.verify_chain()
+        self.assertEqual((again.ok, again.blocks_checked, again.head_index), (True, 0, first.head_index))
+
+        create_batch('LEDGER-002', events=4, steps=0, tests=0)
+        ledger.seal_pending()
+        later = ledger.verify_chain()
+        self.assertTrue(later.ok, later.error)
+        self.assertEqual(later.blocks_checked, LedgerBlock.objects.filter(index__gt=first.head_index).count())
+        self.assertEqual(LedgerCheckpoint.objects.order_by('-block_index').first().block_index, later.head_index)
+
+    def test_checkpoint_detects_rewritten_history(self):
+        head = ledger.verify_chain().head_index
+        # Blocks before the checkpoint are not re-read incrementally, but the
+        # checkpointed hash itself is compared, and a full run re-reads everything
+        LedgerBlock.objects.filter(index=0).update(previous_hash='f' * 64)
+        self.assertTrue(ledger.verify_chain().ok)
+        self.assertFalse(ledger.verify_chain(full=True).ok)
+        LedgerBlock.objects.filter(index=head).update(block_hash='e' * 64)
+        result = ledger.verify_chain()
+        self.assertEqual((result.ok, result.error), (False, f'Checkpointed block #{head} has changed'))
+
+    def test_verify_records_finds_edited_rows(self):
+        self.assertEqual(list(ledger.verify_records()), [])
+        step = self.batch.processing_steps.first()
+        ProcessingStep.objects.filter(pk=step.pk).update(operator_name='Someone Else')
+        self.assertEqual(list(ledger.verify_records()), [('processing_step', step.pk)])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, LEDGER_BLOCK_SIZE=4)
+class BatchProofTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_batch('PROOF-001', events=3, steps=2, tests=1)
+        ledger.seal_pending()
+
+    def setUp(self):
+        caches[provenance.CACHE_ALIAS].clear()
+
+    def proof_url(self):
+        return reverse('batch_data_api', args=['PROOF-001']) + '?proof=1'
+
+    def test_repeat_renders_reuse_the_cached_proof(self):
+        self.client.get(reverse('batch_detail', args=['PROOF-001']))
+        self.client.get(self.proof_url())
+        with patch('traceability.provenance.ledger.batch_proof') as batch_proof:
+            # The stamp lookup plus the batch page's own provenance queries
+            with self.assertNumQueries(1 + provenance.PROVENANCE_QUERY_COUNT):
+                response = self.client.get(reverse('batch_detail', args=['PROOF-001']))
+            with self.assertNumQueries(1):
+                self.client.get(self.proof_url())
+        batch_proof.assert_not_called()
+        self.assertTrue(response.context['ledger_proof']['anchored'])
+
+    def test_cached_proof_follows_new_blocks_and_checkpoints(self):
+        self.assertIsNone(self.client.get(self.proof_url()).json()['ledger_proof']['verified_through_block'])
+        ProcessingStep.objects.create(batch=ProcessingBatch.objects.get(batch_id='PROOF-001'),
+                                      step_type='grinding', operator_name='Amit Sharma')
+        self.assertEqual(len(self.client.get(self.proof_url()).json()['ledger_proof']['pending']), 1)
+        ledger.seal_pending()
+        proof = self.client.get(self.proof_url()).json()['ledger_proof']
+        self.assertEqual((proof['pending'], len(proof['records'])), ([], 7))
+        head = ledger.verify_chain().head_index
+        self.assertEqual(self.client.get(self.proof_url()).json()['ledger_proof']['verified_through_block'], head)
+
+    def test_every_record_verifies_against_its_block_root(self):
+        response = self.client.get(reverse('batch_data_api', args=['PROOF-001']), {'proof': 1})
+        proof = response.json()['ledger_proof']
+        self.assertTrue(proof['anchored'])
+        self.assertEqual(proof['pending'], [])
+        self.assertEqual(sorted(record['type'] for record in proof['records']),
+                         ['collection_event'] * 3 + ['processing_step'] * 2 + ['quality_test'])
+        for record in proof['records']:
+            root = proof['blocks'][str(record['block'])]['merkle_root']
+            leaf = ledger.leaf_hash(record['type'], record['id'], record['action'], record['payload_hash'])
+            self.assertEqual(leaf, record['leaf'])
+            self.assertTrue(ledger.verify_proof(leaf, record['proof'], root))
+            changed = ledger.leaf_hash(record['type'], record['id'], record['action'], 'f' * 64)
+            self.assertFalse(ledger.verify_proof(changed, record['proof'], root))
+
+    def test_blocks_chain_together(self):
+        blocks = ledger.batch_proof('PROOF-001')['blocks']
+        linked = [index for index in blocks if index - 1 in blocks]
+        self.assertTrue(linked)
+        for index in linked:
+            self.assertEqual(blocks[index]['previous_hash'], blocks[index - 1]['block_hash'])
+
+    def test_unsealed_records_are_pending(self):
+        step = ProcessingStep.objects.create(batch=ProcessingBatch.objects.get(batch_id='PROOF-001'),
+                                             step_type='grinding', operator_name='Amit Sharma')
+        proof = ledger.batch_proof('PROOF-001')
+        self.assertFalse(proof['anchored'])
+        self.assertEqual(proof['pending'], [{'type': 'processing_step', 'id': step.pk}])
+
+
+@override_settings(LEDGER_BLOCK_SIZE=3)
+class MigrationBackfillTests(TransactionTestCase):
+    """Migrate a database populated before the derived tables existed"""
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('traceability', target)])
+        return executor.loader.project_state(('traceability', target)).apps
+
+    def setUp(self):
+        latest = MigrationExecutor(connection).loader.graph.leaf_nodes('traceability')[0][1]
+        self.addCleanup(self.migrate, latest)
+        apps = self.migrate('0001_initial')
+        species = apps.get_model('traceability', 'HerbSpecies').objects.create(
+            name='ginger', scientific_name='Zingiber officinale')
+        collector = apps.get_model('traceability', 'Collector').objects.create(
+            collector_id='COL005', name='Sunita Devi', village='Sitapur', state='Uttar Pradesh')
+        Event = apps.get_model('traceability', 'CollectionEvent')
+        events = [Event.objects.create(
+            collector=collector, species=species, harvest_date=date(2024, 3, 1 + i % 2),
+            gps_latitude=26.8 + i * 0.3, gps_longitude=80.9 - i * 0.2, quantity_kg=10.5 + i,
+            quality_grade='AB'[i % 2], weather_conditions='Sunny',
+        ) for i in range(3)]
+        batch = apps.get_model('traceability', 'ProcessingBatch').objects.create(
+            batch_id='OLD-001', processing_facility='Himalayan Herbs Processing Pvt Ltd',
+            start_date=timezone.now(), batch_size_kg=34.5)
+        batch.collection_events.add(*events)
+        apps.get_model('traceability', 'ProcessingStep').objects.create(
+            batch=batch, step_type='drying', duration_hours=6.0, operator_name='Priya Singh')
+        self.migrate(latest)
+
+    def test_existing_records_are_sealed_into_the_ledger(self):
+        self.assertEqual(LedgerEntry.objects.count(), 4)
+        self.assertEqual(list(ledger.verify_records()), [])
+        self.assertEqual(ledger.verify_chain(full=True), (True, 2, 1, None))
+        proof = ledger.batch_proof('OLD-001')
+        self.assertTrue(proof['anchored'])
+        self.assertEqual(len(proof['records']), 4)
+        for record in proof['records']:
+            root = proof['blocks'][record['block']]['merkle_root']
+            self.assertTrue(ledger.verify_proof(record['leaf'], record['proof'], root))
+
+    def test_harvest_tiles_are_built_from_existing_events(self):
+        rows = CollectionEvent.objects.values_list('gps_latitude', 'gps_longitude', 'quantity_kg', 'quality_grade')
+        expected = tiles.tile_deltas(rows)
+        stored = {(tile.zoom, tile.x, tile.y): tile for tile in HarvestTile.objects.all()}
+        self.assertEqual(stored.keys(), expected.keys())
+        for cell, (count, quantity, grade_a, grade_b, grade_c, lat_sum, lng_sum) in expected.items():
+            tile = stored[cell]
+            self.assertEqual((tile.event_count, tile.grade_a, tile.grade_b, tile.grade_c),
+                             (count, grade_a, grade_b, grade_c))
+            self.assertAlmostEqual(tile.total_quantity_kg, quantity)
+            self.assertAlmostEqual(tile.latitude_sum, lat_sum)
+
+        event = CollectionEvent.objects.first()
+        event.gps_latitude += 1
+        event.save()
+        self.assertFalse(HarvestTile.objects.filter(event_count__lt=0).exists())
+        self.assertEqual(HarvestTile.objects.filter(zoom=0).get().event_count, 3)
+
+    def test_daily_rollups_are_built_from_existing_rows(self):
+        self.assertEqual(list(analytics.drift()), [])
+        event = CollectionEvent.objects.first()
+        event.quantity_kg += 1
+        event.save()
+        self.assertEqual(list(analytics.drift()), [])
+        self.assertFalse(DailyRollup.objects.filter(count__lt=0).exists())
+        self.assertEqual(DailyRollup.objects.get(metric='processing', dimension='step_type', key='drying').total, 6.0)
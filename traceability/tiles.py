@@ -0,0 +1,140 @@
+"""
+Server-side aggregation of harvest locations into map tiles.
+
+Collection events are bucketed into Web Mercator (slippy map) grid cells at
+every zoom level from 0 to CELL_MAX_ZOOM. Each HarvestTile row keeps the
+event count, total quantity, grade mix and coordinate sums (for a centroid)
+of one cell, and is updated incrementally as events are written.
+
+A map tile z/x/y is served as the cells GRID_SHIFT levels below it, so a
+response holds at most 4**GRID_SHIFT cells no matter how many harvests fall
+inside the tile.
+"""
+import math
+from collections import defaultdict
+
+from django.db import connection, transaction
+
+from .models import CollectionEvent, HarvestTile
+
+CELL_MAX_ZOOM = 15
+GRID_SHIFT = 3
+MAX_LATITUDE = 85.05112878
+
+GRADE_COLUMNS = {'A': 'grade_a', 'B': 'grade_b', 'C': 'grade_c'}
+DELTA_COLUMNS = ('event_count', 'total_quantity_kg', 'grade_a', 'grade_b', 'grade_c',
+                 'latitude_sum', 'longitude_sum')
+
+
+def cell_for(lat, lng, zoom):
+    """Web Mercator tile coordinates containing a point at a zoom level"""
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    n = 1 << zoom
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(zoom, x, y):
+    """(west, south, east, north) of a tile in degrees"""
+    n = 1 << zoom
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def tile_deltas(rows, sign=1):
+    """
+    Aggregate (lat, lng, quantity_kg, grade) rows into per-cell deltas for
+    every zoom level: {(zoom, x, y): [event_count, quantity, a, b, c, lat_sum, lng_sum]}
+    """
+    deltas = defaultdict(lambda: [0, 0.0, 0, 0, 0, 0.0, 0.0])
+    for lat, lng, quantity, grade in rows:
+        for zoom in range(CELL_MAX_ZOOM + 1):
+            delta = deltas[(zoom,) + cell_for(lat, lng, zoom)]
+            delta[0] += sign
+            delta[1] += sign * quantity
+            if grade in GRADE_COLUMNS:
+                delta[2 + 'ABC'.index(grade)] += sign
+            delta[5] += sign * lat
+            delta[6] += sign * lng
+    return deltas
+
+
+def apply_deltas(deltas):
+    """Add per-cell deltas to HarvestTile rows with a single multi-row upsert"""
+    if not deltas:
+        return
+    table = connection.ops.quote_name(HarvestTile._meta.db_table)
+    columns = ', '.join(DELTA_COLUMNS)
+    updates = ', '.join(f'{column} = {table}.{column} + excluded.{column}' for column in DELTA_COLUMNS)
+    sql = (
+        f'INSERT INTO {table} (zoom, x, y, {columns}) '
+        f'VALUES ({", ".join(["%s"] * (3 + len(DELTA_COLUMNS)))}) '
+        f'ON CONFLICT (zoom, x, y) DO UPDATE SET {updates}'
+    )
+    params = [cell + tuple(delta) for cell, delta in deltas.items()]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def event_row(event):
+    return event.gps_latitude, event.gps_longitude, event.quantity_kg, event.quality_grade
+
+
+def record_events(rows, sign=1):
+    apply_deltas(tile_deltas(rows, sign))
+
+
+def rebuild():
+    """Recompute every tile from the collection events table"""
+    rows = CollectionEvent.objects.values_list('gps_latitude', 'gps_longitude', 'quantity_kg', 'quality_grade')
+    with transaction.atomic():
+        HarvestTile.objects.all().delete()
+        chunk = []
+        for row in rows.iterator(chunk_size=5000):
+            chunk.append(row)
+            if len(chunk) == 5000:
+                record_events(chunk)
+                chunk = []
+        record_events(chunk)
+    return HarvestTile.objects.count()
+
+
+def tile_cells(zoom, x, y):
+    """Aggregated cells inside map tile zoom/x/y, GRID_SHIFT levels deeper where possible"""
+    cell_zoom = min(zoom + GRID_SHIFT, CELL_MAX_ZOOM)
+    if cell_zoom >= zoom:
+        shift = cell_zoom - zoom
+        x_range = (x << shift, ((x + 1) << shift) - 1)
+        y_range = (y << shift, ((y + 1) << shift) - 1)
+    else:
+        # Zoomed in past the finest cells: serve the one cell containing the tile
+        shift = zoom - cell_zoom
+        x_range = (x >> shift, x >> shift)
+        y_range = (y >> shift, y >> shift)
+
+    cells = HarvestTile.objects.filter(
+        zoom=cell_zoom, x__range=x_range, y__range=y_range, event_count__gt=0,
+    ).values_list('x', 'y', *DELTA_COLUMNS)
+
+    return {
+        'zoom': zoom,
+        'x': x,
+        'y': y,
+        'cell_zoom': cell_zoom,
+        'cells': [
+            {
+                'x': cell_x,
+                'y': cell_y,
+                'lat': lat_sum / count,
+                'lng': lng_sum / count,
+                'count': count,
+                'quantity_kg': round(quantity, 3),
+                'grades': {'A': grade_a, 'B': grade_b, 'C': grade_c},
+            }
+            for cell_x, cell_y, count, quantity, grade_a, grade_b, grade_c, lat_sum, lng_sum in cells
+        ],
+    }
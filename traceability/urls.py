@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import instrumentation, views
 
 # API Router
 router = DefaultRouter()
@@ -10,6 +10,7 @@ router.register(r'collections', views.CollectionEventViewSet)
 router.register(r'batches', views.ProcessingBatchViewSet)
 router.register(r'processing-steps', views.ProcessingStepViewSet)
 router.register(r'quality-tests', views.QualityTestViewSet)
+router.register(r'sync-sessions', views.SyncSessionViewSet)
 
 urlpatterns = [
     # Web interface URLs
@@ -20,8 +21,16 @@ urlpatterns = [
     path('consumer/', views.consumer_portal, name='consumer_portal'),
     path('batch/<str:batch_id>/', views.batch_detail, name='batch_detail'),
     path('qr/<str:batch_id>/', views.qr_scan, name='qr_scan'),
+    path('qr-code/<str:batch_id>.<str:fmt>', views.qr_code_image, name='qr_code_image'),
     
     # API endpoints
     path('api/batch-data/<str:batch_id>/', views.get_batch_data, name='batch_data_api'),
+    path('api/stats/', views.stats_summary, name='stats_api'),
+    path('api/analytics/<str:metric>/', views.analytics_report, name='analytics_api'),
+    path('api/autocomplete/<str:kind>/', views.autocomplete_search, name='autocomplete_api'),
+    path('api/search/', views.search_records, name='search_api'),
     path('api/', include(router.urls)),
+    
+    # Prometheus scrape endpoint (see traceability.instrumentation)
+    path('metrics', instrumentation.metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""
+Cheap version stamps for HTTP conditional requests.
+
+Each batch ('batch:<batch_id>') and each polled dataset has a VersionStamp
+row that signal handlers bump on every write. Conditional views compare the
+client's If-None-Match / If-Modified-Since against the stamp, which is one
+unique-index lookup, and answer 304 without loading or serializing anything.
+"""
+import hashlib
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import VersionStamp
+
+COLLECTION_EVENTS = 'collection_events'
+LEDGER = 'ledger'
+ANALYTICS = 'analytics'
+
+
+def batch_key(batch_id):
+    return f'batch:{batch_id}'
+
+
+def bump(keys):
+    """Increment the version of every key, creating missing stamps"""
+    now = timezone.now()
+    for key in keys:
+        if VersionStamp.objects.filter(key=key).update(version=F('version') + 1, updated_at=now):
+            continue
+        try:
+            with transaction.atomic():
+                VersionStamp.objects.create(key=key, version=1, updated_at=now)
+        except IntegrityError:
+            VersionStamp.objects.filter(key=key).update(version=F('version') + 1, updated_at=now)
+
+
+def get_stamps(request, keys):
+    """
+    {key: (version, updated_at)} for keys, fetched in one query and memoised
+    on the request. Keys that have never been written report version 0 and
+    no modification time.
+    """
+    stamps = getattr(request, '_version_stamps', None)
+    if stamps is None:
+        stamps = request._version_stamps = {}
+    missing = [key for key in keys if key not in stamps]
+    if missing:
+        found = VersionStamp.objects.filter(key__in=missing).values_list('key', 'version', 'updated_at')
+        stamps.update({key: (version, updated_at) for key, version, updated_at in found})
+        for key in missing:
+            stamps.setdefault(key, (0, None))
+    return {key: stamps[key] for key in keys}
+
+
+def make_etag(request, keys):
+    """ETag built from the versions of keys and the request's query string"""
+    stamps = get_stamps(request, keys)
+    versions = '-'.join(f'{key}:{stamps[key][0]}' for key in keys)
+    variant = request.META.get('QUERY_STRING', '')
+    return hashlib.sha1(f'{versions}?{variant}'.encode()).hexdigest()
+
+
+def last_modified(request, keys):
+    timestamps = [updated_at for _, updated_at in get_stamps(request, keys).values()]
+    if None in timestamps:
+        return None
+    return max(timestamps)
+
+
+# Stamp keys per view, shared by the etag and last-modified functions
+
+def batch_data_keys(request, batch_id):
+    keys = [batch_key(batch_id)]
+    if request.GET.get('proof'):
+        keys.append(LEDGER)
+    return keys
+
+
+def batch_page_keys(request, batch_id):
+    return [batch_key(batch_id), LEDGER]
+
+
+def batch_data_etag(request, batch_id):
+    return make_etag(request, batch_data_keys(request, batch_id))
+
+
+def batch_data_last_modified(request, batch_id):
+    return last_modified(request, batch_data_keys(request, batch_id))
+
+
+def batch_page_etag(request, batch_id):
+    return make_etag(request, batch_page_keys(request, batch_id))
+
+
+def batch_page_last_modified(request, batch_id):
+    return last_modified(request, batch_page_keys(request, batch_id))
+
+
+def collection_events_etag(request, *args, **kwargs):
+    return make_etag(request, [COLLECTION_EVENTS])
+
+
+def collection_events_last_modified(request, *args, **kwargs):
+    return last_modified(request, [COLLECTION_EVENTS])
+
+
+def analytics_etag(request, *args, **kwargs):
+    return make_etag(request, [ANALYTICS])
+
+
+def analytics_last_modified(request, *args, **kwargs):
+    return last_modified(request, [ANALYTICS])
@@ -1,24 +1,37 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.conf import settings
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+from django.utils.decorators import method_decorator
 from django.utils import timezone
-from rest_framework import viewsets, status
+from django.db import IntegrityError, transaction
+from rest_framework import mixins, viewsets, status
 from rest_framework.response import Response
-from rest_framework.decorators import action
-import json
-from .models import Collector, HerbSpecies, CollectionEvent, ProcessingBatch, ProcessingStep, QualityTest
+from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
+from . import (analytics, autocomplete, fastjson, ingest, labels, qr_render, search, services, spatial,
+               stats, versioning)
+from . import tiles as harvest_tiles
+from .filters import (filter_collection_events, parse_bbox, parse_date, parse_expand, parse_float, parse_polygon,
+                      parse_positive_int)
+from .pagination import BatchCursorPagination
+from .parsers import NDJSONParser
+from .provenance import RELATIONS, batch_provenance_queryset, get_batch_proof, get_provenance_document
+from .routers import replica_reads
+from .models import (Collector, HerbSpecies, CollectionEvent, ProcessingBatch, ProcessingStep, QualityTest,
+                     IdempotencyKey, SyncSession)
 from .serializers import (CollectorSerializer, HerbSpeciesSerializer, CollectionEventSerializer, 
-                         ProcessingBatchSerializer, ProcessingStepSerializer, QualityTestSerializer)
+                         ProcessingBatchListSerializer, ProcessingBatchSerializer, ProcessingStepSerializer, QualityTestSerializer,
+                         SyncSessionSerializer)
 
 # Web Views
 def home(request):
     """Dashboard view showing statistics and recent activity"""
     context = {
-        'total_collections': CollectionEvent.objects.count(),
-        'active_batches': ProcessingBatch.objects.filter(status__in=['processing', 'quality_testing']).count(),
-        'completed_batches': ProcessingBatch.objects.filter(status='completed').count(),
-        'total_collectors': Collector.objects.count(),
+        **stats.dashboard_totals(),
         'recent_collections': CollectionEvent.objects.select_related('collector', 'species').order_by('-created_at')[:5],
         'recent_batches': ProcessingBatch.objects.order_by('-start_date')[:5],
     }
@@ -62,7 +75,6 @@ def collector_form(request):
     
     context = {
         'species': HerbSpecies.objects.all(),
-        'collectors': Collector.objects.all(),
     }
     return render(request, 'traceability/collector_form.html', context)
 
@@ -72,37 +84,29 @@ def processing_form(request):
         try:
             batch_id = request.POST.get('batch_id')
             
-            # Create batch if it doesn't exist
-            if not ProcessingBatch.objects.filter(batch_id=batch_id).exists():
-                batch = ProcessingBatch.objects.create(
-                    batch_id=batch_id,
-                    processing_facility=request.POST.get('processing_facility'),
-                    start_date=timezone.now(),
-                    batch_size_kg=float(request.POST.get('batch_size_kg', 0)),
-                )
+            # The batch and its first step are created together or not at all
+            with transaction.atomic():
+                batch = ProcessingBatch.objects.filter(batch_id=batch_id).first()
+                if batch is None:
+                    batch_size_kg = request.POST.get('batch_size_kg')
+                    batch = services.create_batch(
+                        batch_id,
+                        processing_facility=request.POST.get('processing_facility'),
+                        event_ids=request.POST.getlist('collection_events'),
+                        batch_size_kg=float(batch_size_kg) if batch_size_kg else None,
+                    )
                 
-                # Add collection events to batch
-                collection_ids = request.POST.getlist('collection_events')
-                for event_id in collection_ids:
-                    try:
-                        event = CollectionEvent.objects.get(event_id=event_id)
-                        batch.collection_events.add(event)
-                    except CollectionEvent.DoesNotExist:
-                        continue
-            else:
-                batch = ProcessingBatch.objects.get(batch_id=batch_id)
-            
-            # Add processing step
-            ProcessingStep.objects.create(
-                batch=batch,
-                step_type=request.POST.get('step_type'),
-                temperature=float(request.POST.get('temperature')) if request.POST.get('temperature') else None,
-                humidity=float(request.POST.get('humidity')) if request.POST.get('humidity') else None,
-                duration_hours=float(request.POST.get('duration_hours')) if request.POST.get('duration_hours') else None,
-                operator_name=request.POST.get('operator_name'),
-                equipment_used=request.POST.get('equipment_used', ''),
-                notes=request.POST.get('notes', ''),
-            )
+                # Add processing step
+                ProcessingStep.objects.create(
+                    batch=batch,
+                    step_type=request.POST.get('step_type'),
+                    temperature=float(request.POST.get('temperature')) if request.POST.get('temperature') else None,
+                    humidity=float(request.POST.get('humidity')) if request.POST.get('humidity') else None,
+                    duration_hours=float(request.POST.get('duration_hours')) if request.POST.get('duration_hours') else None,
+                    operator_name=request.POST.get('operator_name'),
+                    equipment_used=request.POST.get('equipment_used', ''),
+                    notes=request.POST.get('notes', ''),
+                )
             
             messages.success(request, 'Processing step recorded successfully!')
             return redirect('processing_form')
@@ -110,9 +114,9 @@ def processing_form(request):
         except Exception as e:
             messages.error(request, f'Error recording processing step: {str(e)}')
     
+    # Batches and collection events are picked through autocomplete_search
     context = {
-        'batches': ProcessingBatch.objects.all(),
-        'collection_events': CollectionEvent.objects.all(),
+        'batches': ProcessingBatch.objects.filter(status='processing').order_by('-start_date')[:10],
         'step_types': ProcessingStep.STEP_TYPES,
     }
     return render(request, 'traceability/processing_form.html', context)
@@ -157,20 +161,30 @@ def lab_form(request):
     }
     return render(request, 'traceability/lab_form.html', context)
 
+@replica_reads
 def consumer_portal(request):
     """Consumer portal homepage"""
     return render(request, 'traceability/consumer_portal.html')
 
+def _batch_proof(request, batch_id):
+    """Ledger proofs for a batch, cached under the stamps its ETag was built from"""
+    key = versioning.batch_key(batch_id)
+    stamps = versioning.get_stamps(request, [key, versioning.LEDGER])
+    return get_batch_proof(batch_id, stamps[key][0], stamps[versioning.LEDGER][0])
+
+@replica_reads
+@condition(etag_func=versioning.batch_page_etag, last_modified_func=versioning.batch_page_last_modified)
 def batch_detail(request, batch_id):
     """Detailed view of a batch for consumers"""
     try:
-        batch = get_object_or_404(ProcessingBatch, batch_id=batch_id)
+        batch = get_object_or_404(batch_provenance_queryset(), batch_id=batch_id)
         
         context = {
             'batch': batch,
             'collection_events': batch.collection_events.all(),
             'processing_steps': batch.processing_steps.all(),
             'quality_tests': batch.quality_tests.all(),
+            'ledger_proof': _batch_proof(request, batch.batch_id),
         }
         return render(request, 'traceability/batch_detail.html', context)
         
@@ -182,59 +196,120 @@ def qr_scan(request, batch_id):
     """QR code scan result page"""
     return redirect('batch_detail', batch_id=batch_id)
 
+@replica_reads
+def qr_code_image(request, batch_id, fmt):
+    """
+    QR code for a batch rendered on demand as png (?size=128|256|512|1024),
+    svg or a printable pdf label. Requests carrying the content address as
+    ?v= may be cached forever; others revalidate with the ETag.
+    """
+    if fmt not in qr_render.FORMATS:
+        return HttpResponse('Unsupported format', status=404)
+    size = None
+    if fmt == 'png' and request.GET.get('size'):
+        try:
+            size = int(request.GET['size'])
+        except ValueError:
+            size = None
+        if size not in qr_render.PNG_SIZES:
+            return HttpResponse(f'size must be one of {qr_render.PNG_SIZES}', status=400)
+    if not ProcessingBatch.objects.filter(batch_id=batch_id).exists():
+        return HttpResponse('Batch not found', status=404)
+    
+    address = qr_render.content_address(qr_render.qr_payload(batch_id), fmt, size)
+    etag = f'"{address}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponse(status=304)
+    else:
+        _, data = qr_render.get_qr_code(batch_id, fmt, size)
+        response = HttpResponse(data, content_type=qr_render.FORMATS[fmt])
+        if fmt == 'pdf':
+            response['Content-Disposition'] = f'inline; filename="label_{batch_id}.pdf"'
+    response['ETag'] = etag
+    version = request.GET.get('v', '')
+    if len(version) >= 16 and address.startswith(version):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+@replica_reads
+@condition(etag_func=versioning.batch_data_etag, last_modified_func=versioning.batch_data_last_modified)
 def get_batch_data(request, batch_id):
     """API endpoint to get batch data for maps and charts"""
     try:
-        batch = ProcessingBatch.objects.get(batch_id=batch_id)
-        
-        # Prepare collection events for map
-        collection_data = []
-        for event in batch.collection_events.all():
-            collection_data.append({
-                'lat': event.gps_latitude,
-                'lng': event.gps_longitude,
-                'collector': event.collector.name,
-                'species': event.species.get_name_display(),
-                'harvest_date': event.harvest_date.strftime('%Y-%m-%d'),
-                'quantity': event.quantity_kg,
-                'grade': event.quality_grade,
-            })
+        # Key the cached document by the stamp the ETag was built from
+        key = versioning.batch_key(batch_id)
+        data = get_provenance_document(batch_id, versioning.get_stamps(request, [key])[key][0])
         
-        # Prepare processing timeline
-        timeline_data = []
-        for step in batch.processing_steps.all():
-            timeline_data.append({
-                'step': step.get_step_type_display(),
-                'timestamp': step.timestamp.strftime('%Y-%m-%d %H:%M'),
-                'operator': step.operator_name,
-                'temperature': step.temperature,
-                'humidity': step.humidity,
-            })
+        # Optional Merkle inclusion proofs anchoring every record in the ledger
+        if request.GET.get('proof'):
+            data = dict(data, ledger_proof=_batch_proof(request, batch_id))
         
-        # Prepare quality test data
-        quality_data = []
-        for test in batch.quality_tests.all():
-            quality_data.append({
-                'lab': test.lab_name,
-                'date': test.test_date.strftime('%Y-%m-%d'),
-                'status': test.get_test_status_display(),
-                'moisture': test.moisture_content,
-                'pesticide': test.get_pesticide_residue_display(),
-                'certificate': test.certificate_number,
-            })
-        
-        return JsonResponse({
-            'batch_id': batch.batch_id,
-            'status': batch.get_status_display(),
-            'facility': batch.processing_facility,
-            'collection_events': collection_data,
-            'processing_timeline': timeline_data,
-            'quality_tests': quality_data,
-        })
+        return HttpResponse(fastjson.dumps(data), content_type='application/json')
         
     except ProcessingBatch.DoesNotExist:
         return JsonResponse({'error': 'Batch not found'}, status=404)
 
+@replica_reads
+@api_view(['GET'])
+def stats_summary(request):
+    """Dashboard statistics from the pre-aggregated counters; ?date_from/?date_to add per-day counts"""
+    date_from = parse_date(request.GET['date_from'], 'date_from') if request.GET.get('date_from') else None
+    date_to = parse_date(request.GET['date_to'], 'date_to') if request.GET.get('date_to') else None
+    return Response(stats.summary(date_from, date_to))
+
+@replica_reads
+@condition(etag_func=versioning.analytics_etag, last_modified_func=versioning.analytics_last_modified)
+@api_view(['GET'])
+def analytics_report(request, metric):
+    """
+    Harvest (kg) or processing (hours) trends from the daily rollups:
+    ?dimension=, ?interval=day|week|month, ?date_from=, ?date_to=, ?key=... or ?limit=
+    """
+    if metric not in analytics.DIMENSIONS:
+        raise ValidationError({'metric': f'Expected one of {", ".join(analytics.DIMENSIONS)}'})
+    dimension = request.GET.get('dimension', 'all')
+    if dimension not in analytics.DIMENSIONS[metric]:
+        raise ValidationError({'dimension': f'Expected one of {", ".join(analytics.DIMENSIONS[metric])}'})
+    interval = request.GET.get('interval', 'week')
+    if interval not in analytics.INTERVALS:
+        raise ValidationError({'interval': f'Expected one of {", ".join(analytics.INTERVALS)}'})
+    date_from = parse_date(request.GET['date_from'], 'date_from') if request.GET.get('date_from') else None
+    date_to = parse_date(request.GET['date_to'], 'date_to') if request.GET.get('date_to') else None
+    if date_from and date_to:
+        if date_from > date_to:
+            raise ValidationError({'date_from': 'Must not be after date_to'})
+        if len(analytics.bucket_starts(date_from, date_to, interval)) > analytics.MAX_BUCKETS:
+            raise ValidationError({'interval': f'At most {analytics.MAX_BUCKETS} buckets per report'})
+    limit = parse_positive_int(request.GET.get('limit', 20), 'limit', maximum=500)
+    version = versioning.get_stamps(request, [versioning.ANALYTICS])[versioning.ANALYTICS]
+    return Response(analytics.report(metric, dimension, date_from, date_to, interval,
+                                     keys=request.GET.getlist('key'), limit=limit, version=version))
+
+@replica_reads
+@api_view(['GET'])
+def autocomplete_search(request, kind):
+    """Typeahead for the forms: ?q= prefix and ?limit=; events also take ?species="""
+    if kind not in autocomplete.LOOKUPS:
+        raise ValidationError({'kind': f'Expected one of {", ".join(autocomplete.LOOKUPS)}'})
+    limit = parse_positive_int(request.GET.get('limit', autocomplete.DEFAULT_LIMIT), 'limit',
+                               maximum=autocomplete.MAX_LIMIT)
+    options = {'species': request.GET['species']} if kind == 'events' and request.GET.get('species') else {}
+    return Response({'results': autocomplete.LOOKUPS[kind](request.GET.get('q'), limit, **options)})
+
+@replica_reads
+@api_view(['GET'])
+def search_records(request):
+    """Ranked full-text search: ?q=, ?type=batch,collector,test and ?limit="""
+    kinds = search.KINDS
+    if request.GET.get('type'):
+        kinds = [kind.strip() for kind in request.GET['type'].split(',') if kind.strip()]
+        if not kinds or set(kinds) - set(search.KINDS):
+            raise ValidationError({'type': f'Expected any of {", ".join(search.KINDS)}'})
+    limit = parse_positive_int(request.GET.get('limit', search.DEFAULT_LIMIT), 'limit', maximum=search.MAX_LIMIT)
+    return Response({'results': search.search(request.GET.get('q', ''), kinds, limit)})
+
 # REST API ViewSets
 class CollectorViewSet(viewsets.ModelViewSet):
     queryset = Collector.objects.all()
@@ -244,32 +319,302 @@ class HerbSpeciesViewSet(viewsets.ModelViewSet):
     queryset = HerbSpecies.objects.all()
     serializer_class = HerbSpeciesSerializer
 
-class CollectionEventViewSet(viewsets.ModelViewSet):
-    queryset = CollectionEvent.objects.all()
+class CollectionEventViewSet(fastjson.FastListMixin, viewsets.ModelViewSet):
+    queryset = CollectionEvent.objects.select_related('collector', 'species')
     serializer_class = CollectionEventSerializer
+    # CollectionEventSerializer's representation, read from .values_list() rows
+    fast_list_fields = [
+        ('id', 'id', None),
+        ('collector_name', 'collector__name', None),
+        ('species_name', 'species__name', fastjson.display(HerbSpecies, 'name')),
+        ('event_id', 'event_id', str),
+        ('harvest_date', 'harvest_date', fastjson.day),
+        ('gps_latitude', 'gps_latitude', None),
+        ('gps_longitude', 'gps_longitude', None),
+        ('quantity_kg', 'quantity_kg', None),
+        ('quality_grade', 'quality_grade', None),
+        ('weather_conditions', 'weather_conditions', None),
+        ('soil_ph', 'soil_ph', None),
+        ('organic_certified', 'organic_certified', None),
+        ('fair_trade_certified', 'fair_trade_certified', None),
+        ('geohash', 'geohash', None),
+        ('created_at', 'created_at', fastjson.iso_datetime),
+        ('collector', 'collector', None),
+        ('species', 'species', None),
+    ]
+    
+    def create(self, request, *args, **kwargs):
+        """Create an event; a repeated Idempotency-Key header returns the original event"""
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return super().create(request, *args, **kwargs)
+        
+        existing = IdempotencyKey.objects.filter(key=key).select_related('event').first()
+        if existing:
+            return Response(self.get_serializer(existing.event).data, status=status.HTTP_200_OK)
+        
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            with transaction.atomic():
+                self.perform_create(serializer)
+                IdempotencyKey.objects.create(key=key, event=serializer.instance)
+        except IntegrityError:
+            # A concurrent request with the same key stored its event first
+            existing = IdempotencyKey.objects.filter(key=key).select_related('event').first()
+            if existing is None:
+                raise
+            return Response(self.get_serializer(existing.event).data, status=status.HTTP_200_OK)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
+    # Columns read by map_data and their JSON keys, after the id used as cursor
+    MAP_DATA_FIELDS, _map_row = fastjson.compile_extractor(leading=['id'], spec=[
+        ('id', 'event_id', str),
+        ('lat', 'gps_latitude', None),
+        ('lng', 'gps_longitude', None),
+        ('collector', 'collector__name', None),
+        ('species', 'species__name', fastjson.display(HerbSpecies, 'name')),
+        ('harvest_date', 'harvest_date', fastjson.day),
+        ('quantity', 'quantity_kg', None),
+        ('grade', 'quality_grade', None),
+    ])
+    _map_row = staticmethod(_map_row)
+    MAP_DATA_MAX_LIMIT = 5000
+    MAP_DATA_CHUNK_SIZE = 1000
     
     @action(detail=False, methods=['get'])
+    @method_decorator(condition(etag_func=versioning.collection_events_etag,
+                                last_modified_func=versioning.collection_events_last_modified))
     def map_data(self, request):
-        """Get collection events data for map display"""
-        events = self.get_queryset().select_related('collector', 'species')
-        data = []
-        for event in events:
-            data.append({
-                'id': str(event.event_id),
-                'lat': event.gps_latitude,
-                'lng': event.gps_longitude,
-                'collector': event.collector.name,
-                'species': event.species.get_name_display(),
-                'harvest_date': event.harvest_date.strftime('%Y-%m-%d'),
-                'quantity': event.quantity_kg,
-                'grade': event.quality_grade,
-            })
-        return Response(data)
+        """
+        Get collection events data for map display.
+        
+        Supports the filters in traceability.filters plus cursor pagination
+        (?limit=N&cursor=<X-Next-Cursor>). Rows are streamed as a JSON array,
+        or as NDJSON when requested with ?ndjson=1 or Accept: application/x-ndjson.
+        """
+        params = request.query_params
+        events = filter_collection_events(self.get_queryset(), params).order_by('id')
+        if params.get('cursor'):
+            events = events.filter(id__gt=parse_positive_int(params['cursor'], 'cursor'))
+        rows = events.values_list(*self.MAP_DATA_FIELDS)
+        
+        next_cursor = None
+        if params.get('limit'):
+            limit = parse_positive_int(params['limit'], 'limit', maximum=self.MAP_DATA_MAX_LIMIT)
+            rows = list(rows[:limit + 1])
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = rows[-1][0]
+        else:
+            rows = rows.iterator(chunk_size=self.MAP_DATA_CHUNK_SIZE)
+        
+        ndjson = params.get('ndjson') or 'application/x-ndjson' in request.META.get('HTTP_ACCEPT', '')
+        if ndjson:
+            response = StreamingHttpResponse(self._stream_ndjson(rows), content_type='application/x-ndjson')
+        else:
+            response = StreamingHttpResponse(self._stream_json_array(rows), content_type='application/json')
+        
+        if next_cursor is not None:
+            next_params = params.copy()
+            next_params['cursor'] = next_cursor
+            response['X-Next-Cursor'] = str(next_cursor)
+            response['Link'] = f'<{request.build_absolute_uri(request.path)}?{next_params.urlencode()}>; rel="next"'
+        return response
+    
+    @action(detail=False, methods=['get'], url_path=r'tiles/(?P<zoom>\d+)/(?P<x>\d+)/(?P<y>\d+)')
+    @method_decorator(condition(etag_func=versioning.collection_events_etag,
+                                last_modified_func=versioning.collection_events_last_modified))
+    def tiles(self, request, zoom, x, y):
+        """Aggregated harvest counts, quantities and grade mix for map tile zoom/x/y"""
+        zoom, x, y = int(zoom), int(x), int(y)
+        if zoom > 30 or x >= 1 << zoom or y >= 1 << zoom:
+            return Response({'error': 'Tile out of range'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(harvest_tiles.tile_cells(zoom, x, y))
+    
+    SPATIAL_MAX_LIMIT = 5000
+    
+    @action(detail=False, methods=['get'], url_path='within-radius')
+    def within_radius(self, request):
+        """Events within radius_km of lat/lng, nearest first"""
+        params = request.query_params
+        lat = parse_float(params.get('lat'), 'lat', -90, 90)
+        lng = parse_float(params.get('lng'), 'lng', -180, 180)
+        radius_km = parse_float(params.get('radius_km'), 'radius_km', 0, 2000)
+        
+        def distance(row):
+            return spatial.haversine_km(lat, lng, row[2], row[3])
+        
+        matches = [(distance(row), row) for row in self._spatial_candidates(spatial.radius_bbox(lat, lng, radius_km))]
+        matches = sorted((match for match in matches if match[0] <= radius_km), key=lambda match: match[0])
+        return self._spatial_response(
+            [match[1] for match in matches],
+            extra=[{'distance_km': round(match[0], 3)} for match in matches],
+        )
+    
+    @action(detail=False, methods=['get'], url_path='within-bbox')
+    def within_bbox(self, request):
+        """Events inside bbox=min_lng,min_lat,max_lng,max_lat"""
+        if not request.query_params.get('bbox'):
+            raise ValidationError({'bbox': 'This parameter is required'})
+        bbox = parse_bbox(request.query_params['bbox'])
+        return self._spatial_response(list(self._spatial_candidates(bbox)))
+    
+    @action(detail=False, methods=['get', 'post'], url_path='within-polygon')
+    def within_polygon(self, request):
+        """Events inside polygon=lng lat,lng lat,... (or a JSON body {"polygon": [[lng, lat], ...]})"""
+        if request.method == 'POST' and not isinstance(request.data, dict):
+            raise ValidationError({'polygon': 'Expected a JSON object with a polygon'})
+        raw = request.data.get('polygon') if request.method == 'POST' else request.query_params.get('polygon')
+        if not raw:
+            raise ValidationError({'polygon': 'This parameter is required'})
+        polygon = parse_polygon(raw)
+        rows = self._spatial_candidates(spatial.polygon_bbox(polygon))
+        return self._spatial_response([row for row in rows if spatial.point_in_polygon(row[3], row[2], polygon)])
+    
+    def _spatial_candidates(self, bbox):
+        """Rows inside bbox, found through the geohash index, with the common filters applied"""
+        events = filter_collection_events(self.get_queryset(), self.request.query_params)
+        return events.filter(spatial.bbox_q(*bbox)).values_list(*self.MAP_DATA_FIELDS).iterator(
+            chunk_size=self.MAP_DATA_CHUNK_SIZE)
+    
+    def _spatial_response(self, rows, extra=None):
+        limit = self.SPATIAL_MAX_LIMIT
+        if self.request.query_params.get('limit'):
+            limit = parse_positive_int(self.request.query_params['limit'], 'limit', maximum=self.SPATIAL_MAX_LIMIT)
+        results = list(self._map_rows(rows[:limit]))
+        if extra:
+            for result, fields in zip(results, extra):
+                result.update(fields)
+        return Response({'count': len(rows), 'truncated': len(rows) > limit, 'results': results})
+    
+    @action(detail=False, methods=['post'], url_path='bulk',
+            parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        Ingest many harvests at once from an offline device sync. Accepts a
+        JSON array (or {"records": [...]}) or NDJSON, and reports a result
+        per record in input order.
+        """
+        records = request.data
+        if isinstance(records, dict):
+            records = records.get('records')
+        if not isinstance(records, list) or not records:
+            raise ValidationError({'records': 'Expected a non-empty list of collection events'})
+        if len(records) > ingest.max_records():
+            raise ValidationError({'records': f'At most {ingest.max_records()} records per request'})
+        
+        results = ingest.ingest_collection_events(records)
+        counts = {'created': 0, 'duplicate': 0, 'error': 0}
+        for result in results:
+            counts[result['status']] += 1
+        # A retried sync whose records are all stored already has succeeded
+        if counts['created']:
+            response_status = status.HTTP_201_CREATED
+        elif counts['duplicate']:
+            response_status = status.HTTP_200_OK
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(
+            {'created': counts['created'], 'duplicates': counts['duplicate'], 'failed': counts['error'],
+             'results': results},
+            status=response_status,
+        )
+    
+    def _map_rows(self, rows):
+        return map(self._map_row, rows)
+    
+    def _stream_json_array(self, rows):
+        yield b'['
+        separator = b''
+        for chunk in self._chunked(self._map_rows(rows)):
+            yield separator + fastjson.dumps_rows(chunk)
+            separator = b','
+        yield b']'
+    
+    def _stream_ndjson(self, rows):
+        for chunk in self._chunked(self._map_rows(rows)):
+            yield b''.join(fastjson.dumps(row) + b'\n' for row in chunk)
+    
+    def _chunked(self, iterable):
+        chunk = []
+        for item in iterable:
+            chunk.append(item)
+            if len(chunk) == self.MAP_DATA_CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
 
-class ProcessingBatchViewSet(viewsets.ModelViewSet):
+class ProcessingBatchViewSet(fastjson.FastListMixin, viewsets.ModelViewSet):
+    """
+    Batches are listed one row each, newest first and cursor-paginated
+    (?page_size=, ?cursor=); detail includes every provenance relation.
+    ?expand=collection_events,processing_steps,quality_tests selects the
+    nested relations for either, and only those are prefetched.
+    """
     queryset = ProcessingBatch.objects.all()
     serializer_class = ProcessingBatchSerializer
+    pagination_class = BatchCursorPagination
     lookup_field = 'batch_id'
+    
+    def get_expand(self):
+        """Relations to nest, or None for the action's default representation"""
+        if 'expand' not in self.request.query_params:
+            return None
+        return parse_expand(self.request.query_params['expand'], RELATIONS)
+    
+    def get_queryset(self):
+        expand = self.get_expand()
+        if expand is None:
+            expand = () if self.action == 'list' else RELATIONS
+        return batch_provenance_queryset([name for name in RELATIONS if name in expand])
+    
+    # ProcessingBatchListSerializer's representation, read from .values_list() rows
+    fast_list_fields = [
+        ('id', 'id', None),
+        ('batch_id', 'batch_id', None),
+        ('processing_facility', 'processing_facility', None),
+        ('start_date', 'start_date', fastjson.iso_datetime),
+        ('end_date', 'end_date', fastjson.iso_datetime),
+        ('batch_size_kg', 'batch_size_kg', None),
+        ('status', 'status', None),
+        ('status_display', 'status', fastjson.display(ProcessingBatch, 'status')),
+        ('qr_code_url', 'batch_id', qr_render.qr_code_url),
+    ]
+    
+    def use_fast_list(self):
+        return self.get_expand() is None
+    
+    def get_serializer_class(self):
+        if self.action == 'list' and self.get_expand() is None:
+            return ProcessingBatchListSerializer
+        return ProcessingBatchSerializer
+    
+    def get_serializer_context(self):
+        return dict(super().get_serializer_context(), expand=self.get_expand())
+
+    @action(detail=False, methods=['get'], url_path='qr-labels')
+    def qr_labels(self, request):
+        """
+        Print-ready PDF sheets of QR labels, streamed page by page, for
+        ?batch_id=...&batch_id=... and/or ?status=; columns and rows set the grid.
+        """
+        columns = parse_positive_int(request.GET.get('columns', labels.DEFAULT_COLUMNS), 'columns', maximum=10)
+        rows = parse_positive_int(request.GET.get('rows', labels.DEFAULT_ROWS), 'rows', maximum=20)
+        batch_ids = labels.select_batch_ids(request.GET.getlist('batch_id'), request.GET.get('status'))
+        if not batch_ids:
+            raise ValidationError({'batch_id': 'No matching batches'})
+        max_batches = getattr(settings, 'QR_LABEL_MAX_BATCHES', 2000)
+        if len(batch_ids) > max_batches:
+            raise ValidationError({'batch_id': f'At most {max_batches} labels per request'})
+        response = StreamingHttpResponse(
+            # Rendered serially: no process pool inside a web worker
+            labels.stream_label_pdf(batch_ids, columns=columns, rows=rows, workers=1),
+            content_type='application/pdf',
+        )
+        response['Content-Disposition'] = 'attachment; filename="qr_labels.pdf"'
+        return response
 
 class ProcessingStepViewSet(viewsets.ModelViewSet):
     queryset = ProcessingStep.objects.all()
@@ -277,4 +622,54 @@ class ProcessingStepViewSet(viewsets.ModelViewSet):
 
 class QualityTestViewSet(viewsets.ModelViewSet):
     queryset = QualityTest.objects.all()
-    serializer_class = QualityTestSerializer
\ No newline at end of file
+    serializer_class = QualityTestSerializer
+
+class SyncSessionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Resumable device uploads. A device opens a session, then posts chunks
+    numbered 1, 2, 3... Each chunk is ingested and acknowledged atomically;
+    re-posting an acknowledged chunk is a no-op, so a device that lost the
+    response simply resumes from committed_seq + 1.
+    """
+    queryset = SyncSession.objects.all()
+    serializer_class = SyncSessionSerializer
+    lookup_field = 'session_id'
+    
+    @action(detail=True, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def chunks(self, request, session_id=None):
+        """Commit chunk ?seq=N (or {"seq": N, "records": [...]}) of a session"""
+        records = request.data
+        seq = request.query_params.get('seq')
+        if isinstance(records, dict):
+            seq = records.get('seq', seq)
+            records = records.get('records')
+        seq = parse_positive_int(seq, 'seq')
+        if not isinstance(records, list):
+            raise ValidationError({'records': 'Expected a list of collection events'})
+        if len(records) > ingest.max_records():
+            raise ValidationError({'records': f'At most {ingest.max_records()} records per chunk'})
+        
+        with transaction.atomic():
+            session = get_object_or_404(SyncSession.objects.select_for_update(), session_id=session_id)
+            if seq <= session.committed_seq:
+                return Response({'committed_seq': session.committed_seq, 'status': 'already_committed'})
+            if session.status != 'open':
+                return Response({'error': 'Session is completed'}, status=status.HTTP_409_CONFLICT)
+            if seq != session.committed_seq + 1:
+                return Response({'error': 'Out of order chunk', 'committed_seq': session.committed_seq,
+                                 'expected_seq': session.committed_seq + 1}, status=status.HTTP_409_CONFLICT)
+            
+            results = ingest.ingest_collection_events(records)
+            session.committed_seq = seq
+            session.record_count += sum(1 for result in results if result['status'] == 'created')
+            session.save(update_fields=['committed_seq', 'record_count', 'updated_at'])
+        
+        return Response({'committed_seq': session.committed_seq, 'status': 'committed', 'results': results})
+    
+    @action(detail=True, methods=['post'])
+    def complete(self, request, session_id=None):
+        """Close a session once the device has uploaded every chunk"""
+        session = self.get_object()
+        session.status = 'completed'
+        session.save(update_fields=['status', 'updated_at'])
+        return Response(self.get_serializer(session).data)